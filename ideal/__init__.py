@@ -7,6 +7,7 @@
 from __future__ import absolute_import, unicode_literals, unicode_literals
 
 import re
+import sys
 
 from collections import namedtuple
 
@@ -30,3 +31,35 @@ VERSION = version_info = version_info_t(
     int(_temp[0]), int(_temp[1]), int(_temp[2]), _temp[3] or '', '')
 del(_temp)
 del(re)
+
+# Public names, which are imported on first use so ``import ideal`` stays cheap.
+_LAZY_NAMES = {
+    'IdealClient': 'ideal.client',
+    'TransactionStatus': 'ideal.client',
+    'get_client': 'ideal.client',
+    'RequestPriority': 'ideal.concurrency',
+    'Settings': 'ideal.conf',
+    'settings': 'ideal.conf',
+}
+
+
+def __getattr__(name):
+    # Only called for missing attributes, on Python 3.7 and newer.
+    module_name = _LAZY_NAMES.get(name)
+    if module_name is None:
+        raise AttributeError('module {0!r} has no attribute {1!r}'.format(__name__, name))
+
+    value = getattr(__import__(module_name, fromlist=[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES))
+
+
+if sys.version_info < (3, 7):
+    # Module ``__getattr__`` requires Python 3.7, so older versions import the public names right away.
+    for _name, _module_name in _LAZY_NAMES.items():
+        globals()[_name] = getattr(__import__(_module_name, fromlist=[_name]), _name)
+    del _name, _module_name
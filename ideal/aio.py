@@ -0,0 +1,490 @@
+"""
+An asyncio version of :class:`ideal.client.IdealClient`, for ASGI applications. Waiting for the acquirer does not hold
+a thread, so many payments can be in flight in a single process. Requires Python 3.7 or later, which keeps the active
+tracing span per task::
+
+    from ideal.aio import get_async_client
+
+    response = await get_async_client().get_issuers()
+
+Signing, verification, logging, tracing and metrics are the same as in the synchronous client. The HTTP exchange is
+done by an :class:`AsyncTransport`, by default an :class:`HttpxTransport`.
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+import weakref
+from collections import deque
+from functools import partial
+
+from ideal.client import (ClientRegistry, DirectoryResponse, IdealClient, ResponseReader, StatusResponse,
+                          TransactionResponse)
+from ideal.concurrency import PriorityLimiter, RequestPriority
+from ideal.exceptions import IdealConfigurationException, IdealResponseException, IdealServerException
+from ideal.parsers import create_parser
+from ideal.transports import CHUNK_SIZE, DEFAULT_POOL_SIZE, Transport
+from ideal.utils import get_message_type
+
+if sys.version_info < (3, 7):
+    raise ImportError('ideal.aio requires Python 3.7 or later.')
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncPriorityLimiter(PriorityLimiter):
+    """
+    A :class:`ideal.concurrency.PriorityLimiter` for coroutines: waiting for a slot does not block the event loop.
+    """
+    def __init__(self, max_concurrency, interactive_reserve=0):
+        super(AsyncPriorityLimiter, self).__init__(max_concurrency, interactive_reserve)
+        self._waiters = {RequestPriority.INTERACTIVE: deque(), RequestPriority.BACKGROUND: deque()}
+
+    def _can_acquire(self, priority):
+        if self._in_use >= self.capacity(priority):
+            return False
+        # Background requests step aside as long as interactive requests are waiting.
+        return priority == RequestPriority.INTERACTIVE or not self._waiters[RequestPriority.INTERACTIVE]
+
+    async def acquire(self, priority):
+        """
+        Wait until a slot is available for given ``priority`` and claim it.
+
+        :param priority: Any of the constants in :class:`RequestPriority`.
+        """
+        waiters = self._waiters[priority]
+        if not waiters and self._can_acquire(priority):
+            self._in_use += 1
+            return
+
+        future = asyncio.get_event_loop().create_future()
+        waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before the cancellation.
+                self.release()
+            else:
+                waiters.remove(future)
+                self._wake()
+            raise
+
+    def release(self):
+        """
+        Release a previously acquired slot.
+        """
+        self._in_use -= 1
+        self._wake()
+
+    def _wake(self):
+        # A slot is handed over to a waiter directly, so no new request can take it first.
+        for priority in (RequestPriority.INTERACTIVE, RequestPriority.BACKGROUND):
+            waiters = self._waiters[priority]
+            while waiters and self._in_use < self.capacity(priority):
+                if priority == RequestPriority.BACKGROUND and self._waiters[RequestPriority.INTERACTIVE]:
+                    return
+                future = waiters.popleft()
+                if not future.done():
+                    future.set_result(None)
+                    self._in_use += 1
+
+    def slot(self, priority):
+        """
+        Asynchronous context manager that holds a slot for given ``priority`` while the block executes.
+
+        :param priority: Any of the constants in :class:`RequestPriority`.
+        """
+        return _AsyncSlot(self, priority)
+
+
+class _AsyncSlot(object):
+    def __init__(self, limiter, priority):
+        self.limiter = limiter
+        self.priority = priority
+
+    async def __aenter__(self):
+        await self.limiter.acquire(self.priority)
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.limiter.release()
+        return False
+
+
+class AsyncTransportResponse(object):
+    """
+    The status, headers and body of an acquirer response, returned by :meth:`AsyncTransport.send`. The body is either
+    available as ``content`` or streamed from ``chunks``, an asynchronous iterable of bytes.
+    """
+    def __init__(self, status_code, headers, content=None, chunks=None, close=None):
+        """
+        :param status_code: The HTTP status code.
+        :param headers: Dictionary of response headers.
+        :param content: The body as bytes (optional).
+        :param chunks: The body as an asynchronous iterable of bytes, if there's no ``content`` (optional).
+        :param close: Coroutine function to release the connection after the body is read (optional).
+        """
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self._chunks = chunks
+        self._close = close
+
+    async def iter_content(self):
+        """
+        Iterate over the body in chunks of bytes. The body can only be read once.
+        """
+        if self._chunks is None:
+            if self.content:
+                yield self.content
+            return
+
+        async for chunk in self._chunks:
+            if chunk:
+                yield chunk
+
+    async def close(self):
+        """
+        Release the connection of this response.
+        """
+        if self._close is not None:
+            close, self._close = self._close, None
+            await close()
+
+
+class AsyncTransport(Transport):
+    """
+    Base class for asynchronous transports. Connection pools belong to the event loop that created them, so each event
+    loop gets its own.
+    """
+    def __init__(self, limiter=None, pool_size=DEFAULT_POOL_SIZE):
+        super(AsyncTransport, self).__init__(limiter, pool_size)
+        self._loop_pools = weakref.WeakKeyDictionary()
+
+    async def send(self, request, priority, hedge=False):
+        """
+        Send the request and return the response.
+
+        :param request: The signed :class:`ideal.client.HttpRequest` object.
+        :param priority: Any of the constants in :class:`ideal.concurrency.RequestPriority`.
+        :param hedge: ``True`` if this is a hedged attempt, that should use a separate connection (optional).
+                      Default\: ``False``.
+
+        :return: A :class:`AsyncTransportResponse` object.
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """
+        Close all connections of the running event loop.
+        """
+        pools = self._loop_pools.pop(asyncio.get_event_loop(), {})
+        for pool in pools.values():
+            await self.close_pool(pool)
+
+    def reset(self):
+        super(AsyncTransport, self).reset()
+        self._loop_pools = weakref.WeakKeyDictionary()
+
+    def get_pool(self, priority, hedge=False):
+        # Only the thread of the event loop uses its pools, so no lock is needed.
+        pools = self._loop_pools.setdefault(asyncio.get_event_loop(), {})
+        key = 'hedge' if hedge else priority
+        pool = pools.get(key)
+        if pool is None:
+            pool = pools[key] = self.create_pool(self.get_pool_size(priority))
+        return pool
+
+    async def close_pool(self, pool):
+        await pool.aclose()
+
+
+class HttpxTransport(AsyncTransport):
+    """
+    Sends requests with ``httpx``. This is the default transport of :class:`AsyncIdealClient`. Requires the ``httpx``
+    package.
+    """
+    def __init__(self, limiter=None, pool_size=DEFAULT_POOL_SIZE, timeout=None, http2=False):
+        """
+        :param limiter: See :class:`ideal.transports.Transport`.
+        :param pool_size: See :class:`ideal.transports.Transport`.
+        :param timeout: Timeout in seconds (optional). Default\: no timeout.
+        :param http2: ``True`` to use HTTP/2, which requires the ``httpx[http2]`` package (optional).
+                      Default\: ``False``.
+        """
+        try:
+            import httpx
+        except ImportError:
+            raise IdealConfigurationException('The HttpxTransport requires the "httpx" package.')
+
+        super(HttpxTransport, self).__init__(limiter, pool_size)
+        self.timeout = timeout
+        self.http2 = http2
+        self._httpx = httpx
+
+    def create_pool(self, size):
+        limits = self._httpx.Limits(max_connections=size, max_keepalive_connections=size)
+        return self._httpx.AsyncClient(http2=self.http2, limits=limits, timeout=self.timeout)
+
+    async def send(self, request, priority, hedge=False):
+        client = self.get_pool(priority, hedge)
+        response = await client.send(
+            client.build_request(request.method, request.uri, content=request.body, headers=request.headers),
+            stream=True)
+        return AsyncTransportResponse(
+            response.status_code, response.headers, chunks=response.aiter_bytes(CHUNK_SIZE), close=response.aclose)
+
+
+class ThreadedTransport(AsyncTransport):
+    """
+    Runs a synchronous :class:`ideal.transports.Transport` in a thread pool, for example the
+    :class:`ideal.transports.WSGITransport` or :class:`ideal.transports.ReplayTransport` in tests. Each exchange holds
+    a thread, like it does in the synchronous client.
+    """
+    def __init__(self, transport, executor=None):
+        """
+        :param transport: The synchronous :class:`ideal.transports.Transport`.
+        :param executor: A :class:`concurrent.futures.Executor` (optional). Default\: the event loop's default.
+        """
+        self.transport = transport
+        self.executor = executor
+        super(ThreadedTransport, self).__init__()
+
+    @property
+    def limiter(self):
+        return self.transport.limiter
+
+    @limiter.setter
+    def limiter(self, limiter):
+        # The wrapped transport only uses the limiter for the size of its connection pools.
+        if limiter is not None:
+            self.transport.limiter = limiter
+
+    async def _run(self, func, *args):
+        return await asyncio.get_event_loop().run_in_executor(self.executor, partial(func, *args))
+
+    async def send(self, request, priority, hedge=False):
+        response = await self._run(self.transport.send, request, priority, hedge)
+        return AsyncTransportResponse(
+            response.status_code, response.headers, chunks=self._iter_content(response),
+            close=partial(self._run, response.close))
+
+    async def _iter_content(self, response):
+        chunks = iter(response.iter_content())
+        while True:
+            chunk = await self._run(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    async def close(self):
+        await self._run(self.transport.close)
+
+
+_shared_transport = None
+
+
+def get_shared_async_transport():
+    """
+    Return the :class:`HttpxTransport` that is shared by all asynchronous clients without their own transport or
+    limiter.
+
+    :return: A :class:`HttpxTransport` object.
+    """
+    global _shared_transport
+
+    # Clients are created in the thread of the event loop, so no lock is needed.
+    if _shared_transport is None:
+        _shared_transport = HttpxTransport()
+    return _shared_transport
+
+
+class AsyncIdealClient(IdealClient):
+    """
+    The iDEAL client for asyncio. It takes the same arguments as :class:`ideal.client.IdealClient`, but the
+    ``transport`` is a :class:`AsyncTransport` and the request methods are coroutines.
+
+    Hedged requests are sent as concurrent tasks, rather than threads.
+    """
+    limiter_class = AsyncPriorityLimiter
+
+    def get_default_transport(self):
+        """
+        Return the transport to use if none is given.
+
+        :return: A :class:`HttpxTransport` object.
+        """
+        return HttpxTransport() if self.limiter is not None else get_shared_async_transport()
+
+    async def _read(self, raw_response):
+        """
+        Read the body of a streamed response, see :meth:`ideal.client.IdealClient._read`.
+        """
+        from lxml.etree import XMLSyntaxError
+
+        # Responses on the same event loop are read at the same time, so each needs its own parser.
+        reader = ResponseReader(raw_response.status_code, self.max_response_size, create_parser())
+        try:
+            with self.tracer.span('ideal.parse'):
+                async for chunk in raw_response.iter_content():
+                    reader.feed(chunk)
+                return reader.close()
+        except XMLSyntaxError as e:
+            raise IdealServerException('iDEAL response could not be parsed: {error}'.format(error=e))
+        except BaseException:
+            # Includes the cancellation of a hedged attempt that lost.
+            reader.abort()
+            raise
+        finally:
+            await raw_response.close()
+
+    async def _exchange(self, request, priority, hedge=False):
+        with self.tracer.span('ideal.http'):
+            raw_response = await self.transport.send(request, priority, hedge)
+
+        return raw_response, await self._read(raw_response)
+
+    async def _send(self, request, priority, hedge=False, log_payload=False):
+        # The connection is in use until the body is read, so the slot is held until then.
+        if self.limiter is not None:
+            async with self.limiter.slot(priority):
+                raw_response, result = await self._exchange(request, priority, hedge)
+        else:
+            raw_response, result = await self._exchange(request, priority, hedge)
+
+        return self._create_verified_response(raw_response, result, request, log_payload)
+
+    async def _send_hedged(self, request, priority, message_type, log_payload=False):
+        """
+        Perform the HTTP exchange for given idempotent ``request``, see
+        :meth:`ideal.client.IdealClient._send_hedged`. The attempt that loses is cancelled.
+        """
+        # Every attempt is timed from the start of the request, so a hedge that wins does not lower the percentile.
+        start = time.time()
+
+        async def attempt(hedge):
+            try:
+                response = await self._send(request, priority, hedge, log_payload)
+            except IdealResponseException:
+                # The acquirer gave a verified answer, it's just not a positive one.
+                self.hedge_policy.record(message_type, time.time() - start)
+                raise
+            self.hedge_policy.record(message_type, time.time() - start)
+            return response
+
+        delay = self.hedge_policy.get_delay(message_type)
+        if delay is None or not self.hedge_policy.allow_hedge(claim=False):
+            return await attempt(False)
+
+        pending = {asyncio.ensure_future(attempt(False))}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                if self.hedge_policy.allow_hedge():
+                    logger.debug('Hedging %(message_type)s after %(delay).3fs.', {
+                        'message_type': message_type,
+                        'delay': delay,
+                    })
+                    pending.add(asyncio.ensure_future(attempt(True)))
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+            first_error = None
+            while True:
+                for task in done:
+                    error = task.exception()
+                    if error is None or isinstance(error, IdealResponseException):
+                        return task.result()
+                    if first_error is None:
+                        first_error = error
+                if not pending:
+                    raise first_error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _request(self, data, priority=RequestPriority.INTERACTIVE, idempotent=False):
+        request, log_payload = self._prepare_request(data)
+
+        if idempotent and self.hedge_policy is not None:
+            response = await self._send_hedged(request, priority, get_message_type(data), log_payload)
+        else:
+            response = await self._send(request, priority, log_payload=log_payload)
+
+        self._log_exchange(request, response, log_payload)
+
+        return response
+
+    async def warmup(self, issuers=True):
+        """
+        Load everything that is otherwise loaded by the first request, see :meth:`ideal.client.IdealClient.warmup`.
+        The connections belong to the running event loop.
+        """
+        self._load()
+
+        if issuers:
+            return await self.get_issuers(priority=RequestPriority.INTERACTIVE)
+
+    async def get_issuers(self, priority=RequestPriority.BACKGROUND):
+        """
+        Sends a "DirectoryReq" to iDEAL, see :meth:`ideal.client.IdealClient.get_issuers`.
+
+        :return: A :class: `DirectoryResponse` object.
+        """
+        with self._trace_request('DirectoryReq'):
+            data = self._render('templates/directory_request.xml', self._get_context())
+            r = await self._request(data, priority=priority, idempotent=True)
+
+            return DirectoryResponse(r)
+
+    async def start_transaction(self, issuer_id, purchase_id, amount, description, entrance_code=None,
+                                merchant_return_url=None, expiration_period=None, language=None,
+                                priority=RequestPriority.INTERACTIVE):
+        """
+        Send an "AcquirerTrxReq" to iDEAL, see :meth:`ideal.client.IdealClient.start_transaction`.
+
+        :return: A :class:`TransactionResponse` object.
+        """
+        context = self._get_transaction_context(
+            issuer_id, purchase_id, amount, description, entrance_code, merchant_return_url, expiration_period,
+            language)
+
+        with self._trace_request('AcquirerTrxReq'):
+            data = self._render('templates/transaction_request.xml', context)
+            r = await self._request(data, priority=priority)
+
+            response = TransactionResponse(r)
+
+        response.entrance_code = context['entrance_code']
+
+        return response
+
+    async def get_transaction_status(self, transaction_id, priority=RequestPriority.BACKGROUND):
+        """
+        Sends an "AcquirerStatus" request to iDEAL, see :meth:`ideal.client.IdealClient.get_transaction_status`.
+
+        :return: A :class:`TransactionResponse` object.
+        """
+        context = self._get_context(transaction_id=transaction_id)
+
+        with self._trace_request('AcquirerStatusReq'):
+            data = self._render('templates/transaction_status_request.xml', context)
+            r = await self._request(data, priority=priority, idempotent=True)
+
+            return StatusResponse(r)
+
+
+# The asynchronous clients that are shared by the whole process.
+async_clients = ClientRegistry(client_class=AsyncIdealClient)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=async_clients.reset)
+
+
+def get_async_client(settings=None, **kwargs):
+    """
+    Return a shared :class:`AsyncIdealClient` for given settings, see :meth:`ideal.client.ClientRegistry.get`. The
+    client can be used from any event loop, each event loop gets its own connections.
+    """
+    return async_clients.get(settings, **kwargs)
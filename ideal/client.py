@@ -1,22 +1,42 @@
 import datetime
 import hashlib
 import logging
+import os
+import sys
+import threading
+import time
 import uuid
 from decimal import Decimal
-from io import BytesIO
 
-import dateutil.parser
-import requests
-from lxml import etree
-from lxml.etree import QName, XMLSyntaxError
+import six
+from six.moves import queue
 
-from ideal.conf import settings
+from ideal.concurrency import PriorityLimiter, RequestPriority
+from ideal.conf import SettingsSnapshot
+from ideal.conf import settings as default_settings
 from ideal.exceptions import IdealResponseException, IdealSecurityException, IdealServerException
-from ideal.security import Security
-from ideal.utils import IDEAL_NAMESPACES, convert_camelcase, render_to_string
+from ideal.log import LazyBody, LazyHeaders, LogSampler
+from ideal.metrics import registry as default_registry
+from ideal.parsers import DEFAULT_MAX_SIZE, IncrementalParser, get_parser, parse_xml
+from ideal.security import MessageDigest, Security
+from ideal.tracing import NULL_SPAN, Tracer
+from ideal.tracing import tracer as default_tracer
+from ideal.transports import RequestsTransport, get_shared_transport
+from ideal.utils import IDEAL_NAMESPACES, convert_camelcase, get_message_type, get_template, render_to_bytes
 
 logger = logging.getLogger(__name__)
 
+XML_DECLARATION = b'<?xml version="1.0" encoding="utf-8"?>'
+
+# The templates of all requests, see IdealClient.warmup.
+TEMPLATES = (
+    'templates/directory_request.xml', 'templates/transaction_request.xml', 'templates/transaction_status_request.xml',
+    'templates/signed_info.xml', 'templates/signature.xml',
+)
+
+# The number of characters of an unsuccessful response to include in the exception.
+ERROR_BODY_MAX_SIZE = 500
+
 
 class HttpRequest(dict):
     """
@@ -196,6 +216,8 @@ class StatusResponse(IdealResponse):
     currency = None
 
     def _parse(self, xml):
+        import dateutil.parser
+        from lxml.etree import QName
 
         self.acquirer_id = xml.xpath(
             'ideal:Acquirer/ideal:acquirerID', namespaces=IDEAL_NAMESPACES)[0].text
@@ -212,18 +234,156 @@ class StatusResponse(IdealResponse):
             setattr(self, attr, val)
 
 
+class ResponseReader(object):
+    """
+    Collects the chunks of a response body. Successful responses are parsed and digested while the chunks arrive.
+    """
+    def __init__(self, status_code, max_size=DEFAULT_MAX_SIZE, parser=None):
+        """
+        :param status_code: The HTTP status code of the response.
+        :param max_size: Maximum size in bytes of the body, or ``None`` for no limit (optional). Default\: 1 MiB.
+        :param parser: The XML parser, see :class:`ideal.parsers.IncrementalParser` (optional). Default\: the parser
+                       of the current thread.
+        """
+        self.max_size = max_size
+        self.chunks = []
+        self.size = 0
+        if status_code == 200:
+            self.parser = IncrementalParser(parser)
+            self.message_digest = MessageDigest()
+        else:
+            self.parser = self.message_digest = None
+
+    def feed(self, chunk):
+        """
+        Add the next chunk of the body.
+
+        :param chunk: The chunk as bytes.
+        """
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            raise IdealServerException('iDEAL response exceeds the maximum size of {max_size} bytes.'.format(
+                max_size=self.max_size))
+        self.chunks.append(chunk)
+        if self.parser is not None:
+            self.parser.feed(chunk)
+            self.message_digest.update(chunk)
+
+    def close(self):
+        """
+        Finish reading.
+
+        :return: Tuple of the content as bytes, the parsed content and the :class:`ideal.security.MessageDigest`. The
+                 latter two are ``None`` if the response was not successful.
+        """
+        xml_document = self.parser.close() if self.parser is not None else None
+        return b''.join(self.chunks), xml_document, self.message_digest
+
+    def abort(self):
+        """
+        Stop reading after an error.
+        """
+        if self.parser is not None:
+            self.parser.abort()
+
+
 class IdealClient(object):
     """
     The iDEAL client to communicate with iDEAL.
 
     All messages are signed before they are sent to the bank's endpoint. All responses are verified against the iDEAL
     certificate(s).
+
+    Requests are either interactive (the customer is waiting for them) or background work. By setting
+    ``max_concurrency``, the number of concurrent requests is limited and ``interactive_reserve`` of those slots, and
+    their connections, are kept available for interactive requests only. See
+    :class:`ideal.concurrency.RequestPriority`.
     """
-    def __init__(self):
+    limiter_class = PriorityLimiter
+
+    def __init__(self, max_concurrency=None, interactive_reserve=0, hedge_policy=None, tracer=None, metrics=None,
+                 log_body_max_size=None, log_sample_rate=1.0, transport=None, max_response_size=DEFAULT_MAX_SIZE,
+                 settings=None):
+        """
+        :param max_concurrency: Maximum number of concurrent requests to the acquirer (optional). Default\: unlimited.
+        :param interactive_reserve: Number of concurrent requests reserved for interactive requests (optional).
+                                    Default\: 0.
+        :param hedge_policy: A :class:`ideal.hedging.HedgePolicy` to hedge slow idempotent requests, like
+                             ``get_issuers`` and ``get_transaction_status`` (optional). Default\: no hedging.
+        :param tracer: A :class:`ideal.tracing.Tracer` to emit timed spans of each request phase to (optional).
+                       Default\: ``ideal.tracing.tracer``.
+        :param metrics: A :class:`ideal.metrics.MetricsRegistry` to record request counts, errors and latencies in, or
+                        ``False`` to disable metrics (optional). Default\: ``ideal.metrics.registry``.
+        :param log_body_max_size: Maximum number of characters of a request or response body to log at DEBUG level,
+                                  after sensitive values are redacted (optional). Default\: no limit.
+        :param log_sample_rate: Fraction of requests, between 0 and 1, to log the payload of at DEBUG level. The
+                                others are logged with a single line at INFO level (optional). Default\: 1.
+        :param transport: A :class:`ideal.transports.Transport` to perform the HTTP exchange with (optional).
+                          Default\: a :class:`ideal.transports.RequestsTransport`.
+        :param max_response_size: Maximum size in bytes of a response, or ``None`` for no limit (optional).
+                                  Default\: 1 MiB.
+        :param settings: The settings of this client, typically a :class:`ideal.conf.SettingsSnapshot` to serve more
+                         than one merchant from one process (optional). Default\: ``ideal.conf.settings``.
+        """
+        if settings is None:
+            settings = default_settings
+        self.settings = settings
         self.security = Security()
 
         # All settings should be correct before instantiating a client.
-        settings.validate()
+        self.settings.validate()
+
+        if max_concurrency is not None:
+            self.limiter = self.limiter_class(max_concurrency, interactive_reserve)
+        else:
+            self.limiter = None
+
+        self.hedge_policy = hedge_policy
+        self.max_response_size = max_response_size
+        self.log_body_max_size = log_body_max_size
+        self.log_sampler = LogSampler(log_sample_rate)
+        if tracer is None:
+            tracer = default_tracer
+
+        if metrics is None:
+            metrics = default_registry
+
+        if metrics is False:
+            self.metrics = None
+            self.tracer = tracer
+        else:
+            self.metrics = metrics
+            self.tracer = Tracer(hooks=[metrics], parent=tracer)
+
+        # Each priority has its own connection pool in the transport, sized by the limiter. Without a limiter, all
+        # clients share the connection pools of one transport.
+        if transport is None:
+            transport = self.get_default_transport()
+        if transport.limiter is None:
+            transport.limiter = self.limiter
+        self.transport = transport
+
+    def get_default_transport(self):
+        """
+        Return the transport to use if none is given.
+
+        :return: A :class:`ideal.transports.RequestsTransport` object.
+        """
+        return RequestsTransport() if self.limiter is not None else get_shared_transport()
+
+    def _trace_request(self, message_type):
+        """
+        Return the root span of a request, that carries the message type and acquirer to all phases.
+
+        :param message_type: The request message type, for example ``DirectoryReq``.
+
+        :return: A :class:`ideal.tracing.Span` object.
+        """
+        if not self.tracer:
+            return NULL_SPAN
+
+        return self.tracer.span('ideal.request', message_type=message_type,
+                                acquirer=self.settings.ACQUIRER or self.settings.get_acquirer_url())
 
     def _get_context(self, **kwargs):
         """
@@ -236,38 +396,53 @@ class IdealClient(object):
         now = datetime.datetime.now()
 
         context = {
-            'merchant_id': settings.MERCHANT_ID,
-            'sub_id': settings.SUB_ID,
+            'merchant_id': self.settings.MERCHANT_ID,
+            'sub_id': self.settings.SUB_ID,
             'timestamp': now.strftime('%Y-%m-%dT%H:%M:%S.000Z')  # TODO: now.isoformat() ?
         }
         context.update(kwargs)
 
         return context
 
+    def _render(self, template_name, context):
+        """
+        Render the unsigned request message.
+
+        :return: The message as bytes.
+        """
+        with self.tracer.span('ideal.render'):
+            return render_to_bytes(template_name, context)
+
     def create_request(self, body=None):
         """
         Create a request suited for communicating with iDEAL.
         NOTE: All requests are signed.
 
-        :param body: The unsigned data to send.
+        :param body: The unsigned data to send, as bytes. Strings are encoded as UTF-8.
 
-        :return: A :class:`HttpRequest` object.
+        :return: A :class:`HttpRequest` object, with the signed body as bytes.
         """
-        body = self.security.sign_message(
-            body, settings.PRIVATE_CERTIFICATE, settings.PRIVATE_KEY_FILE, settings.PRIVATE_KEY_PASSWORD)
+        if isinstance(body, six.text_type):
+            body = body.encode('utf-8')
+
+        # The declaration is added while signing, to avoid another copy of the message.
+        declaration = None if body.startswith(b'<?') else XML_DECLARATION
 
-        if body and not body.startswith('<?'):
-            body = '<?xml version="1.0" encoding="utf-8"?>' + body
+        with self.tracer.span('ideal.sign'):
+            body = self.security.sign_message(
+                body, self.settings.PRIVATE_CERTIFICATE, self.settings.PRIVATE_KEY_FILE,
+                self.settings.PRIVATE_KEY_PASSWORD, declaration)
 
         headers = {
             'content-type': 'text/xml; charset="utf-8"'
         }
 
-        uri = settings.get_acquirer_url()
+        uri = self.settings.get_acquirer_url()
 
         return HttpRequest(uri, 'POST', body, headers)
 
-    def create_response(self, response_headers, response_content, status_code, request):
+    def create_response(self, response_headers, response_content, status_code, request, xml_document=None,
+                        message_digest=None):
         """
         Create a response from all arguments.
         NOTE: All responses are verified.
@@ -276,25 +451,35 @@ class IdealClient(object):
         :param response_content: All data from the response.
         :param status_code: The HTTP status code.
         :param request: The original :class:`HttpRequest` object.
+        :param xml_document: The already parsed response content (optional).
+        :param message_digest: The :class:`ideal.security.MessageDigest` that was already fed the response content
+                               (optional).
 
         :return: A :class:`HttpResponse` object.
         """
+        from lxml.etree import XMLSyntaxError
+
         response = HttpResponse(self, response_headers, response_content, status_code, request)
 
         if response.status_code != 200:
             raise IdealServerException('iDEAL server returned HTTP {status_code}: {message}'.format(
                 status_code=response.status_code,
-                message=response.content,
+                message=LazyBody(response.content, ERROR_BODY_MAX_SIZE, redact=False),
             ))
 
-        try:
-            xml_document = etree.parse(BytesIO(response.content))
-        except XMLSyntaxError as e:
-            raise IdealServerException('iDEAL response could not be parsed: {error}'.format(error=e))
+        if xml_document is None:
+            try:
+                with self.tracer.span('ideal.parse'):
+                    xml_document = parse_xml(response.content, self.max_response_size)
+            except XMLSyntaxError as e:
+                raise IdealServerException('iDEAL response could not be parsed: {error}'.format(error=e))
 
         response.xml = xml_document
 
-        if not self.security.verify(response.content, settings.CERTIFICATES):
+        with self.tracer.span('ideal.verify'):
+            verified = self.security.verify(
+                response.content, self.settings.CERTIFICATES, xml_document, message_digest)
+        if not verified:
             raise IdealSecurityException('iDEAL response could not be verified.')
 
         if xml_document.xpath('count(//ideal:Error)', namespaces=IDEAL_NAMESPACES) > 0:
@@ -302,65 +487,276 @@ class IdealClient(object):
 
         return response
 
-    def _request(self, data):
+    def _read(self, raw_response):
+        """
+        Read the body of a streamed response. Successful responses are parsed and digested while the chunks arrive.
+
+        :param raw_response: The :class:`ideal.transports.TransportResponse` object.
+
+        :return: Tuple of the content as bytes, the parsed content and the :class:`ideal.security.MessageDigest`. The
+                 latter two are ``None`` if the response was not successful.
         """
-        Constructs a :class:`HttpRequest` object, performs the actual request using the ``requests`` library, and
-        return a :class:`HttpResponse` object. This function can be easily overridden to mock requests or to replace
-        the ``requests`` library with any other library.
+        from lxml.etree import XMLSyntaxError
 
-        :param data: The stringified payload to send to iDEAL.
+        reader = ResponseReader(raw_response.status_code, self.max_response_size)
+        try:
+            with self.tracer.span('ideal.parse'):
+                for chunk in raw_response.iter_content():
+                    reader.feed(chunk)
+                return reader.close()
+        except XMLSyntaxError as e:
+            raise IdealServerException('iDEAL response could not be parsed: {error}'.format(error=e))
+        except Exception:
+            reader.abort()
+            raise
+        finally:
+            raw_response.close()
+
+    def _exchange(self, request, priority, hedge=False):
+        """
+        Send the ``request`` and read the streamed response.
+
+        :return: Tuple of the :class:`ideal.transports.TransportResponse` object and the result of :meth:`_read`.
+        """
+        with self.tracer.span('ideal.http'):
+            raw_response = self.transport.send(request, priority, hedge)
+
+        return raw_response, self._read(raw_response)
+
+    def _send(self, request, priority, hedge=False, log_payload=False):
+        """
+        Perform the HTTP exchange for given ``request`` and return the verified response.
+
+        :param request: The :class:`HttpRequest` object to send.
+        :param priority: Any of the constants in :class:`RequestPriority`.
+        :param hedge: ``True`` if this is a hedged attempt, that uses separate connections (optional).
+                      Default\: ``False``.
+        :param log_payload: ``True`` to log the response headers and body at DEBUG level (optional).
+                            Default\: ``False``.
 
         :return: A :class:`HttpResponse` object.
         """
-        logger.debug('Creating request with data: %(data)s', {'data': data})
+        # The connection is in use until the body is read, so the slot is held until then.
+        if self.limiter is not None:
+            with self.limiter.slot(priority):
+                raw_response, result = self._exchange(request, priority, hedge)
+        else:
+            raw_response, result = self._exchange(request, priority, hedge)
 
-        request = self.create_request(data)
+        return self._create_verified_response(raw_response, result, request, log_payload)
 
-        logger.debug('Performing request: %(request_method)s %(url)s\n%(request_headers)s\n\n%(body)s', {
-            'request_method': request.method,
-            'url': request.uri,
-            'request_headers': '\n'.join(['%s: %s' % (k, v) for k, v in request.headers.items()]),
-            'body': request.body,
-        })
+    def _create_verified_response(self, raw_response, result, request, log_payload=False):
+        """
+        Log the response that was read by :meth:`_read` and return it verified.
 
-        raw_response = requests.request(request.method, request.uri, data=request.body, headers=request.headers)
+        :return: A :class:`HttpResponse` object.
+        """
+        content, xml_document, message_digest = result
 
-        logger.debug('Recieved response: HTTP %(response_status)s\n%(response_headers)s\n\n%(data)s', {
-            'response_status': raw_response.status_code,
-            'response_headers': '\n'.join(['%s: %s' % (k, v) for k, v in raw_response.headers.items()]),
-            'data': raw_response.content,
-        })
+        if log_payload:
+            logger.debug('Recieved response: HTTP %(response_status)s\n%(response_headers)s\n\n%(data)s', {
+                'response_status': raw_response.status_code,
+                'response_headers': LazyHeaders(raw_response.headers),
+                'data': LazyBody(content, self.log_body_max_size),
+            })
+
+        return self.create_response(
+            raw_response.headers, content, raw_response.status_code, request, xml_document, message_digest)
+
+    def _send_hedged(self, request, priority, message_type, log_payload=False):
+        """
+        Perform the HTTP exchange for given idempotent ``request``, sending one duplicate request over a separate
+        connection if the first attempt is slower than the hedge policy allows. The first verified response wins.
+
+        :param request: The :class:`HttpRequest` object to send.
+        :param priority: Any of the constants in :class:`RequestPriority`.
+        :param message_type: The request message type, for example ``AcquirerStatusReq``.
+        :param log_payload: ``True`` to log the response headers and body at DEBUG level (optional).
+                            Default\: ``False``.
+
+        :return: A :class:`HttpResponse` object.
+        """
+        results = queue.Queue()
+        parent_span = self.tracer.current_span()
+        # Every attempt is timed from the start of the request, so a hedge that wins does not lower the percentile.
+        start = time.time()
+
+        def attempt(hedge):
+            try:
+                with self.tracer.activate(parent_span):
+                    response = self._send(request, priority, hedge, log_payload)
+            except IdealResponseException:
+                # The acquirer gave a verified answer, it's just not a positive one.
+                self.hedge_policy.record(message_type, time.time() - start)
+                results.put((False, sys.exc_info()))
+            except Exception:
+                results.put((False, sys.exc_info()))
+            else:
+                self.hedge_policy.record(message_type, time.time() - start)
+                results.put((True, response))
+
+        def start_attempt(hedge):
+            thread = threading.Thread(target=attempt, args=(hedge, ))
+            thread.daemon = True
+            thread.start()
+
+        delay = self.hedge_policy.get_delay(message_type)
+        pending = 1
+
+        if delay is None or not self.hedge_policy.allow_hedge(claim=False):
+            # No hedge can be sent, so there is no need for another thread.
+            attempt(False)
+            result = results.get()
+        else:
+            start_attempt(False)
+            try:
+                result = results.get(timeout=delay)
+            except queue.Empty:
+                if self.hedge_policy.allow_hedge():
+                    logger.debug('Hedging %(message_type)s after %(delay).3fs.', {
+                        'message_type': message_type,
+                        'delay': delay,
+                    })
+                    start_attempt(True)
+                    pending += 1
+                result = results.get()
+
+        pending -= 1
+        first_error = None
+        while True:
+            success, value = result
+            if success:
+                return value
+            if issubclass(value[0], IdealResponseException):
+                six.reraise(*value)
+            if first_error is None:
+                first_error = value
+            if not pending:
+                six.reraise(*first_error)
+
+            result = results.get()
+            pending -= 1
+
+    def _request(self, data, priority=RequestPriority.INTERACTIVE, idempotent=False):
+        """
+        Constructs a :class:`HttpRequest` object, performs the actual request using the client's transport, and
+        return a :class:`HttpResponse` object. To mock requests or to use another HTTP library, pass a
+        :class:`ideal.transports.Transport` to the client.
+
+        :param data: The payload to send to iDEAL, as bytes or string.
+        :param priority: Any of the constants in :class:`RequestPriority` (optional). Default\: interactive.
+        :param idempotent: ``True`` if the request can safely be sent more than once, which allows hedging (optional).
+                           Default\: ``False``.
+
+        :return: A :class:`HttpResponse` object.
+        """
+        request, log_payload = self._prepare_request(data)
+
+        if idempotent and self.hedge_policy is not None:
+            response = self._send_hedged(request, priority, get_message_type(data), log_payload)
+        else:
+            response = self._send(request, priority, log_payload=log_payload)
+
+        self._log_exchange(request, response, log_payload)
 
-        response = self.create_response(raw_response.headers, raw_response.content, raw_response.status_code, request)
+        return response
+
+    def _prepare_request(self, data):
+        """
+        Create the signed request for given ``data`` and decide whether its payload is logged.
+
+        :return: Tuple of the :class:`HttpRequest` object and ``True`` if the payload is logged.
+        """
+        # Only sampled requests have their payload logged, and nothing is formatted unless the record is emitted.
+        log_payload = logger.isEnabledFor(logging.DEBUG) and self.log_sampler.sample()
 
-        # If logging is set to DEBUG, don't log this. All details are logged in DEBUG level above.
-        if logger.level >= logging.INFO:
+        if log_payload:
+            logger.debug('Creating request with data: %(data)s', {
+                'data': LazyBody(data, self.log_body_max_size),
+            })
+
+        request = self.create_request(data)
+
+        if log_payload:
+            logger.debug('Performing request: %(request_method)s %(url)s\n%(request_headers)s\n\n%(body)s', {
+                'request_method': request.method,
+                'url': request.uri,
+                'request_headers': LazyHeaders(request.headers),
+                'body': LazyBody(request.body, self.log_body_max_size),
+            })
+
+        return request, log_payload
+
+    def _log_exchange(self, request, response, log_payload):
+        # If the payload was logged in DEBUG level above, don't log this. All details are logged already.
+        if not log_payload and logger.isEnabledFor(logging.INFO):
             logger.info('%(request_method)s %(url)s (HTTP %(response_status)s)', {
                 'request_method': request.method,
                 'url': request.uri,
                 'response_status': response.status_code
             })
 
-        return response
+    def warmup(self, issuers=True):
+        """
+        Load everything that is otherwise loaded by the first request: The key and certificates, the templates, the
+        XML parser, a connection to the acquirer and the issuers. Call this before the first customer arrives, for
+        example when a worker starts.
+
+        The loaded keys, certificates and templates are kept in forked processes, like the workers of a gunicorn
+        ``preload_app`` master, but the connections are not: call this again in each worker to connect.
+
+        :param issuers: ``True`` to request the issuers, which also opens a connection for interactive requests
+                        (optional). Default\: ``True``.
+
+        :return: A :class:`DirectoryResponse` object if ``issuers`` is ``True``, ``None`` otherwise.
+        """
+        self._load()
+
+        if issuers:
+            # The issuers are typically requested while the customer waits, as is the transaction.
+            return self.get_issuers(priority=RequestPriority.INTERACTIVE)
+
+    def _load(self):
+        """
+        Load the key and certificates, the templates and the XML parser, see :meth:`warmup`.
+        """
+        self.settings.validate()
 
-    def get_issuers(self):
+        password = self.settings.PRIVATE_KEY_PASSWORD
+        if isinstance(password, six.text_type):
+            password = password.encode('utf-8')
+
+        key_store = self.security.key_store
+        key_store.get_private_key(self.settings.PRIVATE_KEY_FILE, password)
+        key_store.get_fingerprint(self.settings.PRIVATE_CERTIFICATE)
+        for cert_file in self.settings.CERTIFICATES:
+            key_store.get_certificate(cert_file)
+            key_store.get_fingerprint(cert_file)
+
+        for template_file in TEMPLATES:
+            get_template(template_file)
+        get_parser()
+
+    def get_issuers(self, priority=RequestPriority.BACKGROUND):
         """
         Sends a "DirectoryReq" to iDEAL to retrieve a list of issuers (banks).
 
         NOTE: The iDEAL documentation indicates you should get a list of issuers (ie. call this function) every time
         you want to show a list of issuers. Cache these issuers locally; they update rarily.
 
+        :param priority: Any of the constants in :class:`RequestPriority` (optional). Default\: background.
+
         :return: A :class: `DirectoryResponse` object.
         """
-        context = self._get_context()
-        data = render_to_string('templates/directory_request.xml', context)
+        with self._trace_request('DirectoryReq'):
+            data = self._render('templates/directory_request.xml', self._get_context())
+            r = self._request(data, priority=priority, idempotent=True)
 
-        r = self._request(data)
-
-        return DirectoryResponse(r)
+            return DirectoryResponse(r)
 
     def start_transaction(self, issuer_id, purchase_id, amount, description, entrance_code=None,
-                          merchant_return_url=None, expiration_period=None, language=None):
+                          merchant_return_url=None, expiration_period=None, language=None,
+                          priority=RequestPriority.INTERACTIVE):
         """
         Send an "AcquirerTrxReq" to iDEAL, starting the payment process.
 
@@ -376,18 +772,39 @@ class IdealClient(object):
         :param merchant_return_url: Override the callback URL (optional). Default\: ``settings.MERCHANT_RETURN_URL``.
         :param expiration_period: Override the expiration period (optional). Default: ``settings.EXPIRATION_PERIOD``.
         :param language: Override the language (optional). Default\: ``settings.LANGUAGE``.
+        :param priority: Any of the constants in :class:`RequestPriority` (optional). Default\: interactive.
 
         :return: A :class:`TransactionResponse` object.
         """
+        context = self._get_transaction_context(
+            issuer_id, purchase_id, amount, description, entrance_code, merchant_return_url, expiration_period,
+            language)
+
+        with self._trace_request('AcquirerTrxReq'):
+            data = self._render('templates/transaction_request.xml', context)
+            r = self._request(data, priority=priority)
+
+            response = TransactionResponse(r)
+
+        # Not an actual part of the response, but can be generated in this function and made conveniently accessible.
+        response.entrance_code = context['entrance_code']
+
+        return response
+
+    def _get_transaction_context(self, issuer_id, purchase_id, amount, description, entrance_code=None,
+                                 merchant_return_url=None, expiration_period=None, language=None):
+        """
+        Return the context of an "AcquirerTrxReq", see :meth:`start_transaction`.
+        """
         if merchant_return_url is None:
-            merchant_return_url = settings.MERCHANT_RETURN_URL
+            merchant_return_url = self.settings.MERCHANT_RETURN_URL
         if language is None:
-            language = settings.LANGUAGE
+            language = self.settings.LANGUAGE
         if entrance_code is None:
             entrance_code = hashlib.sha1(
                 uuid.uuid4().hex.encode('utf-8')).hexdigest()
         if expiration_period is None:
-            expiration_period = settings.EXPIRATION_PERIOD
+            expiration_period = self.settings.EXPIRATION_PERIOD
 
         try:
             if str(int(expiration_period)) == str(expiration_period):
@@ -409,18 +826,9 @@ class IdealClient(object):
             'entrance_code': entrance_code,
         })
 
-        data = render_to_string('templates/transaction_request.xml', context)
-
-        r = self._request(data)
-
-        response = TransactionResponse(r)
-
-        # Not an actual part of the response, but can be generated in this function and made conveniently accessible.
-        response.entrance_code = entrance_code
-
-        return response
+        return context
 
-    def get_transaction_status(self, transaction_id):
+    def get_transaction_status(self, transaction_id, priority=RequestPriority.BACKGROUND):
         """
         Sends an "AcquirerStatus" request to iDEAL to retrieve the status of given transaction.
 
@@ -429,6 +837,8 @@ class IdealClient(object):
         and ``ec``.
 
         :param transaction_id: The value of ``trxid`` query string parameter.
+        :param priority: Any of the constants in :class:`RequestPriority` (optional). Default\: background. Use
+                         interactive if the customer is waiting for the result, for example in the callback view.
 
         :return: A :class:`TransactionResponse` object.
         """
@@ -439,8 +849,87 @@ class IdealClient(object):
             'transaction_id': transaction_id,
         })
 
-        data = render_to_string('templates/transaction_status_request.xml', context)
+        with self._trace_request('AcquirerStatusReq'):
+            data = self._render('templates/transaction_status_request.xml', context)
+            r = self._request(data, priority=priority, idempotent=True)
 
-        r = self._request(data)
+            return StatusResponse(r)
 
-        return StatusResponse(r)
+
+class ClientRegistry(object):
+    """
+    Hands out one shared :class:`IdealClient` per distinct configuration, so the settings are validated once and the
+    client's connections and caches are reused. The clients are thread-safe.
+    """
+    def __init__(self, max_size=64, client_class=None):
+        """
+        :param max_size: The maximum number of clients to keep (optional). Default\: 64.
+        :param client_class: The class of the clients (optional). Default\: :class:`IdealClient`.
+        """
+        self.max_size = max_size
+        self.client_class = client_class
+
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._order = []
+
+    def get(self, settings=None, **kwargs):
+        """
+        Return the client for given settings and client arguments, creating it if needed.
+
+        :param settings: A :class:`ideal.conf.Settings` object (optional). Default\: ``ideal.conf.settings``.
+        :param \*\*kwargs: Arguments for the client class. Their values should be hashable (optional).
+
+        :return: A :class:`IdealClient` object.
+        """
+        if settings is None:
+            settings = default_settings
+
+        # Changed settings give a different key. Changed files are detected by validating the snapshot.
+        key = (settings._values(), tuple(sorted(kwargs.items())))
+
+        client = self._clients.get(key)
+        if client is not None:
+            client.settings.validate()
+            return client
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                snapshot = settings if isinstance(settings, SettingsSnapshot) else settings.snapshot()
+                client_class = self.client_class or IdealClient
+                client = self._clients[key] = client_class(settings=snapshot, **kwargs)
+
+                self._order.append(key)
+                while len(self._order) > self.max_size:
+                    self._clients.pop(self._order.pop(0), None)
+
+        return client
+
+    def clear(self):
+        """
+        Forget all clients.
+        """
+        with self._lock:
+            self._clients = {}
+            self._order = []
+
+    def reset(self):
+        """
+        Keep the clients, but replace the lock, which may be held by another thread in a forked process.
+        """
+        self._lock = threading.Lock()
+
+
+# The clients that are shared by the whole process.
+clients = ClientRegistry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=clients.reset)
+
+
+def get_client(settings=None, **kwargs):
+    """
+    Return a shared :class:`IdealClient` for given settings, see :meth:`ClientRegistry.get`.
+    """
+    return clients.get(settings, **kwargs)
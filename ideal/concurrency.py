@@ -0,0 +1,101 @@
+import threading
+from contextlib import contextmanager
+
+from ideal.exceptions import IdealConfigurationException
+
+
+class RequestPriority(object):
+    INTERACTIVE = 'interactive'  # Customer-facing calls, like starting a transaction. May use all capacity.
+    BACKGROUND = 'background'  # Bulk work, like polling transaction statuses. Only uses spare capacity.
+
+
+class PriorityLimiter(object):
+    """
+    Limits the number of concurrent requests to the acquirer, while reserving part of that capacity for interactive
+    requests.
+
+    Background requests can only use the capacity that is not reserved. If a slot frees up while both interactive and
+    background requests are waiting, the interactive request goes first.
+    """
+    def __init__(self, max_concurrency, interactive_reserve=0):
+        """
+        :param max_concurrency: Maximum number of concurrent requests, for all priorities combined.
+        :param interactive_reserve: Number of slots that only interactive requests can use (optional). Default\: 0.
+        """
+        if max_concurrency < 1:
+            raise IdealConfigurationException('The maximum concurrency must be at least 1.')
+
+        if not 0 <= interactive_reserve < max_concurrency:
+            raise IdealConfigurationException(
+                'The interactive reserve ({reserve}) must be lower than the maximum concurrency ({max}).'.format(
+                    reserve=interactive_reserve,
+                    max=max_concurrency,
+                ))
+
+        self.max_concurrency = max_concurrency
+        self.interactive_reserve = interactive_reserve
+
+        self._condition = threading.Condition()
+        self._in_use = 0
+        self._interactive_waiting = 0
+
+    @property
+    def in_use(self):
+        return self._in_use
+
+    def capacity(self, priority):
+        """
+        Return the number of concurrent requests available to given ``priority``.
+
+        :param priority: Any of the constants in :class:`RequestPriority`.
+
+        :return: The number of slots.
+        """
+        if priority == RequestPriority.INTERACTIVE:
+            return self.max_concurrency
+        return self.max_concurrency - self.interactive_reserve
+
+    def acquire(self, priority):
+        """
+        Block until a slot is available for given ``priority`` and claim it.
+
+        :param priority: Any of the constants in :class:`RequestPriority`.
+        """
+        capacity = self.capacity(priority)
+        interactive = priority == RequestPriority.INTERACTIVE
+
+        with self._condition:
+            if interactive:
+                self._interactive_waiting += 1
+                try:
+                    while self._in_use >= capacity:
+                        self._condition.wait()
+                finally:
+                    self._interactive_waiting -= 1
+            else:
+                # Background requests step aside as long as interactive requests are waiting.
+                while self._in_use >= capacity or self._interactive_waiting:
+                    self._condition.wait()
+
+            self._in_use += 1
+
+    def release(self):
+        """
+        Release a previously acquired slot.
+        """
+        with self._condition:
+            self._in_use -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, priority):
+        """
+        Context manager that holds a slot for given ``priority`` while the block executes.
+
+        :param priority: Any of the constants in :class:`RequestPriority`.
+        """
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
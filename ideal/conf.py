@@ -29,6 +29,9 @@ class Settings(object):
 
     DEBUG = True
 
+    # The names of all options, see _values.
+    _option_names = None
+
     _ACQUIRERS = {
         'ING': {
             'ACQUIRER_URL': 'https://ideal.secure-ing.com:443/ideal/iDEALv3',
@@ -73,6 +76,21 @@ class Settings(object):
         """
         return [var for var in dir(self) if not var.startswith('_') and not callable(getattr(settings, var))]
 
+    def _values(self):
+        """
+        Return all options and their values, as hashable tuple.
+        """
+        if Settings._option_names is None:
+            Settings._option_names = tuple(self.options())
+
+        values = []
+        for setting_name in Settings._option_names:
+            setting_value = getattr(self, setting_name)
+            if isinstance(setting_value, list):
+                setting_value = tuple(setting_value)
+            values.append((setting_name, setting_value))
+        return tuple(values)
+
     def validate(self):
         """
         Validate all options in this settings object.
@@ -128,5 +146,83 @@ class Settings(object):
 
                 setattr(self, setting_name, config_setting_value)
 
+    def snapshot(self, **kwargs):
+        """
+        Return an immutable copy of these settings, for example to give each merchant its own
+        :class:`ideal.client.IdealClient`.
+
+        :param \*\*kwargs: Options to override, like ``MERCHANT_ID`` (optional).
+
+        :return: A :class:`SettingsSnapshot` object.
+        """
+        values = dict((setting_name, getattr(self, setting_name)) for setting_name in self.options())
+
+        for setting_name, setting_value in kwargs.items():
+            if setting_name not in values:
+                raise IdealConfigurationException('Unknown setting {setting_name}.'.format(setting_name=setting_name))
+            values[setting_name] = setting_value
+
+        return SettingsSnapshot(values)
+
+
+class SettingsSnapshot(Settings):
+    """
+    Immutable settings, see :meth:`Settings.snapshot`. These can be shared by threads without locking.
+    """
+    def __init__(self, values):
+        """
+        :param values: Dictionary of all options.
+        """
+        for setting_name, setting_value in values.items():
+            if setting_name == 'CERTIFICATES' and isinstance(setting_value, list):
+                setting_value = tuple(setting_value)
+            object.__setattr__(self, setting_name, setting_value)
+
+        # The versions of the files when the snapshot was last validated.
+        object.__setattr__(self, '_validated', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Settings snapshots cannot be changed, create a new snapshot instead.')
+
+    def __delattr__(self, name):
+        raise AttributeError('Settings snapshots cannot be changed, create a new snapshot instead.')
+
+    def __eq__(self, other):
+        if not isinstance(other, SettingsSnapshot):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def validate(self):
+        """
+        Validate all options in this snapshot. As the options cannot change, they are only validated again when any of
+        the files changed.
+        """
+        versions = self._get_file_versions()
+        if versions is None or versions != self._validated:
+            super(SettingsSnapshot, self).validate()
+            object.__setattr__(self, '_validated', versions)
+
+    def _get_file_versions(self):
+        """
+        Return the modification time and size of the key and certificate files, or ``None`` if unknown.
+        """
+        if not isinstance(self.CERTIFICATES, (list, tuple)):
+            return None
+
+        versions = []
+        for path in (self.PRIVATE_KEY_FILE, self.PRIVATE_CERTIFICATE) + tuple(self.CERTIFICATES):
+            try:
+                stat = os.stat(path)
+            except (OSError, TypeError):
+                return None
+            versions.append((stat.st_mtime, stat.st_size))
+        return tuple(versions)
+
 
 settings = Settings()
@@ -9,6 +9,7 @@ class IdealConfig(AppConfig):
 
     def ready(self):
         initialize_settings()
+        connect_signals()
 
 
 def initialize_settings():
@@ -20,3 +21,14 @@ def initialize_settings():
         django_setting_value = getattr(django_settings, 'IDEAL_{setting}'.format(setting=setting_name), None)
         if django_setting_value:
             setattr(settings, setting_name, django_setting_value)
+
+
+def connect_signals():
+    from django.db.models.signals import post_delete, post_save
+
+    from ideal.contrib.django.ideal_compat.issuers import invalidate_issuers
+    from ideal.contrib.django.ideal_compat.models import Issuer
+
+    # Changes to single issuers, for example in the admin, also invalidate the cached issuers.
+    post_save.connect(invalidate_issuers, sender=Issuer, dispatch_uid='ideal_invalidate_issuers')
+    post_delete.connect(invalidate_issuers, sender=Issuer, dispatch_uid='ideal_invalidate_issuers')
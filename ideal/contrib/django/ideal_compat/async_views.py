@@ -0,0 +1,75 @@
+"""
+Asynchronous versions of the views, for Django 3.1 and Python 3.7 or later, under ASGI. While a view waits for the
+acquirer, the worker can serve other requests.
+"""
+import asyncio
+from functools import wraps
+
+from ideal.aio import get_async_client
+from ideal.contrib.django.ideal_compat.views import (GetIssuersView, GetTransactionStatusView, IdealViewMixin,
+                                                     StartTransactionView)
+from ideal.exceptions import IdealException
+
+
+class AsyncIdealViewMixin(IdealViewMixin):
+    """
+    Makes a form view of this app asynchronous: its ``call_client`` is awaited, with the shared
+    :class:`ideal.aio.AsyncIdealClient`.
+    """
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super(AsyncIdealViewMixin, cls).as_view(**initkwargs)
+        if asyncio.iscoroutinefunction(view):
+            return view
+
+        # Django < 4.1 only runs function views asynchronously.
+        @wraps(view)
+        async def async_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+
+        return async_view
+
+    @property
+    def client(self):
+        if not hasattr(self, '_client'):
+            self._client = get_async_client()
+        return self._client
+
+    async def get(self, request, *args, **kwargs):
+        return super(AsyncIdealViewMixin, self).get(request, *args, **kwargs)
+
+    async def post(self, request, *args, **kwargs):
+        form = self.get_form()
+        if form.is_valid():
+            return await self.form_valid(form)
+        return self.form_invalid(form)
+
+    async def put(self, *args, **kwargs):
+        return await self.post(*args, **kwargs)
+
+    async def form_valid(self, form):
+        error_message = None
+        response = None
+
+        try:
+            response = await self.call_client(form)
+        except IdealException as e:
+            error_message = e
+
+        return self.render_to_response(
+            self.get_context_data(form=form, response=response, error_message=error_message))
+
+
+class AsyncGetIssuersView(AsyncIdealViewMixin, GetIssuersView):
+    pass
+
+
+class AsyncStartTransactionView(AsyncIdealViewMixin, StartTransactionView):
+    pass
+
+
+class AsyncGetTransactionStatusView(AsyncIdealViewMixin, GetTransactionStatusView):
+    pass
@@ -0,0 +1,47 @@
+from django import forms
+from django.utils.translation import ugettext_lazy as _
+
+from ideal.contrib.django.ideal_compat.issuers import get_issuers
+
+
+def get_issuer_choices(empty_label=None):
+    """
+    Return the choices of an issuer select, grouped by country.
+
+    :param empty_label: The label of the empty choice, or ``None`` for no empty choice (optional).
+
+    :return: List of choices.
+    """
+    choices = [('', empty_label)] if empty_label is not None else []
+    choices.extend((country, list(issuers)) for country, issuers in get_issuers())
+    return choices
+
+
+class IssuerSelect(forms.Select):
+    """
+    Select for issuers, grouped by country.
+    """
+    def __init__(self, attrs=None, choices=()):
+        final_attrs = {'class': 'ideal-issuer-select'}
+        if attrs:
+            final_attrs.update(attrs)
+        super(IssuerSelect, self).__init__(final_attrs, choices)
+
+
+class IssuerChoiceField(forms.ChoiceField):
+    """
+    Choice of one of the active issuers. The choices are taken from the issuer cache each time a form is created.
+    """
+    widget = IssuerSelect
+
+    def __init__(self, empty_label=_('Choose your bank'), **kwargs):
+        """
+        :param empty_label: The label of the empty choice, or ``None`` for no empty choice (optional).
+                            Default\\: "Choose your bank".
+        """
+        self.empty_label = empty_label
+        kwargs.setdefault('label', _('Bank'))
+        super(IssuerChoiceField, self).__init__(choices=self.get_choices, **kwargs)
+
+    def get_choices(self):
+        return get_issuer_choices(self.empty_label)
@@ -0,0 +1,178 @@
+"""
+A cache of the active issuers, to render a bank select without database queries.
+
+The issuers are stored in Django's cache, under a version that is bumped when they change, and kept in the process
+as long as the version is the same. Each lookup costs a single cache read of the version. The version is the time of
+the last change, in milliseconds.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings as django_settings
+from django.core.cache import caches
+
+from ideal.contrib.django.ideal_compat.models import Issuer
+
+VERSION_KEY = 'ideal:issuers:version'
+ISSUERS_KEY = 'ideal:issuers:{version}'
+
+# The issuers as JSON document, with a strong ETag of the content.
+IssuersDocument = namedtuple('IssuersDocument', ['version', 'content', 'etag', 'last_modified'])
+
+
+class IssuerCache(object):
+    """
+    Caches the active issuers in a Django cache, and in the process.
+
+    The issuers are stored under ``ideal:issuers:<version>``, where the version, kept under ``ideal:issuers:version``,
+    is the time of the last change in milliseconds. :meth:`invalidate` bumps the version instead of deleting the
+    issuers, so every process loads them again on its next lookup, and issuers of an old version expire with the
+    cache timeout. The issuers are invalidated when an :class:`ideal.contrib.django.ideal_compat.models.Issuer` is
+    saved or deleted.
+    """
+    def __init__(self, alias=None, timeout=None):
+        """
+        :param alias: The Django cache to use (optional). Default\\: ``IDEAL_ISSUER_CACHE`` or ``default``.
+        :param timeout: The number of seconds to keep the issuers in the Django cache (optional).
+                        Default\\: ``IDEAL_ISSUER_CACHE_TIMEOUT`` or one day.
+        """
+        self.alias = alias
+        self.timeout = timeout
+
+        # The version, issuers and JSON document, kept in this process.
+        self._local = (None, None, None)
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias or getattr(django_settings, 'IDEAL_ISSUER_CACHE', 'default')]
+
+    def get_timeout(self):
+        if self.timeout is not None:
+            return self.timeout
+        return getattr(django_settings, 'IDEAL_ISSUER_CACHE_TIMEOUT', 24 * 60 * 60)
+
+    def get_version(self):
+        """
+        Return the current version of the issuers.
+        """
+        cache = self.cache
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # Start at a new number, so issuers cached before the version was evicted are not used.
+            cache.add(VERSION_KEY, int(time.time() * 1000), None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def get(self):
+        """
+        Return the active issuers per country.
+
+        :return: List of ``(country, issuers)`` tuples, where issuers is a list of ``(code, name)`` tuples. Both are
+                 sorted by name.
+        """
+        return self._get()[1]
+
+    def get_document(self):
+        """
+        Return the active issuers as JSON document, which is only created once per version.
+
+        :return: A :class:`IssuersDocument` object.
+        """
+        version, issuers, document = self._get()
+        if document is None:
+            document = create_document(version, issuers)
+            if self._local[0] == version:
+                self._local = (version, issuers, document)
+        return document
+
+    def _get(self):
+        version = self.get_version()
+
+        local = self._local
+        if version is not None and version == local[0]:
+            return local
+
+        cache = self.cache
+        key = ISSUERS_KEY.format(version=version)
+        issuers = cache.get(key)
+        if issuers is None:
+            issuers = self.load()
+            cache.set(key, issuers, self.get_timeout())
+
+        local = self._local = (version, issuers, None)
+        return local
+
+    def load(self):
+        """
+        Return the active issuers per country from the database, see :meth:`get`.
+        """
+        issuers = []
+        for country, code, name in Issuer.objects.filter(is_active=True).order_by(
+                'country', 'name').values_list('country', 'code', 'name'):
+            if not issuers or issuers[-1][0] != country:
+                issuers.append((country, []))
+            issuers[-1][1].append((code, name))
+        return issuers
+
+    def invalidate(self):
+        """
+        Bump the version, so all processes load the issuers again.
+        """
+        cache = self.cache
+        with self._lock:
+            version = cache.get(VERSION_KEY) or 0
+            cache.set(VERSION_KEY, max(int(time.time() * 1000), version + 1), None)
+            self._local = (None, None, None)
+
+
+def create_document(version, issuers):
+    """
+    Return the ``issuers`` as JSON document.
+
+    :param version: The version of the issuers, see :meth:`IssuerCache.get_version`.
+    :param issuers: The issuers per country, see :meth:`IssuerCache.get`.
+
+    :return: A :class:`IssuersDocument` object.
+    """
+    content = json.dumps({
+        'countries': [{
+            'name': country,
+            'issuers': [{'code': code, 'name': name} for code, name in country_issuers],
+        } for country, country_issuers in issuers],
+    }, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+    return IssuersDocument(
+        version=version,
+        content=content,
+        etag='"{digest}"'.format(digest=hashlib.sha256(content).hexdigest()[:32]),
+        last_modified=version // 1000 if version else None,
+    )
+
+
+# The issuer cache that is shared by the whole process.
+issuer_cache = IssuerCache()
+
+
+def get_issuers():
+    """
+    Return the active issuers per country, see :meth:`IssuerCache.get`.
+    """
+    return issuer_cache.get()
+
+
+def get_issuers_document():
+    """
+    Return the active issuers as JSON document, see :meth:`IssuerCache.get_document`.
+    """
+    return issuer_cache.get_document()
+
+
+def invalidate_issuers(**kwargs):
+    """
+    Bump the version of the cached issuers. Can be used as signal receiver.
+    """
+    issuer_cache.invalidate()
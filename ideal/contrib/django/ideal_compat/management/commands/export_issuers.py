@@ -0,0 +1,84 @@
+import json
+import os
+
+from django.conf import settings as django_settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ideal.contrib.django.ideal_compat.issuers import create_document, issuer_cache
+
+MANIFEST_NAME = 'issuers.manifest.json'
+
+
+class Command(BaseCommand):
+    help = 'Writes the active iDEAL issuers as content-hashed static files, with a manifest.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output-dir',
+            dest='output_dir',
+            default=None,
+            help='The directory to write to. Default: "ideal" in STATIC_ROOT.',
+        )
+        parser.add_argument(
+            '--js',
+            action='store_true',
+            dest='js',
+            default=False,
+            help='Also write a JavaScript module.',
+        )
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        output_dir = options.get('output_dir')
+        if not output_dir:
+            if not getattr(django_settings, 'STATIC_ROOT', None):
+                raise CommandError('Set STATIC_ROOT or use --output-dir.')
+            output_dir = os.path.join(django_settings.STATIC_ROOT, 'ideal')
+
+        # The database is the source, the cached issuers may be outdated.
+        document = create_document(None, issuer_cache.load())
+        content_hash = document.etag.strip('"')[:12]
+
+        files = {'json': 'issuers.{hash}.json'.format(hash=content_hash)}
+        if options.get('js'):
+            files['js'] = 'issuers.{hash}.js'.format(hash=content_hash)
+
+        manifest = {'hash': content_hash, 'files': files}
+        manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+
+        if self.read_manifest(manifest_path) == manifest and all(
+                os.path.exists(os.path.join(output_dir, filename)) for filename in files.values()):
+            if verbosity >= 1:
+                self.stdout.write('Issuers unchanged ({hash}).'.format(hash=content_hash))
+            return
+
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+
+        self.write(os.path.join(output_dir, files['json']), document.content)
+        if 'js' in files:
+            self.write(os.path.join(output_dir, files['js']), b'export default ' + document.content + b';\n')
+
+        # The manifest is written last, so it never refers to files that don't exist yet.
+        self.write(manifest_path, json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8') + b'\n')
+
+        if verbosity >= 1:
+            self.stdout.write('Issuers exported ({hash}): {files}'.format(
+                hash=content_hash, files=', '.join(sorted(files.values()))))
+
+    def read_manifest(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return json.loads(f.read().decode('utf-8'))
+        except (IOError, OSError, ValueError):
+            return None
+
+    def write(self, path, content):
+        """
+        Replace the file at ``path`` at once, so the web server never serves a partially written file.
+        """
+        temp_path = '{path}.tmp'.format(path=path)
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+        os.rename(temp_path, path)
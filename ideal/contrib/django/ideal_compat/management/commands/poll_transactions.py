@@ -0,0 +1,179 @@
+import datetime
+import logging
+from functools import partial
+from multiprocessing.pool import ThreadPool
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ideal.client import TransactionStatus, get_client
+from ideal.contrib.django.ideal_compat.models import Transaction
+from ideal.exceptions import IdealException
+
+logger = logging.getLogger(__name__)
+
+
+def get_status(client, ideal_transaction):
+    """
+    Request the status of ``ideal_transaction``, in a thread of the pool. Errors, including transport errors, are
+    returned rather than raised, so one failed request does not stop the rest of the batch.
+
+    :return: Tuple of the :class:`Transaction`, the :class:`ideal.client.StatusResponse` and the exception, of which
+             one is ``None``.
+    """
+    try:
+        return ideal_transaction, client.get_transaction_status(ideal_transaction.transaction_id), None
+    except IdealException as e:
+        return ideal_transaction, None, e
+    except Exception as e:
+        logger.exception('Could not request the status of transaction %(transaction_id)s.', {
+            'transaction_id': ideal_transaction.transaction_id,
+        })
+        return ideal_transaction, None, e
+
+
+class Command(BaseCommand):
+    help = 'Requests the status of open iDEAL transactions that are due, and saves the results.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            dest='batch_size',
+            default=100,
+            help='The number of transactions to claim at a time. Default: 100.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            dest='concurrency',
+            default=4,
+            help='The maximum number of concurrent status requests. Default: 4.',
+        )
+        parser.add_argument(
+            '--lease',
+            type=int,
+            dest='lease',
+            default=300,
+            help='Seconds before claimed transactions can be claimed again, if this worker stops. Default: 300.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            dest='interval',
+            default=60,
+            help='Seconds until an open transaction is polled again, doubled after each poll. Default: 60.',
+        )
+        parser.add_argument(
+            '--max-interval',
+            type=int,
+            dest='max_interval',
+            default=3600,
+            help='The maximum number of seconds between polls. Default: 3600.',
+        )
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+        batch_size = options['batch_size']
+        concurrency = options['concurrency']
+
+        # The client waits for a free slot, so the pool never has more requests in flight than the limiter allows.
+        client = get_client(max_concurrency=concurrency)
+        pool = ThreadPool(concurrency)
+
+        counts = {'polled': 0, 'final': 0, 'open': 0, 'failed': 0}
+        try:
+            while True:
+                batch = self.claim(batch_size, options['lease'])
+                if not batch:
+                    break
+
+                for ideal_transaction, response, error in pool.imap_unordered(partial(get_status, client), batch):
+                    outcome = self.update(ideal_transaction, response, error, options['interval'],
+                                          options['max_interval'])
+                    counts['polled'] += 1
+                    counts[outcome] += 1
+
+                    if verbosity >= 2:
+                        self.stdout.write('Transaction {transaction_id}: {status}'.format(
+                            transaction_id=ideal_transaction.transaction_id,
+                            status=error if error is not None else ideal_transaction.status,
+                        ))
+
+                self.write(batch)
+
+                if len(batch) < batch_size:
+                    break
+        finally:
+            pool.close()
+            pool.join()
+
+        if verbosity >= 1:
+            self.stdout.write('Transactions: {polled} polled, {final} final, {open} open, {failed} failed'.format(
+                **counts))
+
+    def claim(self, batch_size, lease):
+        """
+        Claim the open transactions that are due, in one transaction. Rows that are locked by another worker are
+        skipped, and the claimed rows are not due again until the ``lease`` expires, so workers never poll the same
+        transaction at the same time.
+
+        :return: List of :class:`Transaction` objects.
+        """
+        now = timezone.now()
+
+        # Databases without SKIP LOCKED wait for the other worker, and then skip the rows it claimed.
+        lock_kwargs = {}
+        if getattr(connection.features, 'has_select_for_update_skip_locked', False):
+            lock_kwargs['skip_locked'] = True
+
+        with transaction.atomic():
+            queryset = Transaction.objects.filter(
+                status=TransactionStatus.OPEN, next_poll_at__lte=now).order_by('next_poll_at')
+            batch = list(queryset.select_for_update(**lock_kwargs)[:batch_size])
+            if batch:
+                Transaction.objects.filter(pk__in=[t.pk for t in batch]).update(
+                    next_poll_at=now + datetime.timedelta(seconds=lease))
+
+        return batch
+
+    def update(self, ideal_transaction, response, error, interval, max_interval):
+        """
+        Apply the result of a status request to ``ideal_transaction``, without saving it.
+
+        :return: ``'final'``, ``'open'`` or ``'failed'``.
+        """
+        now = timezone.now()
+
+        ideal_transaction.poll_count += 1
+        ideal_transaction.updated_at = now
+
+        if response is not None:
+            ideal_transaction.status = response.status
+            status_date = response.status_date_timestamp
+            if status_date is not None and not timezone.is_aware(now):
+                status_date = timezone.make_naive(status_date)
+            ideal_transaction.status_date = status_date
+
+            if ideal_transaction.is_final:
+                ideal_transaction.next_poll_at = None
+                return 'final'
+
+        delay = min(interval * 2 ** (ideal_transaction.poll_count - 1), max_interval)
+        ideal_transaction.next_poll_at = now + datetime.timedelta(seconds=delay)
+
+        return 'open' if response is not None else 'failed'
+
+    def write(self, batch):
+        """
+        Save the polled transactions, in bulk.
+        """
+        fields = ['status', 'status_date', 'next_poll_at', 'poll_count', 'updated_at']
+        if hasattr(Transaction.objects, 'bulk_update'):
+            Transaction.objects.bulk_update(batch, fields)
+        else:
+            # Django < 2.2
+            with transaction.atomic():
+                for ideal_transaction in batch:
+                    ideal_transaction.save(update_fields=fields)
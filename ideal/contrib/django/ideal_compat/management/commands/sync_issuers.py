@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
 from ideal.client import IdealClient
+from ideal.contrib.django.ideal_compat.issuers import invalidate_issuers
 from ideal.contrib.django.ideal_compat.models import Issuer
 
 
@@ -20,60 +22,87 @@ class Command(BaseCommand):
         dry_run = options.get('dry_run', False)
         verbosity = int(options.get('verbosity', 1))
 
-        create_count = update_count = deactivate_count = 0
-
         ideal = IdealClient()
         response = ideal.get_issuers()
 
-        for country, issuer_list in response.issuers.items():
-            for code, name in issuer_list.items():
-                if dry_run:
-                    is_created = Issuer.objects.filter(code=code).count() == 0
-                else:
-                    issuer, is_created = Issuer.objects.get_or_create(code=code, defaults={
-                        'name': name, 'country': country, 'is_active': True
-                    })
-
-                    # Update existing issuer.
-                    if not is_created:
-                        issuer.name = name
-                        issuer.country = country
-                        issuer.is_active = True
-                        issuer.save()
-
-                if verbosity >= 2:
-                    self.stdout.write('{action} issuer ({code}): {name}{dry_run}'.format(
-                        action='Created' if is_created else 'Updated',
-                        code=code,
-                        name=name,
-                        dry_run=' (dry-run)' if dry_run else '',
-                    ))
+        with transaction.atomic():
+            created, updated, unchanged, deactivated = self.diff(response.issuers)
 
-                if is_created:
-                    create_count += 1
-                else:
-                    update_count += 1
+            changed = not dry_run and (created or updated or deactivated)
+            if changed:
+                self.write(created, updated + deactivated)
 
-        # Make all issuers, that were not part of the response, inactive.
-        active_issuer_codes = response.get_issuer_list().keys()
-        if not dry_run:
-            Issuer.objects.exclude(code__in=active_issuer_codes).update(is_active=False)
+        # Rendered issuer selects show the changes right away.
+        if changed:
+            invalidate_issuers()
 
         if verbosity >= 2:
-            for issuer in Issuer.objects.exclude(code__in=active_issuer_codes):
-                self.stdout.write('Deactivated issuer ({code}): {name}{dry_run}'.format(
-                    code=issuer.code,
-                    name=issuer.name,
-                    dry_run=' (dry-run)' if dry_run else '',
-                ))
-                deactivate_count += 1
+            for action, issuers in (('Created', created), ('Updated', updated), ('Deactivated', deactivated)):
+                for issuer in issuers:
+                    self.stdout.write('{action} issuer ({code}): {name}{dry_run}'.format(
+                        action=action,
+                        code=issuer.code,
+                        name=issuer.name,
+                        dry_run=' (dry-run)' if dry_run else '',
+                    ))
 
         if verbosity >= 1:
             self.stdout.write(
-                'Issuers: {created} created, {updated} updated, {deactivated} deactivated{dry_run}'.format(
-                    created=create_count,
-                    updated=update_count,
-                    deactivated=deactivate_count,
+                'Issuers: {created} created, {updated} updated, {unchanged} unchanged, {deactivated} deactivated'
+                '{dry_run}'.format(
+                    created=len(created),
+                    updated=len(updated),
+                    unchanged=len(unchanged),
+                    deactivated=len(deactivated),
                     dry_run=' (dry-run)' if dry_run else '',
                 )
             )
+
+    def diff(self, countries):
+        """
+        Compare the issuers in the database with the issuers of the acquirer, in one query.
+
+        :param countries: Dictionary of issuers, by code, per country. See ``DirectoryResponse.issuers``.
+
+        :return: Tuple of lists of new, changed, unchanged and deactivated :class:`Issuer` objects.
+        """
+        existing = dict((issuer.code, issuer) for issuer in Issuer.objects.all())
+
+        created, updated, unchanged = [], [], []
+        for country, issuer_list in countries.items():
+            for code, name in issuer_list.items():
+                issuer = existing.pop(code, None)
+                if issuer is None:
+                    created.append(Issuer(code=code, name=name, country=country, is_active=True))
+                elif (issuer.name, issuer.country, issuer.is_active) != (name, country, True):
+                    issuer.name = name
+                    issuer.country = country
+                    issuer.is_active = True
+                    updated.append(issuer)
+                else:
+                    unchanged.append(issuer)
+
+        # Make all issuers, that were not part of the response, inactive.
+        deactivated = [issuer for issuer in existing.values() if issuer.is_active]
+        for issuer in deactivated:
+            issuer.is_active = False
+
+        return created, updated, unchanged, deactivated
+
+    def write(self, created, changed):
+        """
+        Save the new and changed issuers, in bulk.
+        """
+        if created:
+            Issuer.objects.bulk_create(created)
+
+        if not changed:
+            return
+
+        fields = ['name', 'country', 'is_active']
+        if hasattr(Issuer.objects, 'bulk_update'):
+            Issuer.objects.bulk_update(changed, fields)
+        else:
+            # Django < 2.2
+            for issuer in changed:
+                issuer.save(update_fields=fields)
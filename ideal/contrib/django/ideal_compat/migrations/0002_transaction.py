@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ideal_compat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Transaction',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.CharField(max_length=16, unique=True)),
+                ('entrance_code', models.CharField(max_length=40)),
+                ('purchase_id', models.CharField(db_index=True, max_length=16)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('status', models.CharField(choices=[('Open', 'Open'), ('Success', 'Success'), ('Cancelled', 'Cancelled'), ('Expired', 'Expired'), ('Failure', 'Failure')], default='Open', max_length=10)),
+                ('status_date', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('next_poll_at', models.DateTimeField(blank=True, db_index=True, default=django.utils.timezone.now, null=True)),
+                ('poll_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
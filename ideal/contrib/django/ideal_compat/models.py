@@ -1,4 +1,9 @@
+import six
 from django.db import models
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from ideal.client import TransactionStatus
 
 
 class Issuer(models.Model):
@@ -6,3 +11,37 @@ class Issuer(models.Model):
     name = models.CharField(max_length=35)
     country = models.CharField(max_length=250, db_index=True)
     is_active = models.BooleanField()
+
+
+@six.python_2_unicode_compatible
+class Transaction(models.Model):
+    """
+    A transaction that was started with ``IdealClient.start_transaction``. Open transactions are polled by the
+    ``poll_transactions`` command until their status is final.
+    """
+    STATUS_CHOICES = (
+        (TransactionStatus.OPEN, _('Open')),
+        (TransactionStatus.SUCCESS, _('Success')),
+        (TransactionStatus.CANCELLED, _('Cancelled')),
+        (TransactionStatus.EXPIRED, _('Expired')),
+        (TransactionStatus.FAILURE, _('Failure')),
+    )
+
+    transaction_id = models.CharField(max_length=16, unique=True)
+    entrance_code = models.CharField(max_length=40)
+    purchase_id = models.CharField(max_length=16, db_index=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=TransactionStatus.OPEN)
+    status_date = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # When the status should be requested next, or empty if the status is final.
+    next_poll_at = models.DateTimeField(null=True, blank=True, db_index=True, default=timezone.now)
+    poll_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.transaction_id
+
+    @property
+    def is_final(self):
+        return self.status != TransactionStatus.OPEN
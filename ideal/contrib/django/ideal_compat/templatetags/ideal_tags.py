@@ -0,0 +1,32 @@
+import django
+from django import template
+
+from ideal.contrib.django.ideal_compat.forms import IssuerSelect, get_issuer_choices
+from ideal.contrib.django.ideal_compat.issuers import get_issuers
+
+register = template.Library()
+
+# ``simple_tag`` supports ``as`` since Django 1.9.
+assignment_tag = register.simple_tag if django.VERSION >= (1, 9) else register.assignment_tag
+
+
+@assignment_tag
+def ideal_issuers():
+    """
+    Return the active issuers per country::
+
+        {% ideal_issuers as issuers %}
+        {% for country, country_issuers in issuers %}...{% endfor %}
+    """
+    return get_issuers()
+
+
+@register.simple_tag
+def ideal_issuer_select(name='issuer_id', value=None, empty_label='', **attrs):
+    """
+    Render a select of the active issuers, grouped by country::
+
+        {% ideal_issuer_select "issuer_id" form.issuer_id.value id="issuer" %}
+    """
+    widget = IssuerSelect(attrs, choices=get_issuer_choices(empty_label))
+    return widget.render(name, value)
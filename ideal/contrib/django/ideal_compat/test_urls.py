@@ -1,3 +1,6 @@
+import sys
+
+import django
 from django.conf.urls import url
 
 from ideal.contrib.django.ideal_compat import views
@@ -8,4 +11,16 @@ urlpatterns = [
     url(r'^start_transaction/$', views.StartTransactionView.as_view(), name='ideal_tests_start_transaction'),
     url(r'^get_transaction_status/$', views.GetTransactionStatusView.as_view(),
         name='ideal_tests_get_transaction_status'),
+    url(r'^issuers\.json$', views.IssuersView.as_view(), name='ideal_issuers'),
 ]
+
+if django.VERSION >= (3, 1) and sys.version_info >= (3, 7):
+    from ideal.contrib.django.ideal_compat import async_views
+
+    urlpatterns += [
+        url(r'^async/get_issuers/$', async_views.AsyncGetIssuersView.as_view(), name='ideal_tests_async_get_issuers'),
+        url(r'^async/start_transaction/$', async_views.AsyncStartTransactionView.as_view(),
+            name='ideal_tests_async_start_transaction'),
+        url(r'^async/get_transaction_status/$', async_views.AsyncGetTransactionStatusView.as_view(),
+            name='ideal_tests_async_get_transaction_status'),
+    ]
@@ -1,10 +1,15 @@
 from django import forms
+from django.conf import settings as django_settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
 from django.utils.translation import ugettext_lazy as _
-from django.views.generic import TemplateView
+from django.views.generic import TemplateView, View
 from django.views.generic.edit import FormView
 
-from ideal.client import IdealClient
+from ideal.client import get_client
 from ideal.conf import settings
+from ideal.contrib.django.ideal_compat.issuers import get_issuers_document
 from ideal.contrib.django.ideal_compat.utils import reverse
 from ideal.exceptions import IdealConfigurationException, IdealException
 
@@ -14,9 +19,19 @@ class IdealViewMixin(object):
     @property
     def client(self):
         if not hasattr(self, '_client'):
-            self._client = IdealClient()
+            self._client = get_client()
         return self._client
 
+    def call_client(self, form):
+        """
+        Send the request of this view to the acquirer.
+
+        :param form: The valid form.
+
+        :return: The response of the client.
+        """
+        raise NotImplementedError
+
     def get_default_context(self):
         return {
             'settings': settings,
@@ -40,7 +55,7 @@ class IndexView(TemplateView):
         context = super(IndexView, self).get_context_data(**kwargs)
 
         try:
-            client = IdealClient()
+            client = get_client()
         except IdealConfigurationException as e:
             context.update({
                 'error_message': 'Cannot read configuration: {msg}'.format(msg=e)
@@ -76,12 +91,15 @@ class GetIssuersView(FormView, IdealViewMixin):
 
         return context
 
+    def call_client(self, form):
+        return self.client.get_issuers()
+
     def form_valid(self, form):
         error_message = None
         response = None
 
         try:
-            response = self.client.get_issuers()
+            response = self.call_client(form)
         except IdealException as e:
             error_message = e
 
@@ -128,18 +146,21 @@ class StartTransactionView(FormView, IdealViewMixin):
 
         return context
 
-    def form_valid(self, form):
+    def call_client(self, form):
         kwargs = form.cleaned_data
 
         # Make sure we pass None for entrance code instead of an empty string.
         if not kwargs.get('entrance_code'):
             kwargs.update({'entrance_code': None})
 
+        return self.client.start_transaction(**kwargs)
+
+    def form_valid(self, form):
         error_message = None
         response = None
 
         try:
-            response = self.client.start_transaction(**kwargs)
+            response = self.call_client(form)
         except IdealException as e:
             error_message = e
 
@@ -169,14 +190,60 @@ class GetTransactionStatusView(FormView, IdealViewMixin):
         })
         return initial
 
+    def call_client(self, form):
+        return self.client.get_transaction_status(form.cleaned_data['transaction_id'])
+
     def form_valid(self, form):
         error_message = None
         response = None
 
         try:
-            response = self.client.get_transaction_status(form.cleaned_data['transaction_id'])
+            response = self.call_client(form)
         except IdealException as e:
             error_message = e
 
         return self.render_to_response(
             self.get_context_data(form=form, response=response, error_message=error_message))
+
+
+class IssuersView(View):
+    """
+    The active issuers, grouped by country, as JSON. Browsers and CDNs may cache the response for
+    ``IDEAL_ISSUERS_MAX_AGE`` seconds (default: 300) and conditional requests get a "304 Not Modified" response.
+    """
+    max_age = None
+
+    def get_max_age(self):
+        if self.max_age is not None:
+            return self.max_age
+        return getattr(django_settings, 'IDEAL_ISSUERS_MAX_AGE', 300)
+
+    def get(self, request, *args, **kwargs):
+        document = get_issuers_document()
+
+        if self.is_not_modified(request, document):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(document.content, content_type='application/json')
+
+        response['ETag'] = document.etag
+        if document.last_modified is not None:
+            response['Last-Modified'] = http_date(document.last_modified)
+        patch_cache_control(response, public=True, max_age=self.get_max_age())
+
+        return response
+
+    def is_not_modified(self, request, document):
+        """
+        Return ``True`` if the client has the current version of the ``document``.
+        """
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            # The ETag takes precedence over the modification date, and is compared weakly.
+            etags = [etag.strip() for etag in if_none_match.split(',')]
+            return any(etag == '*' or etag.replace('W/', '', 1) == document.etag for etag in etags)
+
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if if_modified_since is None or document.last_modified is None:
+            return False
+        return document.last_modified <= if_modified_since
@@ -1,5 +1,3 @@
-from lxml.etree import QName
-
 from ideal.utils import IDEAL_NAMESPACES
 
 
@@ -27,6 +25,7 @@ class IdealResponseException(IdealException):
     consumer_message = None
 
     def __init__(self, xml_document):
+        from lxml.etree import QName
 
         self._xml_document = xml_document
 
@@ -0,0 +1,135 @@
+import math
+import threading
+from bisect import bisect_left, insort
+from collections import deque
+
+from ideal.exceptions import IdealConfigurationException
+
+
+class LatencyWindow(object):
+    """
+    Keeps the most recent latency observations to calculate percentiles from.
+    """
+    def __init__(self, size=1000):
+        """
+        :param size: The maximum number of observations to keep (optional). Default\: 1000.
+        """
+        self._samples = deque(maxlen=size)
+        # The same observations in order, so a percentile is looked up rather than sorted for each request.
+        self._sorted = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, latency):
+        """
+        Add an observation.
+
+        :param latency: The observed latency in seconds.
+        """
+        with self._lock:
+            if len(self._samples) == self._samples.maxlen:
+                del self._sorted[bisect_left(self._sorted, self._samples[0])]
+            self._samples.append(latency)
+            insort(self._sorted, latency)
+
+    def percentile(self, percentile):
+        """
+        Return the latency at given ``percentile`` using the nearest-rank method.
+
+        :param percentile: Number between 0 and 100.
+
+        :return: The latency in seconds, or ``None`` if there are no observations.
+        """
+        with self._lock:
+            if not self._sorted:
+                return None
+
+            rank = int(math.ceil(percentile / 100.0 * len(self._sorted))) - 1
+            return self._sorted[min(max(rank, 0), len(self._sorted) - 1)]
+
+
+class HedgePolicy(object):
+    """
+    Decides when an idempotent request should be hedged: if the first attempt did not answer within the configured
+    ``percentile`` of the observed latency, one duplicate request is sent.
+
+    Each request earns ``max_hedge_ratio`` hedge credits (up to ``burst``) and each hedge costs one credit, so the
+    number of hedged requests never exceeds ``max_hedge_ratio`` of all requests over time.
+    """
+    def __init__(self, percentile=95, max_hedge_ratio=0.05, min_samples=20, min_delay=0.01, window_size=1000,
+                 burst=10):
+        """
+        :param percentile: The percentile of observed latency after which a hedge is sent (optional). Default\: 95.
+        :param max_hedge_ratio: Maximum fraction of requests that may be hedged, lower than 1 (optional).
+                                Default\: 0.05.
+        :param min_samples: Number of observations required before hedging starts (optional). Default\: 20.
+        :param min_delay: Minimum delay in seconds before hedging (optional). Default\: 0.01.
+        :param window_size: Number of latency observations to keep per message type (optional). Default\: 1000.
+        :param burst: Maximum number of hedge credits that can be saved up (optional). Default\: 10.
+        """
+        if not 0 < percentile < 100:
+            raise IdealConfigurationException('The hedge percentile must be between 0 and 100.')
+        if not 0 <= max_hedge_ratio < 1:
+            raise IdealConfigurationException('The maximum hedge ratio must be at least 0 and lower than 1.')
+
+        self.percentile = percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.window_size = window_size
+        self.burst = burst
+
+        self._windows = {}
+        self._credits = 0.0
+        self._lock = threading.Lock()
+
+    def _get_window(self, message_type):
+        window = self._windows.get(message_type)
+        if window is None:
+            window = self._windows.setdefault(message_type, LatencyWindow(self.window_size))
+        return window
+
+    def record(self, message_type, latency):
+        """
+        Record the latency of a successful attempt.
+
+        :param message_type: The request message type, for example ``AcquirerStatusReq``.
+        :param latency: The latency in seconds.
+        """
+        self._get_window(message_type).add(latency)
+
+    def get_delay(self, message_type):
+        """
+        Return how long to wait for the first attempt before hedging. Every call counts as a request towards the hedge
+        budget.
+
+        :param message_type: The request message type, for example ``AcquirerStatusReq``.
+
+        :return: The delay in seconds, or ``None`` if there are not enough observations to hedge yet.
+        """
+        with self._lock:
+            self._credits = min(self._credits + self.max_hedge_ratio, self.burst)
+
+        window = self._get_window(message_type)
+        if len(window) < self.min_samples:
+            return None
+
+        return max(window.percentile(self.percentile), self.min_delay)
+
+    def allow_hedge(self, claim=True):
+        """
+        Claim a hedge credit.
+
+        :param claim: ``False`` to only check if a credit is available, without claiming it (optional).
+                      Default\: ``True``.
+
+        :return: ``True`` if a hedge may be sent, ``False`` if the hedge budget is exhausted.
+        """
+        with self._lock:
+            if self._credits < 1:
+                return False
+            if claim:
+                self._credits -= 1
+            return True
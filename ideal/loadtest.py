@@ -0,0 +1,330 @@
+"""
+Load generator for iDEAL traffic.
+
+Drives a mix of ``get_issuers``, ``start_transaction`` and ``get_transaction_status`` calls through the real
+:class:`ideal.client.IdealClient` and reports the throughput, errors and latency percentiles per message type::
+
+    $ python -m ideal.loadtest --config ideal.cfg --acquirer-url http://localhost:8080/ideal/iDEALv3 \\
+        --mix issuers=1,transaction=2,status=5 --rate 50 --duration 30
+
+Use ``--simulator`` to run against a local :class:`ideal.testing.AcquirerSimulator` instead.
+
+With ``--rate``, latency is measured from the time each request was scheduled to start, so requests that waited for a
+free worker are not reported as fast. The workers are threads; there is no asyncio mode, so the generator also runs on
+Python versions without :mod:`ideal.aio`.
+"""
+import argparse
+import random
+import threading
+import time
+from collections import deque
+from decimal import Decimal
+
+from ideal.client import IdealClient
+from ideal.conf import settings
+from ideal.exceptions import IdealConfigurationException
+from ideal.metrics import MetricsRegistry
+
+DEFAULT_MIX = (('issuers', 1), ('transaction', 2), ('status', 5))
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+OPERATIONS = ('issuers', 'transaction', 'status')
+
+MESSAGE_TYPES = {
+    'issuers': 'DirectoryReq',
+    'transaction': 'AcquirerTrxReq',
+    'status': 'AcquirerStatusReq',
+}
+
+
+def parse_mix(value):
+    """
+    Parse a traffic mix like ``issuers=1,transaction=2,status=5``.
+
+    :param value: The mix as string.
+
+    :return: List of ``(operation, weight)`` tuples.
+    """
+    mix = []
+    for part in value.split(','):
+        operation, _, weight = part.partition('=')
+        operation = operation.strip()
+        if operation not in OPERATIONS:
+            raise IdealConfigurationException('Unknown operation "{operation}", use any of: {operations}.'.format(
+                operation=operation, operations=', '.join(OPERATIONS)))
+        try:
+            weight = float(weight) if weight else 1.0
+        except ValueError:
+            raise IdealConfigurationException('Invalid weight for "{operation}".'.format(operation=operation))
+        mix.append((operation, weight))
+
+    if not mix or sum(weight for operation, weight in mix) <= 0:
+        raise IdealConfigurationException('The traffic mix needs at least one operation with a positive weight.')
+
+    return mix
+
+
+class LoadTest(object):
+    """
+    Runs a load test with a fixed number of worker threads.
+
+    Without a ``rate``, every worker sends its next request as soon as the previous one completed (closed loop). With
+    a ``rate``, requests are started on a fixed schedule and the workers only limit how many can be in flight. The
+    latency of a request is then measured from its scheduled start, which includes the time it waited for a worker.
+    """
+    def __init__(self, client=None, mix=DEFAULT_MIX, concurrency=10, rate=None, duration=10, issuer_id='INGBNL2A',
+                 seed=None):
+        """
+        :param client: The :class:`ideal.client.IdealClient` to use. Its ``metrics`` registry is used for the report
+                       and should have the quantiles in ``QUANTILES`` (optional). Default\: a new client.
+        :param mix: List of ``(operation, weight)`` tuples, where operation is ``issuers``, ``transaction`` or
+                    ``status`` (optional). Default\: ``issuers=1,transaction=2,status=5``.
+        :param concurrency: The number of worker threads (optional). Default\: 10.
+        :param rate: The target number of requests per second (optional). Default\: as fast as possible.
+        :param duration: The duration of the test in seconds (optional). Default\: 10.
+        :param issuer_id: The issuer to start transactions with (optional). Default\: ``INGBNL2A``.
+        :param seed: Seed for the random choice of operations (optional).
+        """
+        if client is None:
+            client = IdealClient(metrics=MetricsRegistry(quantiles=QUANTILES))
+        if client.metrics is None:
+            raise IdealConfigurationException('The client of a load test needs a metrics registry.')
+        if concurrency < 1:
+            raise IdealConfigurationException('The concurrency must be at least 1.')
+        if rate is not None and rate <= 0:
+            raise IdealConfigurationException('The rate must be positive.')
+
+        self.client = client
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.issuer_id = issuer_id
+
+        self._operations = [operation for operation, weight in mix]
+        self._weights = []
+        total = 0
+        for operation, weight in mix:
+            total += weight
+            self._weights.append(total)
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # Recently started transactions, to request the status of.
+        self._transactions = deque(maxlen=1000)
+        self._counter = 0
+        self._start = None
+        self._scheduled = 0
+        self._deadline = None
+        self._acquirer = None
+
+    def _choose(self):
+        with self._lock:
+            value = self._random.random() * self._weights[-1]
+        for operation, weight in zip(self._operations, self._weights):
+            if value < weight:
+                return operation
+        return self._operations[-1]
+
+    def _wait_for_slot(self):
+        """
+        Wait until the next request may start.
+
+        :return: The time the request was scheduled to start, or ``None`` if the test is over.
+        """
+        if self.rate is None:
+            now = time.time()
+            return now if now < self._deadline else None
+
+        with self._lock:
+            start = self._start + self._scheduled / self.rate
+            self._scheduled += 1
+
+        if start >= self._deadline:
+            return None
+
+        delay = start - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        return start
+
+    def _start_transaction(self):
+        with self._lock:
+            self._counter += 1
+            purchase_id = 'load{counter:012d}'.format(counter=self._counter)
+
+        response = self.client.start_transaction(self.issuer_id, purchase_id, Decimal('1.00'), 'Load test')
+        self._transactions.append(response.transaction_id)
+
+    def _get_transaction_status(self):
+        try:
+            transaction_id = self._transactions[self._random.randrange(len(self._transactions))]
+        except (IndexError, ValueError):
+            # Without any transactions yet, start one instead.
+            self._start_transaction()
+            return MESSAGE_TYPES['transaction']
+
+        self.client.get_transaction_status(transaction_id)
+        return MESSAGE_TYPES['status']
+
+    def _worker(self):
+        while True:
+            start = self._wait_for_slot()
+            if start is None:
+                break
+
+            operation = self._choose()
+            message_type = MESSAGE_TYPES[operation]
+            try:
+                if operation == 'issuers':
+                    self.client.get_issuers()
+                elif operation == 'transaction':
+                    self._start_transaction()
+                else:
+                    message_type = self._get_transaction_status()
+            except Exception:
+                # Errors are counted by the metrics registry.
+                pass
+
+            if self.rate is not None:
+                # The request span starts when it's sent, which leaves out the time a late request waited.
+                self.client.metrics.observe(self._acquirer, message_type, 'scheduled', time.time() - start)
+
+    def run(self):
+        """
+        Run the load test.
+
+        :return: The report, see :meth:`report`.
+        """
+        self.client.metrics.reset()
+        self._acquirer = self.client.settings.ACQUIRER or self.client.settings.get_acquirer_url()
+
+        start = self._start = time.time()
+        self._scheduled = 0
+        self._deadline = start + self.duration
+
+        workers = [threading.Thread(target=self._worker) for i in range(self.concurrency)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        return self.report(time.time() - start)
+
+    def report(self, elapsed):
+        """
+        Return the results of the load test.
+
+        :param elapsed: The duration of the test in seconds.
+
+        :return: Dictionary with the ``elapsed`` time, the overall ``throughput`` in requests per second and a list of
+                 ``message_types``, each with the number of ``requests``, ``errors`` by error code and ``latency``
+                 percentiles in seconds. With a ``rate``, the latency is measured from the scheduled start.
+        """
+        snapshot = self.client.metrics.snapshot()
+        phase = 'scheduled' if self.rate is not None else 'request'
+
+        message_types = {}
+        for item in snapshot['requests']:
+            result = message_types.setdefault(item['message_type'], {
+                'message_type': item['message_type'], 'requests': 0, 'errors': {}, 'latency': {}})
+            result['requests'] += item['count']
+        for item in snapshot['errors']:
+            errors = message_types[item['message_type']]['errors']
+            errors[item['error_code']] = errors.get(item['error_code'], 0) + item['count']
+        for item in snapshot['latency']:
+            if item['phase'] == phase:
+                latency = message_types[item['message_type']]['latency']
+                latency.update(item['quantiles'])
+
+        total = sum(result['requests'] for result in message_types.values())
+        return {
+            'elapsed': elapsed,
+            'requests': total,
+            'throughput': total / elapsed if elapsed else 0.0,
+            'message_types': [message_types[key] for key in sorted(message_types)],
+        }
+
+
+def format_report(report):
+    """
+    Format the report of a load test as text table.
+
+    :param report: The report, see :meth:`LoadTest.report`.
+
+    :return: The report as string.
+    """
+    lines = [
+        '{requests} requests in {elapsed:.1f}s, {throughput:.1f} requests/s'.format(**report),
+        '',
+        '{0:<20} {1:>9} {2:>7} {3:>9} {4:>9} {5:>9}'.format('message type', 'requests', 'errors', 'p50 ms',
+                                                            'p95 ms', 'p99 ms'),
+    ]
+
+    def ms(value):
+        return '-' if value is None else '{0:.1f}'.format(value * 1000)
+
+    for result in report['message_types']:
+        lines.append('{0:<20} {1:>9} {2:>7} {3:>9} {4:>9} {5:>9}'.format(
+            result['message_type'], result['requests'], sum(result['errors'].values()),
+            ms(result['latency'].get(0.5)), ms(result['latency'].get(0.95)), ms(result['latency'].get(0.99))))
+
+    errors = [(result['message_type'], error_code, count)
+              for result in report['message_types'] for error_code, count in sorted(result['errors'].items())]
+    if errors:
+        lines.extend(['', 'Errors:'])
+        for message_type, error_code, count in errors:
+            lines.append('  {0:<20} {1:<24} {2:>7}'.format(message_type, error_code, count))
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m ideal.loadtest', description='Generate iDEAL traffic.',
+        epilog='The workers are threads; there is no asyncio mode. With --rate, latency is measured from the '
+               'scheduled start of each request, including the time it waited for a free worker.')
+    parser.add_argument('--config', help='Configuration file with an [ideal] section, see Settings.load.')
+    parser.add_argument('--acquirer-url', help='The acquirer URL, typically a stand-in acquirer.')
+    parser.add_argument('--simulator', action='store_true',
+                        help='Run against a local stand-in acquirer that signs with the merchant key.')
+    parser.add_argument('--simulator-latency', type=float, default=0, help='Latency of the stand-in acquirer.')
+    parser.add_argument('--mix', type=parse_mix, default=list(DEFAULT_MIX),
+                        help='Weighted mix of operations (default: issuers=1,transaction=2,status=5).')
+    parser.add_argument('--concurrency', type=int, default=10, help='Number of worker threads (default: 10).')
+    parser.add_argument('--rate', type=float,
+                        help='Target requests per second, with latency measured from the scheduled start (default: as '
+                             'fast as possible).')
+    parser.add_argument('--duration', type=float, default=10, help='Duration in seconds (default: 10).')
+    parser.add_argument('--issuer-id', default='INGBNL2A', help='Issuer to start transactions with.')
+    args = parser.parse_args(argv)
+
+    if args.config:
+        settings.load(args.config)
+    if args.acquirer_url:
+        settings.ACQUIRER_URL = args.acquirer_url
+
+    server = None
+    if args.simulator:
+        from ideal.testing import AcquirerServer, AcquirerSimulator
+
+        # The stand-in acquirer signs its responses with the merchant key.
+        simulator = AcquirerSimulator(
+            settings.PRIVATE_KEY_FILE, settings.PRIVATE_KEY_PASSWORD, settings.PRIVATE_CERTIFICATE,
+            [settings.PRIVATE_CERTIFICATE], latency=args.simulator_latency)
+        server = AcquirerServer(simulator).start()
+        settings.ACQUIRER_URL = server.url
+        settings.CERTIFICATES = [settings.PRIVATE_CERTIFICATE]
+
+    try:
+        load_test = LoadTest(mix=args.mix, concurrency=args.concurrency, rate=args.rate, duration=args.duration,
+                             issuer_id=args.issuer_id)
+        print(format_report(load_test.run()))
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
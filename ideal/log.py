@@ -0,0 +1,83 @@
+import random
+import re
+
+import six
+
+# Elements whose content should never end up in log files.
+REDACTED_ELEMENTS = (
+    'consumerName',
+    'consumerIBAN',
+    'consumerBIC',
+    'entranceCode',
+    'SignatureValue',
+)
+
+REDACT_RE = re.compile(
+    r'(<(?:\w+:)?({elements})\b[^>]*>)[^<]*(</)'.format(elements='|'.join(REDACTED_ELEMENTS)))
+
+
+@six.python_2_unicode_compatible
+class LazyHeaders(object):
+    """
+    Formats a dictionary of headers, one per line, but only when the log record is actually emitted.
+    """
+    def __init__(self, headers):
+        self.headers = headers
+
+    def __str__(self):
+        return '\n'.join(['%s: %s' % (k, v) for k, v in self.headers.items()])
+
+
+@six.python_2_unicode_compatible
+class LazyBody(object):
+    """
+    Formats a message body, but only when the log record is actually emitted. Sensitive elements, like the consumer's
+    name and IBAN, are redacted and the body can be truncated to ``max_size`` characters.
+    """
+    def __init__(self, body, max_size=None, redact=True):
+        """
+        :param body: The body as string or bytes.
+        :param max_size: The maximum number of characters to log (optional). Default\: no limit.
+        :param redact: ``True`` to redact sensitive elements (optional). Default\: ``True``.
+        """
+        self.body = body
+        self.max_size = max_size
+        self.redact = redact
+
+    def __str__(self):
+        body = self.body
+        if body is None:
+            return ''
+
+        if not isinstance(body, six.text_type):
+            body = bytes(body).decode('utf-8', 'replace')
+
+        if self.redact:
+            body = REDACT_RE.sub(r'\1***\3', body)
+
+        if self.max_size is not None and len(body) > self.max_size:
+            body = '{body}... ({truncated} characters truncated)'.format(
+                body=body[:self.max_size],
+                truncated=len(body) - self.max_size,
+            )
+
+        return body
+
+
+class LogSampler(object):
+    """
+    Decides which requests have their full payload logged, for high-volume deployments.
+    """
+    def __init__(self, rate=1.0):
+        """
+        :param rate: The fraction of requests to log, between 0 and 1 (optional). Default\: 1.
+        """
+        self.rate = rate
+
+    def sample(self):
+        """
+        :return: ``True`` if the current request should be logged.
+        """
+        if self.rate >= 1:
+            return True
+        return random.random() < self.rate
@@ -0,0 +1,267 @@
+import threading
+
+from ideal.exceptions import IdealResponseException
+from ideal.tracing import SpanHook
+
+# Each power of two is divided into this many linear sub-buckets, giving a relative precision of about 6%.
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _bucket_index(value):
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return ((shift + 1) << SUB_BUCKET_BITS) + (value >> shift) - SUB_BUCKETS
+
+
+def _bucket_bounds(index):
+    if index < SUB_BUCKETS:
+        return index, index + 1
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    lower = ((index & (SUB_BUCKETS - 1)) + SUB_BUCKETS) << shift
+    return lower, lower + (1 << shift)
+
+
+class Histogram(object):
+    """
+    HDR-style latency histogram with logarithmic buckets, that are linearly subdivided. Recording a value is constant
+    time and memory only grows with the range of values, not with the number of values.
+
+    Values are recorded in seconds and stored with microsecond resolution. This class is not thread-safe by itself.
+    """
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds):
+        """
+        Record a value.
+
+        :param seconds: The value in seconds.
+        """
+        index = _bucket_index(max(int(seconds * 1000000), 0))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, quantile):
+        """
+        Return the value at given ``quantile``.
+
+        :param quantile: Number between 0 and 1.
+
+        :return: The value in seconds, or ``None`` if no values were recorded.
+        """
+        if not self.count:
+            return None
+        if quantile >= 1:
+            return self.max
+
+        target = max(quantile * self.count, 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target:
+                lower, upper = _bucket_bounds(index)
+                # Use the middle of the bucket, but never report outside the recorded range.
+                value = (lower + upper) / 2.0 / 1000000
+                return min(max(value, self.min), self.max)
+
+        return self.max
+
+    def copy(self):
+        histogram = Histogram()
+        histogram.buckets = dict(self.buckets)
+        histogram.count = self.count
+        histogram.sum = self.sum
+        histogram.min = self.min
+        histogram.max = self.max
+        return histogram
+
+
+class MetricsRegistry(SpanHook):
+    """
+    Keeps request counts, error counts and latency histograms per acquirer, message type and phase.
+
+    The registry is a tracing hook: it receives the spans of all requests of the clients that use it.
+    """
+    def __init__(self, quantiles=DEFAULT_QUANTILES):
+        """
+        :param quantiles: The quantiles to report in the snapshot and exposition (optional). Default\:
+                          ``(0.5, 0.9, 0.99)``.
+        """
+        self.quantiles = quantiles
+
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Remove all recorded metrics.
+        """
+        with self._lock:
+            self._requests = {}
+            self._errors = {}
+            self._histograms = {}
+
+    def record_request(self, acquirer, message_type, error_code=None):
+        """
+        Count a request, and its error if it failed.
+
+        :param acquirer: The acquirer.
+        :param message_type: The request message type, for example ``DirectoryReq``.
+        :param error_code: The iDEAL error code, or the exception name for other errors (optional).
+        """
+        key = (acquirer, message_type)
+        with self._lock:
+            self._requests[key] = self._requests.get(key, 0) + 1
+            if error_code is not None:
+                key = (acquirer, message_type, error_code)
+                self._errors[key] = self._errors.get(key, 0) + 1
+
+    def observe(self, acquirer, message_type, phase, seconds):
+        """
+        Record the duration of a request phase.
+
+        :param acquirer: The acquirer.
+        :param message_type: The request message type, for example ``DirectoryReq``.
+        :param phase: The phase, for example ``sign`` or ``request`` for the whole request.
+        :param seconds: The duration in seconds.
+        """
+        key = (acquirer, message_type, phase)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.record(seconds)
+
+    def on_end(self, span):
+        message_type = span.attributes.get('message_type')
+        if message_type is None:
+            return
+
+        acquirer = span.attributes.get('acquirer')
+        phase = span.name.rsplit('.', 1)[-1]
+
+        self.observe(acquirer, message_type, phase, span.duration)
+
+        if span.name == 'ideal.request':
+            error_code = None
+            if isinstance(span.error, IdealResponseException):
+                error_code = span.error.error_code
+            elif span.error is not None:
+                error_code = type(span.error).__name__
+
+            self.record_request(acquirer, message_type, error_code)
+
+    def snapshot(self):
+        """
+        Return a consistent copy of all metrics.
+
+        :return: Dictionary with the keys ``requests``, ``errors`` and ``latency``, each containing a list of
+                 dictionaries.
+        """
+        with self._lock:
+            requests = dict(self._requests)
+            errors = dict(self._errors)
+            histograms = dict((key, histogram.copy()) for key, histogram in self._histograms.items())
+
+        latency = []
+        for (acquirer, message_type, phase), histogram in sorted(histograms.items(), key=_sort_key):
+            latency.append({
+                'acquirer': acquirer,
+                'message_type': message_type,
+                'phase': phase,
+                'count': histogram.count,
+                'sum': histogram.sum,
+                'min': histogram.min,
+                'max': histogram.max,
+                'quantiles': dict((q, histogram.quantile(q)) for q in self.quantiles),
+            })
+
+        return {
+            'requests': [
+                {'acquirer': acquirer, 'message_type': message_type, 'count': count}
+                for (acquirer, message_type), count in sorted(requests.items(), key=_sort_key)
+            ],
+            'errors': [
+                {'acquirer': acquirer, 'message_type': message_type, 'error_code': error_code, 'count': count}
+                for (acquirer, message_type, error_code), count in sorted(errors.items(), key=_sort_key)
+            ],
+            'latency': latency,
+        }
+
+    def exposition(self):
+        """
+        Return all metrics in the Prometheus text exposition format.
+
+        :return: The metrics as string.
+        """
+        snapshot = self.snapshot()
+
+        lines = [
+            '# HELP ideal_requests_total Number of iDEAL requests.',
+            '# TYPE ideal_requests_total counter',
+        ]
+        for item in snapshot['requests']:
+            lines.append('ideal_requests_total{{{labels}}} {value}'.format(
+                labels=_labels(acquirer=item['acquirer'], message_type=item['message_type']),
+                value=item['count'],
+            ))
+
+        lines.extend([
+            '# HELP ideal_errors_total Number of failed iDEAL requests by error code.',
+            '# TYPE ideal_errors_total counter',
+        ])
+        for item in snapshot['errors']:
+            lines.append('ideal_errors_total{{{labels}}} {value}'.format(
+                labels=_labels(acquirer=item['acquirer'], message_type=item['message_type'],
+                               error_code=item['error_code']),
+                value=item['count'],
+            ))
+
+        lines.extend([
+            '# HELP ideal_duration_seconds Duration of iDEAL request phases.',
+            '# TYPE ideal_duration_seconds summary',
+        ])
+        for item in snapshot['latency']:
+            labels = dict(acquirer=item['acquirer'], message_type=item['message_type'], phase=item['phase'])
+            for quantile in self.quantiles:
+                lines.append('ideal_duration_seconds{{{labels}}} {value!r}'.format(
+                    labels=_labels(quantile=quantile, **labels),
+                    value=item['quantiles'][quantile],
+                ))
+            lines.append('ideal_duration_seconds_sum{{{labels}}} {value!r}'.format(
+                labels=_labels(**labels), value=item['sum']))
+            lines.append('ideal_duration_seconds_count{{{labels}}} {value}'.format(
+                labels=_labels(**labels), value=item['count']))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _sort_key(item):
+    return tuple('' if v is None else str(v) for v in item[0])
+
+
+def _labels(**labels):
+    return ','.join(
+        '{name}="{value}"'.format(
+            name=name,
+            value=('' if value is None else str(value)).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'),
+        )
+        for name, value in sorted(labels.items())
+    )
+
+
+# The default registry, used by all clients unless specified otherwise.
+registry = MetricsRegistry()
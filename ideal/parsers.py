@@ -0,0 +1,104 @@
+import threading
+
+from ideal.exceptions import IdealServerException
+
+# iDEAL messages are small, even a directory with hundreds of issuers is well below this size.
+DEFAULT_MAX_SIZE = 1024 * 1024
+
+# Parsers keep state while parsing and can't be shared between threads, so each thread gets its own.
+_local = threading.local()
+
+
+def create_parser():
+    """
+    Return a new hardened XML parser: no network access, no entity resolution or DTD loading, no ID collection and
+    the default ``libxml2`` limits on tree depth and text size.
+
+    :return: A :class:`lxml.etree.XMLParser` object.
+    """
+    from lxml import etree
+
+    return etree.XMLParser(
+        resolve_entities=False,
+        no_network=True,
+        load_dtd=False,
+        dtd_validation=False,
+        collect_ids=False,
+        huge_tree=False,
+    )
+
+
+def get_parser():
+    """
+    Return the hardened XML parser of the current thread.
+
+    :return: A :class:`lxml.etree.XMLParser` object.
+    """
+    parser = getattr(_local, 'parser', None)
+    if parser is None:
+        parser = _local.parser = create_parser()
+    return parser
+
+
+def parse_xml(data, max_size=DEFAULT_MAX_SIZE):
+    """
+    Parse an XML document with the hardened parser of the current thread.
+
+    :param data: The XML document as bytes.
+    :param max_size: The maximum size of the document in bytes, or ``None`` for no limit (optional).
+                     Default\: 1 MiB.
+
+    :return: A :class:`lxml.etree.ElementTree` object.
+    """
+    if max_size is not None and len(data) > max_size:
+        raise IdealServerException('The XML document of {size} bytes exceeds the maximum of {max_size} bytes.'.format(
+            size=len(data), max_size=max_size))
+
+    from lxml import etree
+
+    return etree.fromstring(data, get_parser()).getroottree()
+
+
+class IncrementalParser(object):
+    """
+    Parses an XML document that arrives in chunks, with the hardened parser of the current thread.
+    """
+    def __init__(self, parser=None):
+        """
+        :param parser: The parser to use, for example from :func:`create_parser` if more than one document is parsed
+                       at a time in this thread (optional). Default\: the parser of the current thread.
+        """
+        self.parser = parser if parser is not None else get_parser()
+
+    def feed(self, data):
+        """
+        Parse the next chunk of the document.
+
+        :param data: The chunk as bytes.
+        """
+        from lxml import etree
+
+        try:
+            self.parser.feed(data)
+        except etree.XMLSyntaxError:
+            self.abort()
+            raise
+
+    def close(self):
+        """
+        Finish parsing.
+
+        :return: A :class:`lxml.etree.ElementTree` object.
+        """
+        return self.parser.close().getroottree()
+
+    def abort(self):
+        """
+        Stop parsing, so the parser of the current thread can be used for the next document.
+        """
+        from lxml import etree
+
+        try:
+            self.parser.close()
+        except etree.XMLSyntaxError:
+            pass
@@ -0,0 +1,408 @@
+"""
+Reconciles transactions, for example for a month-end audit: requests the status of each transaction ID in a CSV or
+JSONL file and writes the results as they complete::
+
+    $ python -m ideal.reconcile --config ideal.cfg transactions.csv statuses.jsonl --concurrency 10
+
+The input is read as a stream and the results are written in the order they complete, so memory use does not depend
+on the size of the input. Progress is kept in a checkpoint file (default: the output file with ``.checkpoint``
+appended). An interrupted run resumes where it stopped: completed transactions are not requested again, and results
+written after the last checkpoint are discarded and requested again, so the output has each transaction once.
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import six
+from six.moves import queue
+
+from ideal.client import get_client
+from ideal.conf import settings
+from ideal.exceptions import IdealConfigurationException, IdealException
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('transaction_id', 'status', 'amount', 'currency', 'consumer_iban', 'consumer_bic', 'status_date', 'error')
+
+# Marks the end of the work, for each worker thread.
+_DONE = object()
+
+
+def get_format(path, format=None):
+    """
+    Return the file format of ``path``: ``csv`` or ``jsonl``.
+
+    :param path: The file path, or ``-`` for standard input or output.
+    :param format: The format, if given explicitly (optional).
+    """
+    if format is not None:
+        return format
+    if os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_transaction_ids(f, format='csv', column='transaction_id'):
+    """
+    Yield the transaction IDs in a CSV file with a header row, or a JSONL file with an object per line.
+
+    :param f: The file, opened in text mode.
+    :param format: ``csv`` or ``jsonl`` (optional). Default\: ``csv``.
+    :param column: The column or key with the transaction ID (optional). Default\: ``transaction_id``.
+    """
+    if format == 'jsonl':
+        records = (json.loads(line) for line in f if line.strip())
+    else:
+        records = csv.DictReader(f)
+
+    for number, record in enumerate(records, 1):
+        transaction_id = record.get(column)
+        if not transaction_id:
+            raise IdealConfigurationException('Record {number} has no "{column}".'.format(
+                number=number, column=column))
+        yield six.text_type(transaction_id).strip()
+
+
+def format_result(transaction_id, response=None, error=None):
+    """
+    Return the result of a status request as dictionary with all :data:`FIELDS`.
+
+    :param transaction_id: The transaction ID.
+    :param response: The :class:`ideal.client.StatusResponse` object, if the request succeeded (optional).
+    :param error: The exception, if the request failed (optional).
+    """
+    result = dict.fromkeys(FIELDS)
+    result['transaction_id'] = transaction_id
+    if response is not None:
+        result.update({
+            'status': response.status,
+            'amount': None if response.amount is None else six.text_type(response.amount),
+            'currency': response.currency,
+            'consumer_iban': response.consumer_iban,
+            'consumer_bic': response.consumer_bic,
+            'status_date': None if response.status_date_timestamp is None else (
+                response.status_date_timestamp.isoformat()),
+        })
+    if error is not None:
+        result['error'] = six.text_type(error)
+    return result
+
+
+class ResultWriter(object):
+    """
+    Writes results to a binary file, as CSV with a header row or as JSONL.
+    """
+    def __init__(self, f, format='jsonl'):
+        self.f = f
+        self.format = format
+
+    def _encode(self, values):
+        if self.format == 'jsonl':
+            return (json.dumps(values, sort_keys=True) + '\n').encode('utf-8')
+
+        line = six.StringIO()
+        csv.writer(line, lineterminator='\n').writerow(['' if values[name] is None else values[name]
+                                                        for name in FIELDS])
+        line = line.getvalue()
+        return line.encode('utf-8') if isinstance(line, six.text_type) else line
+
+    def write_header(self):
+        if self.format == 'csv':
+            self.f.write(self._encode(dict(zip(FIELDS, FIELDS))))
+
+    def write(self, result):
+        self.f.write(self._encode(result))
+
+
+class Checkpoint(object):
+    """
+    The progress of a run: all records below the ``low_water_mark`` are done, as are the ``completed`` records above
+    it. Records complete out of order, but only a bounded number of records beyond the low-water mark are in
+    progress, so the set stays small.
+    """
+    def __init__(self, path, low_water_mark=0, completed=(), output_size=0):
+        """
+        :param path: The path of the checkpoint file.
+        :param low_water_mark: The number of leading records that are done (optional). Default\: 0.
+        :param completed: The numbers of the records above the ``low_water_mark`` that are done (optional).
+        :param output_size: The size in bytes of the output that belongs to this checkpoint (optional). Default\: 0.
+        """
+        self.path = path
+        self.low_water_mark = low_water_mark
+        self.completed = set(completed)
+        self.output_size = output_size
+
+    @classmethod
+    def load(cls, path):
+        """
+        Return the checkpoint in the file at ``path``, or a new checkpoint if it does not exist.
+        """
+        if not os.path.exists(path):
+            return cls(path)
+
+        with io.open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(path, data['low_water_mark'], data['completed'], data['output_size'])
+
+    def is_done(self, index):
+        return index < self.low_water_mark or index in self.completed
+
+    def add(self, index):
+        """
+        Mark the record with given ``index`` as done.
+        """
+        self.completed.add(index)
+        while self.low_water_mark in self.completed:
+            self.completed.remove(self.low_water_mark)
+            self.low_water_mark += 1
+
+    def save(self, output_size):
+        """
+        Write the checkpoint, replacing the file at once so an interruption never leaves a partial checkpoint.
+
+        :param output_size: The size in bytes of the output, which should be flushed to disk.
+        """
+        self.output_size = output_size
+        temp_path = '{path}.tmp'.format(path=self.path)
+        with io.open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(six.text_type(json.dumps({
+                'low_water_mark': self.low_water_mark,
+                'completed': sorted(self.completed),
+                'output_size': output_size,
+            })))
+        os.rename(temp_path, self.path)
+
+
+class Reconciler(object):
+    """
+    Requests the status of a stream of transactions with a fixed number of worker threads.
+    """
+    def __init__(self, client, concurrency=10, window=None, checkpoint_interval=1.0):
+        """
+        :param client: The :class:`ideal.client.IdealClient` object.
+        :param concurrency: The number of concurrent status requests (optional). Default\: 10.
+        :param window: The maximum number of records beyond the low-water mark that are in progress or completed
+                       (optional). Default\: 100 times ``concurrency``.
+        :param checkpoint_interval: The number of seconds between checkpoints (optional). Default\: 1.
+        """
+        self.client = client
+        self.concurrency = concurrency
+        self.window = window or concurrency * 100
+        self.checkpoint_interval = checkpoint_interval
+
+    def _get_status(self, transaction_id):
+        try:
+            return format_result(transaction_id, self.client.get_transaction_status(transaction_id))
+        except IdealException as e:
+            return format_result(transaction_id, error=e)
+        except Exception as e:
+            # A connection reset or timeout fails this transaction, not the run.
+            logger.exception('Could not request the status of transaction %(transaction_id)s.', {
+                'transaction_id': transaction_id,
+            })
+            return format_result(transaction_id, error=e)
+
+    def _put(self, q, item, state):
+        """
+        Put ``item`` on the queue ``q``, unless the run stops while the queue is full.
+
+        :return: ``True`` if the item was put on the queue.
+        """
+        while not state['stopped']:
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _feed(self, transaction_ids, checkpoint, work, condition, state):
+        try:
+            for index, transaction_id in enumerate(transaction_ids):
+                if checkpoint.is_done(index):
+                    state['skipped'] += 1
+                    continue
+
+                # Don't run ahead of the oldest unfinished record, to bound the completed set of the checkpoint.
+                with condition:
+                    while index >= checkpoint.low_water_mark + self.window and not state['stopped']:
+                        condition.wait(1)
+
+                if not self._put(work, (index, transaction_id), state):
+                    break
+        except Exception:
+            state['error'] = sys.exc_info()
+        finally:
+            for i in range(self.concurrency):
+                self._put(work, _DONE, state)
+
+    def _work(self, work, results, state):
+        while not state['stopped']:
+            try:
+                item = work.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                self._put(results, _DONE, state)
+                return
+
+            index, transaction_id = item
+            try:
+                result = self._get_status(transaction_id)
+            except Exception:
+                result = sys.exc_info()
+            self._put(results, (index, result), state)
+
+    def run(self, transaction_ids, writer, output, checkpoint):
+        """
+        Request the status of all transactions that are not done according to the ``checkpoint``.
+
+        :param transaction_ids: An iterable of transaction IDs.
+        :param writer: The :class:`ResultWriter` object.
+        :param output: The binary output file of the ``writer``.
+        :param checkpoint: The :class:`Checkpoint` object.
+
+        :return: Dictionary with the number of ``requested``, ``failed`` and ``skipped`` transactions.
+        """
+        work = queue.Queue(self.concurrency * 2)
+        results = queue.Queue(self.concurrency * 2)
+        condition = threading.Condition()
+        state = {'requested': 0, 'failed': 0, 'skipped': 0, 'stopped': False, 'error': None}
+
+        threads = [threading.Thread(target=self._feed, args=(transaction_ids, checkpoint, work, condition, state))]
+        threads.extend(
+            threading.Thread(target=self._work, args=(work, results, state)) for i in range(self.concurrency))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        def save_checkpoint():
+            output.flush()
+            os.fsync(output.fileno())
+            checkpoint.save(output.tell())
+
+        last_checkpoint = time.time()
+        running = self.concurrency
+        try:
+            while running:
+                item = results.get()
+                if item is _DONE:
+                    running -= 1
+                    continue
+
+                index, result = item
+                if isinstance(result, tuple):
+                    six.reraise(*result)
+
+                writer.write(result)
+                state['requested'] += 1
+                if result['error'] is not None:
+                    state['failed'] += 1
+
+                with condition:
+                    checkpoint.add(index)
+                    condition.notify()
+
+                if time.time() - last_checkpoint >= self.checkpoint_interval:
+                    save_checkpoint()
+                    last_checkpoint = time.time()
+
+            if state['error'] is not None:
+                six.reraise(*state['error'])
+        finally:
+            # Stops the threads, also when the run failed and they are waiting for the queues.
+            with condition:
+                state['stopped'] = True
+                condition.notify()
+            save_checkpoint()
+
+        return dict((key, state[key]) for key in ('requested', 'failed', 'skipped'))
+
+
+def reconcile(input_path, output_path, checkpoint_path=None, input_format=None, output_format=None,
+              column='transaction_id', client=None, concurrency=10):
+    """
+    Request the status of all transactions in the input file and write the results to the output file, resuming from
+    the checkpoint if it exists.
+
+    :param input_path: The CSV or JSONL file with transaction IDs, or ``-`` for standard input.
+    :param output_path: The CSV or JSONL file to write the results to.
+    :param checkpoint_path: The checkpoint file (optional). Default\: ``output_path`` with ``.checkpoint`` appended.
+    :param input_format: ``csv`` or ``jsonl`` (optional). Default\: by the extension of ``input_path``.
+    :param output_format: ``csv`` or ``jsonl`` (optional). Default\: by the extension of ``output_path``.
+    :param column: The column or key with the transaction ID (optional). Default\: ``transaction_id``.
+    :param client: The :class:`ideal.client.IdealClient` object (optional). Default\: a shared client with a
+                   maximum concurrency of ``concurrency``.
+    :param concurrency: The number of concurrent status requests (optional). Default\: 10.
+
+    :return: See :meth:`Reconciler.run`.
+    """
+    if checkpoint_path is None:
+        checkpoint_path = '{path}.checkpoint'.format(path=output_path)
+    if client is None:
+        client = get_client(max_concurrency=concurrency)
+
+    checkpoint = Checkpoint.load(checkpoint_path)
+
+    output_size = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+    if output_size < checkpoint.output_size:
+        raise IdealConfigurationException(
+            'The output file does not match the checkpoint. Remove "{path}" to start over.'.format(
+                path=checkpoint_path))
+
+    # Results after the last checkpoint are requested again, so they are removed from the output.
+    output = io.open(output_path, 'r+b' if os.path.exists(output_path) else 'wb')
+    try:
+        output.truncate(checkpoint.output_size)
+        output.seek(checkpoint.output_size)
+
+        writer = ResultWriter(output, get_format(output_path, output_format))
+        if not checkpoint.output_size:
+            writer.write_header()
+
+        if input_path == '-':
+            f = sys.stdin
+        elif six.PY2:
+            f = io.open(input_path, 'rb')
+        else:
+            f = io.open(input_path, encoding='utf-8', newline='')
+        try:
+            transaction_ids = read_transaction_ids(f, get_format(input_path, input_format), column)
+            return Reconciler(client, concurrency).run(transaction_ids, writer, output, checkpoint)
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    finally:
+        output.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ideal.reconcile',
+                                     description='Request the status of the transactions in a CSV or JSONL file.')
+    parser.add_argument('input', help='CSV or JSONL file with transaction IDs, or - for standard input.')
+    parser.add_argument('output', help='CSV or JSONL file to write the results to.')
+    parser.add_argument('--config', help='Configuration file with an [ideal] section, see Settings.load.')
+    parser.add_argument('--checkpoint', help='Checkpoint file (default: the output file with .checkpoint appended).')
+    parser.add_argument('--input-format', choices=('csv', 'jsonl'), help='Default: by the extension of the input.')
+    parser.add_argument('--output-format', choices=('csv', 'jsonl'), help='Default: by the extension of the output.')
+    parser.add_argument('--column', default='transaction_id',
+                        help='The column or key with the transaction ID (default: transaction_id).')
+    parser.add_argument('--concurrency', type=int, default=10, help='Number of concurrent requests (default: 10).')
+    args = parser.parse_args(argv)
+
+    if args.config:
+        settings.load(args.config)
+
+    counts = reconcile(args.input, args.output, args.checkpoint, args.input_format, args.output_format, args.column,
+                       concurrency=args.concurrency)
+    sys.stderr.write('{requested} requested, {failed} failed, {skipped} skipped (already done).\n'.format(**counts))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,44 +1,152 @@
 import base64
 import hashlib
 import logging
-import re
+import os
+import threading
 from io import BytesIO, open
 
 import six
-from lxml import etree
-from OpenSSL import crypto
 
-from ideal.utils import IDEAL_NAMESPACES, render_to_string
+from ideal.parsers import parse_xml
+from ideal.utils import IDEAL_NAMESPACES, render_to_bytes
 
 logger = logging.getLogger(__name__)
 
 
-class Security(object):
-    def get_fingerprint(self, private_certificate):
+class KeyStore(object):
+    """
+    Keeps loaded private keys and certificates, so clients that share them, like clients for merchants with the same
+    key material, don't read and parse the files for every message. A file is loaded again when it changes on disk.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def _get(self, kind, path, load, *args):
+        stat = os.stat(path)
+        cache_key = (kind, os.path.abspath(path)) + args
+        version = (stat.st_mtime, stat.st_size)
+
+        entry = self._entries.get(cache_key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        with open(path, 'rb') as f:
+            value = load(f.read(), *args)
+
+        with self._lock:
+            self._entries[cache_key] = (version, value)
+
+        return value
+
+    def get_private_key(self, path, password):
         """
-        Return the certificate SHA1-fingerprint.
+        Return the private key in the file at ``path``.
 
-        :param private_certificate: File path to the merchant's own certificate file (ie. cert.cer).
+        :param path: File path to the private key file.
+        :param password: Password to unlock the private key, as bytes.
 
-        :return: Fingerprint as a string.
+        :return: A :class:`OpenSSL.crypto.PKey` object.
         """
-        cert_data = open(private_certificate, "rb").read()
-        cert = crypto.load_certificate(crypto.FILETYPE_PEM, cert_data)
-        sha1_fingerprint = cert.digest("sha1")
+        return self._get('key', path, self._load_private_key, password)
+
+    def get_certificate(self, path):
+        """
+        Return the certificate in the file at ``path``.
+
+        :param path: File path to the certificate file.
+
+        :return: A :class:`OpenSSL.crypto.X509` object.
+        """
+        return self._get('certificate', path, self._load_certificate)
+
+    def get_fingerprint(self, path):
+        """
+        Return the SHA1-fingerprint of the certificate in the file at ``path``, see
+        :meth:`Security.get_fingerprint`.
+        """
+        return self._get('fingerprint', path, self._load_fingerprint)
+
+    def clear(self):
+        """
+        Forget all loaded keys and certificates.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def reset(self):
+        """
+        Keep the loaded keys and certificates, but replace the lock, which may be held by another thread in a forked
+        process.
+        """
+        self._lock = threading.Lock()
+
+    def _load_private_key(self, data, password):
+        from OpenSSL import crypto
+
+        return crypto.load_privatekey(crypto.FILETYPE_PEM, data, password)
+
+    def _load_certificate(self, data):
+        from OpenSSL import crypto
+
+        return crypto.load_certificate(crypto.FILETYPE_PEM, data)
+
+    def _load_fingerprint(self, data):
+        sha1_fingerprint = self._load_certificate(data).digest("sha1")
 
         # Fill the fingerprint with zero's upto 40 chars.
         fingerprint = sha1_fingerprint.zfill(40).lower()
 
-        del cert_data, cert
-
         # replace the ':' characters with spaces, make sure it's a str type
         return fingerprint.decode('utf-8').replace(":", "")
 
+
+# The key store that is shared by all clients.
+key_store = _default_key_store = KeyStore()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=key_store.reset)
+
+
+class Security(object):
+    def __init__(self, key_store=None):
+        """
+        :param key_store: The :class:`KeyStore` to load keys and certificates with (optional). Default\: the shared
+                          ``ideal.security.key_store``.
+        """
+        if key_store is None:
+            key_store = _default_key_store
+        self.key_store = key_store
+
+    def get_fingerprint(self, private_certificate):
+        """
+        Return the certificate SHA1-fingerprint.
+
+        :param private_certificate: File path to the merchant's own certificate file (ie. cert.cer).
+
+        :return: Fingerprint as a string.
+        """
+        return self.key_store.get_fingerprint(private_certificate)
+
     def get_message_digest(self, msg, digest_method=None):
         """
         Return the message digeset of given ``msg`` using ``digest_method`` as hashing function.
 
-        :param msg: The message to create a digest of.
+        :param msg: The message to create a digest of, as bytes or string.
+        :param digest_method: The hashing function to use, as string (optional). Default\: 'sha256'.
+
+        :return: Base 64 encoded message digest.
+        """
+        if isinstance(msg, six.text_type):
+            msg = msg.encode('utf-8')
+
+        return self._get_digest([msg], digest_method)
+
+    def _get_digest(self, parts, digest_method=None):
+        """
+        Return the message digest of the concatenated ``parts``, without concatenating them.
+
+        :param parts: List of bytes-like objects.
         :param digest_method: The hashing function to use, as string (optional). Default\: 'sha256'.
 
         :return: Base 64 encoded message digest.
@@ -46,9 +154,9 @@ class Security(object):
         if digest_method is None:
             digest_method = 'sha256'
 
-        digest_func = getattr(hashlib, digest_method.split('#')[-1])
-
-        hashed = digest_func(msg.encode('utf-8'))
+        hashed = getattr(hashlib, digest_method.split('#')[-1])()
+        for part in parts:
+            hashed.update(part)
         digest = base64.b64encode(hashed.digest())
 
         # make sure we return a str type
@@ -59,81 +167,121 @@ class Security(object):
         Return a signature for the ``signed_info`` string, using provided ``private_key`` and ``password`` to unlock
         the private key.
 
-        :param signed_info: The XML snippet containing only the signed info part as string.
+        :param signed_info: The XML snippet containing only the signed info part as bytes or string.
         :param private_key: File path to the Merchant's private key file.
         :param password: Password to unlock the ``private_key``.
 
         :return: Base 64 encoded signature.
         """
+        # make sure we return a str type
+        return self._get_signature(signed_info, private_key, password).decode('utf-8')
+
+    def _get_signature(self, signed_info, private_key, password):
+        """
+        Return a signature for the ``signed_info``, see :meth:`get_signature`.
+
+        :return: Base 64 encoded signature as bytes.
+        """
+        from OpenSSL import crypto
+
         if isinstance(password, six.text_type):
             password = password.encode('utf-8')
 
         if isinstance(signed_info, six.text_type):
             signed_info = signed_info.encode('utf-8')
 
-        signed_info_tree = etree.parse(BytesIO(signed_info))
+        signed_info_tree = parse_xml(signed_info)
         f = BytesIO()
         signed_info_tree.write_c14n(f, exclusive=True)
         signed_info_str = f.getvalue()
 
-        privatekey_data = open(private_key, "r").read()
-
-        pkey = crypto.load_privatekey(
-            crypto.FILETYPE_PEM, privatekey_data, password)
+        pkey = self.key_store.get_private_key(private_key, password)
 
         signed = crypto.sign(pkey, signed_info_str, "sha256")
 
-        del pkey
-
-        # make sure we return a str type
-        return base64.b64encode(signed).decode('utf-8')
+        return base64.b64encode(signed)
 
-    def sign_message(self, msg, private_certificate, private_key, password):
+    def sign_message(self, msg, private_certificate, private_key, password, declaration=None):
         """
         Return the signed message.
 
-        :param msg: The unsigned XML message to sign.
+        :param msg: The unsigned XML message to sign, as bytes or string.
         :param private_certificate: File path to the Merchant's certificate file.
         :param private_key: File path to the Merchant's private key file.
         :param password: Password to unlock the ``private_key``.
+        :param declaration: Bytes to put in front of the signed message, like the XML declaration (optional).
 
-        :return: The signed message.
+        :return: The signed message, as bytes if ``msg`` was bytes and as string otherwise.
         """
-        signed_info = render_to_string('templates/signed_info.xml', {
+        if isinstance(msg, six.text_type):
+            signed = self.sign_message(msg.encode('utf-8'), private_certificate, private_key, password, declaration)
+            return signed.decode('utf-8')
+
+        signed_info = render_to_bytes('templates/signed_info.xml', {
             'digest_value': self.get_message_digest(msg)
         })
 
-        signature_value = self.get_signature(signed_info, private_key, password)
+        signature_value = self._get_signature(signed_info, private_key, password)
         key_name = self.get_fingerprint(private_certificate)
 
-        signature = render_to_string('templates/signature.xml', {
+        signature = render_to_bytes('templates/signature.xml', {
             'signed_info': signed_info,
             'signature_value': signature_value,
             'key_name': key_name,
         })
 
-        content, container_end = msg.rsplit('<', 1)
+        # Insert the signature before the closing tag of the root element.
+        container_end = msg.rfind(b'<')
+        view = memoryview(msg) if six.PY3 else msg
 
-        return ''.join([content, signature, '<', container_end])
+        return b''.join([declaration or b'', view[:container_end], signature, view[container_end:]])
 
-    def verify(self, xml_document, certificates):
+    def _get_unsigned_parts(self, xml_document):
+        """
+        Return the parts of the ``xml_document`` the digest is about: The document without the XML header, the
+        signature and trailing newlines.
+
+        :param xml_document: The XML document as bytes.
+
+        :return: List of bytes-like objects.
+        """
+        view = memoryview(xml_document) if six.PY3 else xml_document
+
+        start = 0
+        if xml_document.startswith(b'<?'):
+            start = xml_document.find(b'?>') + 2
+            if xml_document[start:start + 1] == b'\n':
+                start += 1
+
+        end = len(xml_document)
+        while end > start and xml_document[end - 1:end] == b'\n':
+            end -= 1
+
+        signature_start = xml_document.find(b'<Signature', start)
+        signature_end = xml_document.rfind(b'</Signature>')
+        if signature_start == -1 or signature_end == -1:
+            return [view[start:end]]
+        return [view[start:signature_start], view[signature_end + len(b'</Signature>'):end]]
+
+    def verify(self, xml_document, certificates, xml_tree=None, message_digest=None):
         """
         Return ``True`` if the ``xml_document`` can be verified against any of the ``certificates``.
 
-        :param xml_document: The XML document, as string, to verify.
+        :param xml_document: The XML document, as bytes or string, to verify.
         :param certificates: List of certificates. Any certificate may match to return a positive result.
+        :param xml_tree: The already parsed ``xml_document`` as :class:`lxml.etree.ElementTree` (optional).
+        :param message_digest: The :class:`MessageDigest` that was already fed the ``xml_document`` (optional).
 
         :return: ``True``, if verification succeded. ``False`` otherwise.
         """
-        if not isinstance(xml_document, six.text_type):
-            xml_document = xml_document.decode('utf-8')
+        from lxml import etree
+        from OpenSSL import crypto
 
-        # Remove the signature, strip the XML header and strip trailing newlines.
-        unsigned_xml = re.sub(
-            re.compile('<\?.*\?>\n?|<Signature.*</Signature>', flags=re.DOTALL),
-            '', xml_document).rstrip('\n')
+        if isinstance(xml_document, six.text_type):
+            xml_document = xml_document.encode('utf-8')
 
-        xml_tree = etree.parse(BytesIO(xml_document.encode('utf-8')))
+        if xml_tree is None:
+            xml_tree = parse_xml(xml_document)
 
         signature = xml_tree.xpath('xmldsig:Signature', namespaces=IDEAL_NAMESPACES)[0]
         signed_info = signature.xpath('xmldsig:SignedInfo', namespaces=IDEAL_NAMESPACES)[0]
@@ -144,7 +292,11 @@ class Security(object):
         digest_value = signed_info.xpath('xmldsig:Reference/xmldsig:DigestValue', namespaces=IDEAL_NAMESPACES)[0].text
 
         # Verify message digest: Signature should be about the unsigned XML.
-        if digest_value != self.get_message_digest(unsigned_xml, digest_method):
+        if message_digest is not None and message_digest.digest_method == digest_method.split('#')[-1]:
+            calculated_digest = message_digest.digest()
+        else:
+            calculated_digest = self._get_digest(self._get_unsigned_parts(xml_document), digest_method)
+        if digest_value != calculated_digest:
             return False
 
         # Get signature properties.
@@ -169,8 +321,7 @@ class Security(object):
             # certificates.
             if key_name.lower() == self.get_fingerprint(cert_file):
 
-                cert_data = open(cert_file, "rb").read()
-                cert = crypto.load_certificate(crypto.FILETYPE_PEM, cert_data)
+                cert = self.key_store.get_certificate(cert_file)
                 x509 = crypto.X509()
                 x509.set_pubkey(cert.get_pubkey())
 
@@ -178,9 +329,116 @@ class Security(object):
                     x509, base64.b64decode(signature_value),
                     signed_info_str, 'sha256')
 
-                del cert_data, cert, x509
+                del x509
 
                 # it will return None when it's been verified
                 return verify is None
 
         return False
+
+
+class MessageDigest(object):
+    """
+    Calculates the digest of a signed message while it arrives in chunks. Like :meth:`Security.verify`, the XML
+    declaration, the signature and trailing newlines are left out.
+    """
+    SIGNATURE_START = b'<Signature'
+    SIGNATURE_END = b'</Signature>'
+
+    def __init__(self, digest_method='sha256'):
+        """
+        :param digest_method: The hashing function to use, as string (optional). Default\: 'sha256'.
+        """
+        self.digest_method = digest_method
+
+        self._hash = getattr(hashlib, digest_method.split('#')[-1])()
+        self._state = 'start'
+        # Data that may contain part of a marker, to be processed with the next chunk.
+        self._pending = b''
+        # Newlines are only hashed once more content follows.
+        self._newlines = 0
+
+    def update(self, data):
+        """
+        Add the next chunk of the message.
+
+        :param data: The chunk as bytes.
+        """
+        if self._pending:
+            data = self._pending + data
+            self._pending = b''
+        # Hash slices of the chunk without copying them.
+        view = memoryview(data) if six.PY3 else data
+
+        position = 0
+        while True:
+            if self._state == 'start':
+                if len(data) < 2:
+                    self._pending = data
+                    return
+                if not data.startswith(b'<?'):
+                    self._state = 'body'
+                    continue
+                end = data.find(b'?>')
+                if end == -1:
+                    self._pending = data
+                    return
+                position = end + 2
+                self._state = 'declaration'
+
+            elif self._state == 'declaration':
+                if position >= len(data):
+                    return
+                if data[position:position + 1] == b'\n':
+                    position += 1
+                self._state = 'body'
+
+            elif self._state == 'body':
+                start = data.find(self.SIGNATURE_START, position)
+                if start == -1:
+                    # Keep what could be the start of the marker.
+                    safe = max(position, len(data) - len(self.SIGNATURE_START) + 1)
+                    self._hash_content(view[position:safe])
+                    self._pending = data[safe:]
+                    return
+                self._hash_content(view[position:start])
+                position = start + len(self.SIGNATURE_START)
+                self._state = 'signature'
+
+            elif self._state == 'signature':
+                end = data.find(self.SIGNATURE_END, position)
+                if end == -1:
+                    self._pending = data[max(position, len(data) - len(self.SIGNATURE_END) + 1):]
+                    return
+                position = end + len(self.SIGNATURE_END)
+                self._state = 'signed'
+
+            else:
+                self._hash_content(view[position:])
+                return
+
+    def _hash_content(self, data):
+        end = len(data)
+        while end and data[end - 1:end] == b'\n':
+            end -= 1
+
+        if end:
+            if self._newlines:
+                self._hash.update(b'\n' * self._newlines)
+                self._newlines = 0
+            self._hash.update(data[:end])
+        self._newlines += len(data) - end
+
+    def digest(self):
+        """
+        Return the digest of the message, after all chunks were added.
+
+        :return: Base 64 encoded message digest, or ``None`` if the message has an incomplete signature.
+        """
+        if self._state == 'signature':
+            return None
+        if self._state in ('start', 'body'):
+            self._hash_content(self._pending)
+            self._pending = b''
+
+        return base64.b64encode(self._hash.digest()).decode('utf-8')
@@ -0,0 +1,461 @@
+"""
+A stand-in acquirer to test and load-test iDEAL integrations without the bank.
+
+The :class:`AcquirerSimulator` is a WSGI application that verifies the signature of incoming requests, keeps track of
+transactions and answers with correctly signed ``DirectoryRes``, ``AcquirerTrxRes`` and ``AcquirerStatusRes``
+messages. Latency and errors can be injected. Use :class:`AcquirerServer` to serve it over HTTP, or run::
+
+    $ python -m ideal.testing --private-key priv.pem --private-key-password secret --private-certificate cert.cer \\
+        --certificate merchant.cer --port 8080
+"""
+import argparse
+import datetime
+import random
+import threading
+import time
+from collections import OrderedDict
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+from xml.sax.saxutils import escape
+
+from lxml import etree
+from six.moves import socketserver
+from six.moves.urllib.parse import parse_qs, urlencode
+
+from ideal.client import TransactionStatus
+from ideal.exceptions import IdealServerException
+from ideal.parsers import parse_xml
+from ideal.security import Security
+from ideal.utils import IDEAL_NAMESPACES, render_to_bytes
+
+DEFAULT_ISSUERS = OrderedDict([
+    ('Nederland', OrderedDict([
+        ('INGBNL2A', 'Issuer Simulation V3 - ING'),
+        ('RABONL2U', 'Issuer Simulation V3 - RABO'),
+    ])),
+])
+
+DEFAULT_CONSUMER = {
+    'consumer_name': 'C. Onsumer',
+    'consumer_iban': 'NL53INGB0654422370',
+    'consumer_bic': 'INGBNL2A',
+}
+
+
+def _timestamp(dt=None):
+    if dt is None:
+        dt = datetime.datetime.utcnow()
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+class SimulatedError(Exception):
+    """
+    Raised while handling a request to answer with an ``AcquirerErrorRes`` message.
+    """
+    def __init__(self, error_code, error_message, error_detail='',
+                 suggested_action='Please try again later or pay using another payment method.',
+                 consumer_message='Betalen met iDEAL is nu niet mogelijk.'):
+        super(SimulatedError, self).__init__(error_code, error_message)
+        self.error_code = error_code
+        self.error_message = error_message
+        self.error_detail = error_detail
+        self.suggested_action = suggested_action
+        self.consumer_message = consumer_message
+
+
+class AcquirerSimulator(object):
+    """
+    WSGI application that acts as an iDEAL acquirer.
+
+    ``POST`` requests to any path are handled as iDEAL messages. ``GET`` requests to the issuer authentication URL
+    complete the transaction and redirect the consumer to the merchant's return URL.
+    """
+    def __init__(self, private_key, private_key_password, private_certificate, certificates, acquirer_id='0050',
+                 issuers=None, latency=0, error_rate=0.0, http_error_rate=0.0, status=TransactionStatus.SUCCESS,
+                 issuer_url=None, seed=None, max_transactions=10000):
+        """
+        :param private_key: File path to the acquirer's private key, used to sign responses.
+        :param private_key_password: Password to unlock the ``private_key``.
+        :param private_certificate: File path to the acquirer's certificate. Merchants need this certificate in their
+                                    ``CERTIFICATES`` setting.
+        :param certificates: List of merchant certificates to verify requests against, or ``None`` to accept unsigned
+                             requests.
+        :param acquirer_id: The 4 digit acquirer ID (optional). Default\: ``0050``.
+        :param issuers: Dictionary of countries with a dictionary of issuers each (optional). Default\: an ING and
+                        a Rabobank simulation issuer.
+        :param latency: Seconds to wait before answering, or a callable that returns the number of seconds
+                        (optional). Default\: 0.
+        :param error_rate: Fraction of requests answered with an ``AcquirerErrorRes`` (optional). Default\: 0.
+        :param http_error_rate: Fraction of requests answered with HTTP 503 (optional). Default\: 0.
+        :param status: The final status of transactions, or a callable that receives the transaction dictionary and
+                       returns its status (optional). Default\: ``TransactionStatus.SUCCESS``.
+        :param issuer_url: Base URL of the issuer authentication page (optional). Default\: the URL the request was
+                           sent to.
+        :param seed: Seed for the random generator used for error injection (optional).
+        :param max_transactions: The maximum number of transactions to keep, or ``None`` for no limit. The least
+                                 recently used transactions are forgotten first (optional). Default\: 10000.
+        """
+        self.private_key = private_key
+        self.private_key_password = private_key_password
+        self.private_certificate = private_certificate
+        self.certificates = certificates
+        self.acquirer_id = acquirer_id
+        self.issuers = issuers if issuers is not None else DEFAULT_ISSUERS
+        self.latency = latency
+        self.error_rate = error_rate
+        self.http_error_rate = http_error_rate
+        self.status = status
+        self.issuer_url = issuer_url
+        self.max_transactions = max_transactions
+
+        self.security = Security()
+        self.transactions = OrderedDict()
+        self.directory_timestamp = _timestamp()
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counter = 0
+
+        self._handlers = {
+            'DirectoryReq': self.handle_directory,
+            'AcquirerTrxReq': self.handle_transaction,
+            'AcquirerStatusReq': self.handle_status,
+        }
+
+    def __call__(self, environ, start_response):
+        method = environ.get('REQUEST_METHOD', 'GET')
+
+        if method == 'GET':
+            return self.handle_issuer(environ, start_response)
+
+        if method != 'POST':
+            start_response('405 Method Not Allowed', [('Content-Type', 'text/plain'), ('Allow', 'GET, POST')])
+            return [b'Method not allowed.']
+
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        body = environ['wsgi.input'].read(length) if length > 0 else b''
+
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+
+        if self.http_error_rate and self._random.random() < self.http_error_rate:
+            start_response('503 Service Unavailable', [('Content-Type', 'text/plain')])
+            return [b'Service temporarily unavailable.']
+
+        content = self.handle(body, environ)
+
+        start_response('200 OK', [
+            ('Content-Type', 'text/xml; charset="utf-8"'),
+            ('Content-Length', str(len(content))),
+        ])
+        return [content]
+
+    def handle(self, body, environ=None):
+        """
+        Handle an iDEAL message and return the signed response.
+
+        :param body: The signed request as bytes.
+        :param environ: The WSGI environment (optional).
+
+        :return: The signed response as bytes.
+        """
+        try:
+            if self.error_rate and self._random.random() < self.error_rate:
+                raise SimulatedError('SO1000', 'Failure in system', 'Simulated error.')
+
+            try:
+                xml = parse_xml(body).getroot()
+            except (etree.XMLSyntaxError, IdealServerException) as e:
+                raise SimulatedError('IX1100', 'Received XML not valid', str(e))
+
+            message_type = etree.QName(xml).localname
+            handler = self._handlers.get(message_type)
+            if handler is None:
+                raise SimulatedError('IX1100', 'Received XML not valid', 'Unknown message: {message_type}'.format(
+                    message_type=message_type))
+
+            if self.certificates is not None and not self._verify(body):
+                raise SimulatedError('SE2700', 'Invalid electronic signature', 'Signature could not be verified.')
+
+            content = handler(xml, environ or {})
+        except SimulatedError as e:
+            content = render_to_bytes('templates/testing/error_response.xml', {
+                'timestamp': _timestamp(),
+                'error_code': escape(e.error_code),
+                'error_message': escape(e.error_message),
+                'error_detail': escape(e.error_detail),
+                'suggested_action': escape(e.suggested_action),
+                'consumer_message': escape(e.consumer_message),
+            })
+
+        return self.sign(content)
+
+    def _verify(self, body):
+        try:
+            return self.security.verify(body, self.certificates)
+        except (IndexError, ValueError, etree.LxmlError):
+            # Unsigned or malformed signature.
+            return False
+
+    def sign(self, content):
+        """
+        Sign a response message.
+
+        :param content: The unsigned message as bytes.
+
+        :return: The signed message, including the XML declaration, as bytes.
+        """
+        return self.security.sign_message(
+            content, self.private_certificate, self.private_key, self.private_key_password,
+            b'<?xml version="1.0" encoding="UTF-8"?>')
+
+    def _text(self, xml, path, required=True):
+        nodes = xml.xpath(path, namespaces=IDEAL_NAMESPACES)
+        if not nodes or nodes[0].text is None:
+            if required:
+                raise SimulatedError('IX1100', 'Received XML not valid', 'Field generating error: {field}'.format(
+                    field=path.rsplit(':', 1)[-1]))
+            return None
+        return nodes[0].text
+
+    def _next_transaction_id(self):
+        with self._lock:
+            self._counter += 1
+            counter = self._counter
+        return '{acquirer_id}{counter:012d}'.format(acquirer_id=self.acquirer_id, counter=counter)
+
+    def _issuer_url(self, environ):
+        if self.issuer_url:
+            return self.issuer_url
+        if not environ.get('HTTP_HOST'):
+            return 'http://localhost/'
+        return '{scheme}://{host}{path}'.format(
+            scheme=environ.get('wsgi.url_scheme', 'http'),
+            host=environ['HTTP_HOST'],
+            path=environ.get('PATH_INFO') or '/',
+        )
+
+    def handle_directory(self, xml, environ):
+        self._text(xml, 'ideal:Merchant/ideal:merchantID')
+
+        countries = []
+        for country, issuers in self.issuers.items():
+            countries.append(
+                '\n        <Country>\n            <countryNames>{country}</countryNames>{issuers}\n        </Country>'
+                .format(country=escape(country), issuers=''.join(
+                    '\n            <Issuer>\n                <issuerID>{code}</issuerID>\n'
+                    '                <issuerName>{name}</issuerName>\n            </Issuer>'.format(
+                        code=escape(code), name=escape(name))
+                    for code, name in issuers.items()
+                )))
+
+        return render_to_bytes('templates/testing/directory_response.xml', {
+            'timestamp': _timestamp(),
+            'acquirer_id': self.acquirer_id,
+            'directory_timestamp': self.directory_timestamp,
+            'countries': ''.join(countries),
+        })
+
+    def handle_transaction(self, xml, environ):
+        issuer_id = self._text(xml, 'ideal:Issuer/ideal:issuerID')
+        if not any(issuer_id in issuers for issuers in self.issuers.values()):
+            raise SimulatedError('BR1320', 'Field generating error: issuerID', 'Unknown issuer.')
+
+        transaction = {
+            'transaction_id': self._next_transaction_id(),
+            'issuer_id': issuer_id,
+            'merchant_id': self._text(xml, 'ideal:Merchant/ideal:merchantID'),
+            'merchant_return_url': self._text(xml, 'ideal:Merchant/ideal:merchantReturnURL'),
+            'purchase_id': self._text(xml, 'ideal:Transaction/ideal:purchaseID'),
+            'amount': self._text(xml, 'ideal:Transaction/ideal:amount'),
+            'currency': self._text(xml, 'ideal:Transaction/ideal:currency'),
+            'description': self._text(xml, 'ideal:Transaction/ideal:description', required=False),
+            'entrance_code': self._text(xml, 'ideal:Transaction/ideal:entranceCode'),
+            'created': _timestamp(),
+            'status': TransactionStatus.OPEN,
+            'status_timestamp': None,
+        }
+
+        with self._lock:
+            self.transactions[transaction['transaction_id']] = transaction
+            # Keeps memory use constant during long load tests.
+            while self.max_transactions is not None and len(self.transactions) > self.max_transactions:
+                self.transactions.popitem(last=False)
+
+        issuer_authentication_url = '{url}?{query}'.format(
+            url=self._issuer_url(environ),
+            query=urlencode([('trxid', transaction['transaction_id'])]),
+        )
+
+        return render_to_bytes('templates/testing/transaction_response.xml', {
+            'timestamp': _timestamp(),
+            'acquirer_id': self.acquirer_id,
+            'issuer_authentication_url': escape(issuer_authentication_url),
+            'transaction_id': transaction['transaction_id'],
+            'transaction_timestamp': transaction['created'],
+            'purchase_id': escape(transaction['purchase_id']),
+        })
+
+    def handle_status(self, xml, environ):
+        transaction_id = self._text(xml, 'ideal:Transaction/ideal:transactionID')
+
+        transaction = self.complete(transaction_id)
+
+        consumer = ''
+        if transaction['status'] == TransactionStatus.SUCCESS:
+            consumer = (
+                '\n        <consumerName>{consumer_name}</consumerName>'
+                '\n        <consumerIBAN>{consumer_iban}</consumerIBAN>'
+                '\n        <consumerBIC>{consumer_bic}</consumerBIC>'
+            ).format(**dict((k, escape(v)) for k, v in DEFAULT_CONSUMER.items()))
+
+        return render_to_bytes('templates/testing/status_response.xml', {
+            'timestamp': _timestamp(),
+            'acquirer_id': self.acquirer_id,
+            'transaction_id': transaction_id,
+            'status': transaction['status'],
+            'status_timestamp': transaction['status_timestamp'],
+            'consumer': consumer,
+            'amount': escape(transaction['amount']),
+            'currency': escape(transaction['currency']),
+        })
+
+    def handle_issuer(self, environ, start_response):
+        """
+        Simulate the consumer completing the payment at the issuer, and redirect to the merchant's return URL.
+        """
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        transaction_id = query.get('trxid', [None])[0]
+
+        try:
+            transaction = self.complete(transaction_id)
+        except SimulatedError:
+            start_response('404 Not Found', [('Content-Type', 'text/plain')])
+            return [b'Unknown transaction.']
+
+        location = '{url}{separator}{query}'.format(
+            url=transaction['merchant_return_url'],
+            separator='&' if '?' in transaction['merchant_return_url'] else '?',
+            query=urlencode([('trxid', transaction['transaction_id']), ('ec', transaction['entrance_code'])]),
+        )
+
+        start_response('302 Found', [('Location', location), ('Content-Type', 'text/plain')])
+        return [b'']
+
+    def complete(self, transaction_id):
+        """
+        Give an open transaction its final status.
+
+        :param transaction_id: The transaction ID.
+
+        :return: The transaction dictionary.
+        """
+        with self._lock:
+            transaction = self.transactions.pop(transaction_id, None)
+            if transaction is None:
+                raise SimulatedError('AP2700', 'Transaction not found', 'Unknown transactionID.')
+            # Mark it as recently used.
+            self.transactions[transaction_id] = transaction
+
+            if transaction['status'] == TransactionStatus.OPEN:
+                status = self.status(transaction) if callable(self.status) else self.status
+                self._set_status(transaction, status)
+
+            return transaction
+
+    def set_status(self, transaction_id, status):
+        """
+        Set the status of a transaction, for example to simulate a cancellation.
+
+        :param transaction_id: The transaction ID.
+        :param status: Any of the constants in :class:`ideal.client.TransactionStatus`.
+        """
+        with self._lock:
+            self._set_status(self.transactions[transaction_id], status)
+
+    def _set_status(self, transaction, status):
+        transaction['status'] = status
+        transaction['status_timestamp'] = _timestamp()
+
+
+class _ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class AcquirerServer(object):
+    """
+    Serves an :class:`AcquirerSimulator` over HTTP in a background thread. Can be used as context manager.
+    """
+    def __init__(self, simulator, host='127.0.0.1', port=0):
+        """
+        :param simulator: The :class:`AcquirerSimulator` object.
+        :param host: The host to listen on (optional). Default\: ``127.0.0.1``.
+        :param port: The port to listen on (optional). Default\: a free port.
+        """
+        self.simulator = simulator
+        self.httpd = make_server(host, port, simulator, server_class=_ThreadingWSGIServer,
+                                 handler_class=_QuietWSGIRequestHandler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://{host}:{port}/ideal/iDEALv3'.format(host=host, port=port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ideal.testing', description='Run a stand-in iDEAL acquirer.')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to listen on (default: 127.0.0.1).')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on (default: 8080).')
+    parser.add_argument('--private-key', required=True, help="The acquirer's private key to sign responses with.")
+    parser.add_argument('--private-key-password', default='', help='Password of the private key.')
+    parser.add_argument('--private-certificate', required=True, help="The acquirer's certificate.")
+    parser.add_argument('--certificate', action='append', dest='certificates',
+                        help='Merchant certificate to verify requests with. If omitted, requests are not verified.')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds to wait before answering (default: 0).')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of iDEAL error responses.')
+    parser.add_argument('--http-error-rate', type=float, default=0, help='Fraction of HTTP 503 responses.')
+    args = parser.parse_args(argv)
+
+    simulator = AcquirerSimulator(
+        args.private_key, args.private_key_password, args.private_certificate, args.certificates,
+        latency=args.latency, error_rate=args.error_rate, http_error_rate=args.http_error_rate)
+
+    server = AcquirerServer(simulator, args.host, args.port)
+    print('Serving stand-in acquirer on {url}'.format(url=server.url))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+import threading
+import time
+
+try:
+    import contextvars
+except ImportError:  # Python < 3.7
+    contextvars = None
+
+# The active spans of all tracers, as ``(tracer, span)`` pairs. Each thread, and each asyncio task, has its own stack.
+# Context variables are never freed, so all tracers share this one.
+if contextvars is not None:
+    _spans = contextvars.ContextVar('ideal_spans', default=())
+else:
+    _spans = None
+    _local = threading.local()
+
+
+class SpanHook(object):
+    """
+    Base class for tracing hooks. Override ``on_start`` and/or ``on_end`` to receive spans.
+    """
+    def on_start(self, span):
+        """
+        Called when ``span`` starts.
+
+        :param span: The :class:`Span` object.
+        """
+        pass
+
+    def on_end(self, span):
+        """
+        Called when ``span`` ends. The span's ``end`` and ``error`` are set at this point.
+
+        :param span: The :class:`Span` object.
+        """
+        pass
+
+
+class Span(object):
+    """
+    A timed phase of an iDEAL request, like signing the message or the HTTP exchange.
+
+    Attributes of the parent span, like ``message_type`` and ``acquirer``, are inherited.
+    """
+    def __init__(self, tracer, name, parent=None, attributes=None):
+        self.tracer = tracer
+        self.hooks = tracer.hooks
+        self.name = name
+        self.parent = parent
+        self.attributes = dict(parent.attributes) if parent is not None else {}
+        if attributes:
+            self.attributes.update(attributes)
+
+        self.start = None
+        self.end = None
+        self.error = None
+        # Storage for hooks to keep their own state, like the span of a tracing library.
+        self.extra = {}
+
+    @property
+    def duration(self):
+        if self.start is None or self.end is None:
+            return None
+        return self.end - self.start
+
+    def __enter__(self):
+        self.start = time.time()
+        self.tracer._push(self)
+        for hook in self.hooks:
+            hook.on_start(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end = time.time()
+        self.error = exc_value
+        self.tracer._pop(self)
+        for hook in self.hooks:
+            hook.on_end(self)
+        return False
+
+
+class _NullSpan(object):
+    """
+    Shared span that does nothing, used when no hooks are registered.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer(object):
+    """
+    Emits :class:`Span` objects to the registered hooks. If no hooks are registered, no spans are created at all.
+
+    A tracer can have a ``parent`` tracer, whose hooks also receive all spans and whose active span is used as parent
+    if the tracer itself has no active span.
+    """
+    def __init__(self, hooks=(), parent=None):
+        """
+        :param hooks: The initial :class:`SpanHook` objects (optional).
+        :param parent: The parent :class:`Tracer` (optional).
+        """
+        self.parent = parent
+        self._hooks = tuple(hooks)
+        # The hooks of this tracer and its parents, with the tuples they were combined from.
+        self._combined = (None, None, ())
+
+    @property
+    def hooks(self):
+        if self.parent is None:
+            return self._hooks
+
+        # Hooks are added and removed by replacing the tuples, so unchanged tuples mean the combination is current.
+        hooks, parent_hooks = self._hooks, self.parent.hooks
+        combined = self._combined
+        if combined[0] is not hooks or combined[1] is not parent_hooks:
+            combined = self._combined = (hooks, parent_hooks, hooks + parent_hooks)
+        return combined[2]
+
+    def __bool__(self):
+        return bool(self.hooks)
+
+    __nonzero__ = __bool__
+
+    def add_hook(self, hook):
+        """
+        Register a hook.
+
+        :param hook: A :class:`SpanHook` object.
+        """
+        # Replace, rather than mutate, the tuple so spans in other threads can safely iterate over it.
+        self._hooks = self._hooks + (hook, )
+
+    def remove_hook(self, hook):
+        """
+        Unregister a hook.
+
+        :param hook: A previously registered :class:`SpanHook` object.
+        """
+        self._hooks = tuple(h for h in self._hooks if h is not hook)
+
+    def current_span(self):
+        """
+        Return the active span in the current thread or asyncio task.
+
+        :return: A :class:`Span` object, or ``None``.
+        """
+        for tracer, span in reversed(_get_stack()):
+            if tracer is self:
+                return span
+        if self.parent is not None:
+            return self.parent.current_span()
+        return None
+
+    def span(self, name, **attributes):
+        """
+        Return a new span, to be used as context manager, that is a child of the active span in the current thread or
+        asyncio task.
+
+        :param name: Name of the span, for example ``ideal.sign``.
+        :param \*\*attributes: Additional attributes of the span (optional).
+
+        :return: A :class:`Span` object, or a span that does nothing if no hooks are registered.
+        """
+        if not self.hooks:
+            return NULL_SPAN
+        return Span(self, name, self.current_span(), attributes)
+
+    def activate(self, span):
+        """
+        Return a context manager that makes ``span`` the active span in the current thread, for example to continue a
+        trace in another thread.
+
+        :param span: A :class:`Span` object, or ``None``.
+        """
+        if span is None:
+            return NULL_SPAN
+        return _ActiveSpan(self, span)
+
+    def _push(self, span):
+        _set_stack(_get_stack() + ((self, span), ))
+
+    def _pop(self, span):
+        stack = _get_stack()
+        for index in range(len(stack) - 1, -1, -1):
+            if stack[index][0] is self:
+                if stack[index][1] is span:
+                    _set_stack(stack[:index] + stack[index + 1:])
+                return
+
+
+def _get_stack():
+    if _spans is not None:
+        return _spans.get()
+    return getattr(_local, 'stack', ())
+
+
+def _set_stack(stack):
+    if _spans is not None:
+        _spans.set(stack)
+    else:
+        _local.stack = stack
+
+
+class _ActiveSpan(object):
+    def __init__(self, tracer, span):
+        self.tracer = tracer
+        self.span = span
+
+    def __enter__(self):
+        self.tracer._push(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracer._pop(self.span)
+        return False
+
+
+class OpenTelemetryHook(SpanHook):
+    """
+    Forwards all spans to OpenTelemetry. Requires the ``opentelemetry-api`` package.
+    """
+    def __init__(self, tracer=None):
+        """
+        :param tracer: An OpenTelemetry tracer (optional). Default\: the tracer named ``ideal``.
+        """
+        from opentelemetry import trace
+
+        self._trace = trace
+        self._tracer = tracer if tracer is not None else trace.get_tracer('ideal')
+
+    def on_start(self, span):
+        context = None
+        if span.parent is not None and self in span.parent.extra:
+            context = self._trace.set_span_in_context(span.parent.extra[self])
+
+        span.extra[self] = self._tracer.start_span(
+            span.name, context=context, attributes=span.attributes, start_time=int(span.start * 1e9))
+
+    def on_end(self, span):
+        otel_span = span.extra.pop(self, None)
+        if otel_span is None:
+            return
+
+        if span.error is not None:
+            otel_span.record_exception(span.error)
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, str(span.error)))
+
+        otel_span.end(end_time=int(span.end * 1e9))
+
+
+# The default tracer, used by all clients unless specified otherwise.
+tracer = Tracer()
@@ -0,0 +1,524 @@
+"""
+Transports perform the raw HTTP exchange with the acquirer for :class:`ideal.client.IdealClient`. Signing, logging,
+tracing and verification all happen in the client, so every transport gets the same behaviour.
+
+A transport receives the signed :class:`ideal.client.HttpRequest` and returns a :class:`TransportResponse`::
+
+    from ideal.transports import Urllib3Transport
+    ideal = IdealClient(transport=Urllib3Transport(timeout=10))
+"""
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import weakref
+from io import BytesIO, open
+
+import six
+from six.moves.urllib.parse import urlsplit
+
+from ideal.exceptions import IdealConfigurationException, IdealServerException
+from ideal.parsers import DEFAULT_MAX_SIZE
+
+DEFAULT_POOL_SIZE = 10
+
+# The number of acquirer hosts to keep connections to, when clients of different acquirers share a transport.
+MAX_HOSTS = 4
+
+# The size of the chunks in which response bodies are read.
+CHUNK_SIZE = 16 * 1024
+
+# Recordings start with this marker, followed by length-prefixed records.
+RECORDING_MAGIC = b'IDEALREC\x01'
+# Status code, duration in seconds, and the length of the request body, response headers and response body.
+RECORDING_HEADER = struct.Struct('>HdIII')
+
+# All transports, to reset their connections after a fork.
+_transports = weakref.WeakSet()
+
+
+class TransportResponse(object):
+    """
+    The raw HTTP response of the acquirer. The body is either given as ``content``, or streamed as ``chunks`` so it
+    can be read with :meth:`iter_content` without holding it in memory twice.
+    """
+    def __init__(self, status_code, headers, content=None, chunks=None, close=None):
+        """
+        :param status_code: The HTTP status code.
+        :param headers: Dictionary of response headers.
+        :param content: The response body as bytes (optional).
+        :param chunks: Iterable of bytes that make up the response body, if no ``content`` is given (optional).
+        :param close: Function to call to release the connection (optional).
+        """
+        self.status_code = status_code
+        self.headers = headers
+        self._content = content
+        self._chunks = chunks
+        self._close = close
+
+    @property
+    def content(self):
+        """
+        The entire response body as bytes.
+        """
+        if self._content is None:
+            self._content = b''.join(self.iter_content())
+        return self._content
+
+    def iter_content(self):
+        """
+        Return an iterator over the chunks of the response body. A streamed body can only be read once.
+        """
+        if self._content is not None:
+            return iter([self._content])
+        if self._chunks is None:
+            return iter([b''])
+
+        chunks, self._chunks = self._chunks, None
+        return iter(chunks)
+
+    def close(self):
+        """
+        Release the connection.
+        """
+        if self._close is not None:
+            close, self._close = self._close, None
+            close()
+
+
+class Transport(object):
+    """
+    Base class for transports.
+
+    Each priority, and hedged attempts, should get its own connections, so background requests can never occupy the
+    connections of interactive requests.
+    """
+    def __init__(self, limiter=None, pool_size=DEFAULT_POOL_SIZE):
+        """
+        :param limiter: A :class:`ideal.concurrency.PriorityLimiter` to size the connection pool of each priority by
+                        (optional). Default\: the limiter of the client.
+        :param pool_size: The number of connections to keep per priority, if there's no ``limiter`` (optional).
+                          Default\: 10.
+        """
+        self.limiter = limiter
+        self.pool_size = pool_size
+
+        self._pools = {}
+        self._lock = threading.Lock()
+
+        _transports.add(self)
+
+    def send(self, request, priority, hedge=False):
+        """
+        Send the request and return the response.
+
+        :param request: The signed :class:`ideal.client.HttpRequest` object.
+        :param priority: Any of the constants in :class:`ideal.concurrency.RequestPriority`.
+        :param hedge: ``True`` if this is a hedged attempt, that should use a separate connection (optional).
+                      Default\: ``False``.
+
+        :return: A :class:`TransportResponse` object.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Close all connections.
+        """
+        with self._lock:
+            pools, self._pools = self._pools, {}
+
+        for pool in pools.values():
+            self.close_pool(pool)
+
+    def reset(self):
+        """
+        Forget all connections without closing them. In a forked process, the connections are shared with the parent
+        process, which may still use them.
+        """
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get_pool(self, priority, hedge=False):
+        """
+        Return the connection pool for given ``priority``, creating it with :meth:`create_pool` if needed.
+
+        :param priority: Any of the constants in :class:`ideal.concurrency.RequestPriority`.
+        :param hedge: ``True`` for the separate pool of hedged attempts (optional). Default\: ``False``.
+        """
+        key = 'hedge' if hedge else priority
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = self._pools[key] = self.create_pool(self.get_pool_size(priority))
+        return pool
+
+    def get_pool_size(self, priority):
+        if self.limiter is not None:
+            return self.limiter.capacity(priority)
+        return self.pool_size
+
+    def create_pool(self, size):
+        """
+        Create a connection pool.
+
+        :param size: The maximum number of connections to keep.
+        """
+        raise NotImplementedError
+
+    def close_pool(self, pool):
+        pool.close()
+
+
+class RequestsTransport(Transport):
+    """
+    Sends requests with the ``requests`` library. This is the default transport.
+    """
+    def __init__(self, limiter=None, pool_size=DEFAULT_POOL_SIZE, timeout=None):
+        """
+        :param limiter: See :class:`Transport`.
+        :param pool_size: See :class:`Transport`.
+        :param timeout: Timeout in seconds (optional). Default\: no timeout.
+        """
+        super(RequestsTransport, self).__init__(limiter, pool_size)
+        self.timeout = timeout
+
+    def create_pool(self, size):
+        import requests
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=MAX_HOSTS, pool_maxsize=size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def send(self, request, priority, hedge=False):
+        response = self.get_pool(priority, hedge).request(
+            request.method, request.uri, data=request.body, headers=request.headers, timeout=self.timeout,
+            stream=True)
+        return TransportResponse(
+            response.status_code, response.headers, chunks=response.iter_content(CHUNK_SIZE), close=response.close)
+
+
+_shared_transport = None
+_shared_transport_lock = threading.Lock()
+
+
+def get_shared_transport():
+    """
+    Return the :class:`RequestsTransport` that is shared by all clients without their own transport or limiter, so
+    clients of many merchants reuse the same connections to their acquirer.
+
+    :return: A :class:`RequestsTransport` object.
+    """
+    global _shared_transport
+
+    if _shared_transport is None:
+        with _shared_transport_lock:
+            if _shared_transport is None:
+                _shared_transport = RequestsTransport()
+    return _shared_transport
+
+
+def _reset_after_fork():
+    global _shared_transport_lock
+
+    _shared_transport_lock = threading.Lock()
+    for transport in list(_transports):
+        transport.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class Urllib3Transport(Transport):
+    """
+    Sends requests with ``urllib3`` directly, skipping the overhead of ``requests`` sessions.
+    """
+    def __init__(self, limiter=None, pool_size=DEFAULT_POOL_SIZE, timeout=None, retries=False):
+        """
+        :param limiter: See :class:`Transport`.
+        :param pool_size: See :class:`Transport`.
+        :param timeout: Timeout in seconds (optional). Default\: no timeout.
+        :param retries: The urllib3 ``retries`` argument (optional). Default\: ``False``, iDEAL requests are not
+                        retried.
+        """
+        super(Urllib3Transport, self).__init__(limiter, pool_size)
+        self.timeout = timeout
+        self.retries = retries
+
+    def create_pool(self, size):
+        # Block when the pool is exhausted, so the pool size really bounds the number of connections.
+        import urllib3
+
+        return urllib3.PoolManager(num_pools=MAX_HOSTS, maxsize=size, block=True)
+
+    def close_pool(self, pool):
+        pool.clear()
+
+    def send(self, request, priority, hedge=False):
+        body = request.body
+        if isinstance(body, six.text_type):
+            body = body.encode('utf-8')
+
+        response = self.get_pool(priority, hedge).request(
+            request.method, request.uri, body=body, headers=request.headers, timeout=self.timeout,
+            retries=self.retries, redirect=False, preload_content=False)
+        return TransportResponse(
+            response.status, dict(response.headers), chunks=response.stream(CHUNK_SIZE), close=response.release_conn)
+
+
+class Http2Transport(Transport):
+    """
+    Sends requests over HTTP/2 with ``httpx``, so many concurrent requests, like status calls, share one connection.
+    Requires the ``httpx[http2]`` package.
+    """
+    def __init__(self, limiter=None, pool_size=DEFAULT_POOL_SIZE, timeout=None):
+        """
+        :param limiter: See :class:`Transport`.
+        :param pool_size: See :class:`Transport`.
+        :param timeout: Timeout in seconds (optional). Default\: no timeout.
+        """
+        try:
+            import h2  # noqa
+            import httpx
+        except ImportError:
+            raise IdealConfigurationException('The Http2Transport requires the "httpx[http2]" package.')
+
+        super(Http2Transport, self).__init__(limiter, pool_size)
+        self.timeout = timeout
+        self._httpx = httpx
+
+    def create_pool(self, size):
+        limits = self._httpx.Limits(max_connections=size, max_keepalive_connections=size)
+        return self._httpx.Client(http2=True, limits=limits, timeout=self.timeout)
+
+    def send(self, request, priority, hedge=False):
+        client = self.get_pool(priority, hedge)
+        response = client.send(
+            client.build_request(request.method, request.uri, content=request.body, headers=request.headers),
+            stream=True)
+        return TransportResponse(
+            response.status_code, response.headers, chunks=response.iter_bytes(CHUNK_SIZE), close=response.close)
+
+
+class WSGITransport(Transport):
+    """
+    Calls a WSGI application in-process, for example :class:`ideal.testing.AcquirerSimulator`. No network is involved,
+    which makes it suitable for tests and benchmarks of the full client stack.
+    """
+    def __init__(self, app):
+        """
+        :param app: The WSGI application.
+        """
+        super(WSGITransport, self).__init__()
+        self.app = app
+
+    def send(self, request, priority, hedge=False):
+        body = request.body or b''
+        if isinstance(body, six.text_type):
+            body = body.encode('utf-8')
+
+        url = urlsplit(request.uri)
+        environ = {
+            'REQUEST_METHOD': request.method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': url.path or '/',
+            'QUERY_STRING': url.query,
+            'SERVER_NAME': url.hostname or 'localhost',
+            'SERVER_PORT': str(url.port or (443 if url.scheme == 'https' else 80)),
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': url.netloc,
+            'CONTENT_TYPE': request.headers.get('content-type', ''),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': url.scheme or 'http',
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in request.headers.items():
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            if key not in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+                environ[key] = value
+
+        status = []
+
+        def start_response(status_line, response_headers, exc_info=None):
+            if exc_info is not None:
+                six.reraise(*exc_info)
+            status[:] = [status_line, response_headers]
+
+        result = self.app(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+        status_line, response_headers = status
+        return TransportResponse(int(status_line.split(' ', 1)[0]), dict(response_headers), content)
+
+
+class Recording(object):
+    """
+    A recorded exchange.
+    """
+    def __init__(self, request, status_code, headers, content, duration):
+        """
+        :param request: The signed request body as bytes.
+        :param status_code: The HTTP status code.
+        :param headers: Dictionary of response headers.
+        :param content: The response body as bytes.
+        :param duration: The duration of the exchange in seconds.
+        """
+        self.request = request
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.duration = duration
+
+    def to_response(self):
+        return TransportResponse(self.status_code, dict(self.headers), self.content)
+
+
+def read_recordings(filepath):
+    """
+    Read the exchanges in a recording file, in order. An incomplete last record, of an interrupted recording, is
+    ignored.
+
+    :param filepath: The recording file.
+
+    :return: Iterator of :class:`Recording` objects.
+    """
+    with open(filepath, 'rb') as f:
+        if f.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC:
+            raise IdealConfigurationException('{filepath} is not an iDEAL recording.'.format(filepath=filepath))
+
+        while True:
+            header = f.read(RECORDING_HEADER.size)
+            if len(header) < RECORDING_HEADER.size:
+                return
+
+            status_code, duration, request_size, headers_size, content_size = RECORDING_HEADER.unpack(header)
+            data = f.read(request_size + headers_size + content_size)
+            if len(data) < request_size + headers_size + content_size:
+                return
+
+            headers = json.loads(data[request_size:request_size + headers_size].decode('utf-8'))
+            yield Recording(data[:request_size], status_code, headers, data[request_size + headers_size:], duration)
+
+
+class RecordingTransport(Transport):
+    """
+    Wraps another transport and appends every exchange, the exact signed request and response bytes, to a file. Use
+    a :class:`ReplayTransport` to play them back.
+    """
+    def __init__(self, transport, filepath, max_size=DEFAULT_MAX_SIZE):
+        """
+        :param transport: The :class:`Transport` that performs the actual exchange.
+        :param filepath: The recording file. Exchanges are appended if it already exists.
+        :param max_size: Maximum size in bytes of a response to read, or ``None`` for no limit. Use the
+                         ``max_response_size`` of the client (optional). Default\: 1 MiB.
+        """
+        super(RecordingTransport, self).__init__()
+        self.transport = transport
+        self.filepath = filepath
+        self.max_size = max_size
+
+        self._file = open(filepath, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(RECORDING_MAGIC)
+            self._file.flush()
+
+    @property
+    def limiter(self):
+        return self.transport.limiter
+
+    @limiter.setter
+    def limiter(self, limiter):
+        # Set by the base class and the client, but the pools are in the wrapped transport.
+        if getattr(self, 'transport', None) is not None:
+            self.transport.limiter = limiter
+
+    def send(self, request, priority, hedge=False):
+        start = time.time()
+        response = self.transport.send(request, priority, hedge)
+        duration = time.time() - start
+
+        body = request.body or b''
+        if isinstance(body, six.text_type):
+            body = body.encode('utf-8')
+        headers = json.dumps(dict(response.headers)).encode('utf-8')
+
+        # The response is read in full to record it, so it's limited like the client limits it.
+        chunks = []
+        size = 0
+        try:
+            for chunk in response.iter_content():
+                size += len(chunk)
+                if self.max_size is not None and size > self.max_size:
+                    raise IdealServerException('iDEAL response exceeds the maximum size of {max_size} bytes.'.format(
+                        max_size=self.max_size))
+                chunks.append(chunk)
+        finally:
+            response.close()
+        content = b''.join(chunks)
+
+        record = b''.join([
+            RECORDING_HEADER.pack(response.status_code, duration, len(body), len(headers), len(content)),
+            body, headers, content,
+        ])
+
+        # Write each record at once, so concurrent requests never interleave.
+        with self._lock:
+            self._file.write(record)
+            self._file.flush()
+
+        return TransportResponse(response.status_code, response.headers, content)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+        self.transport.close()
+
+
+class ReplayTransport(Transport):
+    """
+    Plays back the responses of a recording, in the recorded order and regardless of the request.
+    """
+    def __init__(self, filepath, timing=False, loop=False):
+        """
+        :param filepath: The recording file.
+        :param timing: ``True`` to wait the recorded duration before each response (optional). Default\: ``False``,
+                       respond as fast as possible.
+        :param loop: ``True`` to start over when all responses are played (optional). Default\: ``False``.
+        """
+        super(ReplayTransport, self).__init__()
+        self.recordings = list(read_recordings(filepath))
+        self.timing = timing
+        self.loop = loop
+
+        self._position = 0
+
+    def send(self, request, priority, hedge=False):
+        with self._lock:
+            if self._position >= len(self.recordings):
+                if not self.loop or not self.recordings:
+                    raise IdealServerException('The recording has no more responses.')
+                self._position = 0
+            recording = self.recordings[self._position]
+            self._position += 1
+
+        if self.timing:
+            time.sleep(recording.duration)
+
+        return recording.to_response()
@@ -1,21 +1,110 @@
 import os
 import re
+import string
 from io import open
 
+import six
+
 IDEAL_NAMESPACES = {
     'ideal': 'http://www.idealdesk.com/ideal/messages/mer-acq/3.3.1',
     'xmldsig': 'http://www.w3.org/2000/09/xmldsig#',
 }
 
+MESSAGE_TYPE_RE = re.compile(r'<([A-Za-z][\w.-]*)')
+MESSAGE_TYPE_BYTES_RE = re.compile(br'<([A-Za-z][\w.-]*)')
+
+# Loaded templates, by file name.
+_templates = {}
+
+
+class Template(object):
+    """
+    A template in ``str.format`` syntax, that is split into its literal parts once so it can be rendered directly to
+    bytes. Only the values are encoded, the literal parts are encoded when the template is loaded.
+    """
+    def __init__(self, source):
+        """
+        :param source: The template as string.
+        """
+        self.source = source
+        self.parts = []
+
+        for literal, field_name, format_spec, conversion in string.Formatter().parse(source):
+            if literal:
+                self.parts.append((literal.encode('utf-8'), None, None))
+            if field_name is not None:
+                self.parts.append((None, field_name, '{{0{conversion}{format_spec}}}'.format(
+                    conversion='!' + conversion if conversion else '',
+                    format_spec=':' + format_spec if format_spec else '',
+                ) if conversion or format_spec else None))
+
+    def render(self, ctx):
+        return self.source.format(**ctx)
+
+    def render_to_bytes(self, ctx):
+        chunks = []
+        for literal, field_name, field_format in self.parts:
+            if literal is not None:
+                chunks.append(literal)
+                continue
+
+            value = ctx[field_name]
+            if field_format is not None:
+                value = field_format.format(value)
+            if isinstance(value, six.text_type):
+                value = value.encode('utf-8')
+            elif not isinstance(value, bytes):
+                value = six.text_type(value).encode('utf-8')
+            chunks.append(value)
+
+        return b''.join(chunks)
+
+
+def get_template(template_file):
+    """
+    Return the template, which is loaded only once.
+
+    :param template_file: The file path, relative to the ``ideal`` package.
+
+    :return: A :class:`Template` object.
+    """
+    template = _templates.get(template_file)
+    if template is None:
+        with open(os.path.abspath(os.path.join(os.path.dirname(__file__), template_file)), 'r', encoding='utf-8') as f:
+            template = _templates[template_file] = Template(f.read())
+    return template
+
 
 def render_to_string(template_file, ctx):
-    f = open(os.path.abspath(os.path.join(os.path.dirname(__file__), template_file)), 'r')
-    data = f.read()
-    f.close()
+    return get_template(template_file).render(ctx)
+
+
+def render_to_bytes(template_file, ctx):
+    """
+    Render a template directly to UTF-8 encoded bytes.
+
+    :param template_file: The file path, relative to the ``ideal`` package.
+    :param ctx: Dictionary of values. Values that are bytes are inserted as is.
+
+    :return: The rendered template as bytes.
+    """
+    return get_template(template_file).render_to_bytes(ctx)
+
+
+def get_message_type(data):
+    """
+    Return the message type of an iDEAL message, which is the name of its root element.
+
+    :param data: The XML message as string or bytes.
 
-    data = data.format(**ctx)
+    :return: The message type, for example ``DirectoryReq``, or ``None`` if it could not be determined.
+    """
+    if isinstance(data, six.text_type):
+        match = MESSAGE_TYPE_RE.search(data)
+        return match.group(1) if match else None
 
-    return data
+    match = MESSAGE_TYPE_BYTES_RE.search(data)
+    return match.group(1).decode('ascii') if match else None
 
 
 def convert_camelcase(name):
@@ -44,11 +44,13 @@ classes = """
     Programming Language :: Python :: 3
     Programming Language :: Python :: 3.5
     Programming Language :: Python :: 3.6
+    Programming Language :: Python :: 3.7
     Programming Language :: Python :: Implementation :: CPython
     Framework :: Django
     Framework :: Django :: 1.8
     Framework :: Django :: 1.11
     Framework :: Django :: 2.0
+    Framework :: Django :: 3.1
     Operating System :: OS Independent
     Topic :: Communications
     Topic :: System :: Distributed Computing
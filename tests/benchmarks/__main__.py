@@ -0,0 +1,54 @@
+# -*- encoding: utf8 -*-
+"""
+Run the benchmarks and optionally compare them against a baseline::
+
+    $ python -m tests.benchmarks --compare tests/benchmarks/baseline.json
+    $ python -m tests.benchmarks --output results.json
+    $ python -m tests.benchmarks --recording ideal.rec --certificate ideal_v3.cer
+"""
+import argparse
+import os
+import sys
+
+from . import hotpaths  # noqa: Registers the benchmarks.
+from .runner import compare, load, run, save
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmarks', description='Benchmark the iDEAL hot paths.')
+    parser.add_argument('names', nargs='*', help='Only run these benchmarks.')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, help='Compare against this baseline file.')
+    parser.add_argument('--tolerance', type=float, default=2.0,
+                        help='Maximum allowed slowdown compared to the baseline (default: 2.0).')
+    parser.add_argument('--rounds', type=int, default=5, help='Number of rounds per benchmark (default: 5).')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Minimum duration of a round (default: 0.2).')
+    parser.add_argument('--recording', help='Also benchmark the responses in this recording.')
+    parser.add_argument('--certificate', action='append', dest='certificates',
+                        help='Acquirer certificate to verify the recorded responses with.')
+    args = parser.parse_args(argv)
+
+    if args.recording:
+        from .replay import register
+        register(args.recording, args.certificates or [])
+
+    results = run(args.names, rounds=args.rounds, min_time=args.min_time)
+
+    if args.output:
+        save(results, args.output)
+
+    if args.compare:
+        regressions = compare(results, load(args.compare), args.tolerance)
+        for name, ratio in regressions:
+            sys.stderr.write('REGRESSION: {name} is {ratio:.2f}x slower than the baseline.\n'.format(
+                name=name, ratio=ratio))
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
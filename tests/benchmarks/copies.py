@@ -0,0 +1,92 @@
+# -*- encoding: utf8 -*-
+"""
+Counts the copies and text/bytes conversions of message payloads per client call::
+
+    $ python -m tests.benchmarks.copies
+
+Calls to ``encode``, ``decode`` and the string methods that return a modified copy are counted when they are called
+on a payload, which is any string or bytes object of at least ``MIN_SIZE`` characters. The counts are deterministic,
+so they are checked against ``MAX_COPIES``.
+"""
+import sys
+from collections import OrderedDict
+from decimal import Decimal
+
+from .hotpaths import _client
+
+# Smaller objects, like digests and fingerprints, are not payloads.
+MIN_SIZE = 256
+
+COPYING_METHODS = frozenset(['encode', 'decode', 'format', 'rsplit', 'split', 'replace', 'rstrip', 'strip', 'join'])
+
+# The remaining copy is the base64 signature value of the response, which lxml returns as string. Before the
+# request and response pipeline worked on bytes, each call made 12 copies.
+MAX_COPIES = {
+    'IdealClient.get_issuers': 1,
+    'IdealClient.start_transaction': 1,
+    'IdealClient.get_transaction_status': 1,
+}
+
+
+def count_copies(func):
+    """
+    Call ``func`` and count the payload copies made.
+
+    :param func: The function to call, without arguments.
+
+    :return: Dictionary with the number of copies per method name.
+    """
+    counts = {}
+
+    def profile(frame, event, arg):
+        if event != 'c_call':
+            return
+        name = getattr(arg, '__name__', None)
+        if name not in COPYING_METHODS:
+            return
+        receiver = getattr(arg, '__self__', None)
+        if isinstance(receiver, (bytes, type(u''))) and len(receiver) >= MIN_SIZE:
+            counts[name] = counts.get(name, 0) + 1
+
+    # Warm up caches, so only the per-request work is counted.
+    func()
+
+    sys.setprofile(profile)
+    try:
+        func()
+    finally:
+        sys.setprofile(None)
+
+    return counts
+
+
+def run():
+    client = _client()
+
+    results = OrderedDict()
+    results['IdealClient.get_issuers'] = count_copies(client.get_issuers)
+    results['IdealClient.start_transaction'] = count_copies(lambda: client.start_transaction(
+        issuer_id='INGBNL2A', purchase_id='my-purchase-id', amount=Decimal('10.00'), description='test transaction'))
+    results['IdealClient.get_transaction_status'] = count_copies(lambda: client.get_transaction_status('0123456789'))
+
+    return results
+
+
+def main():
+    failed = False
+
+    for name, counts in run().items():
+        total = sum(counts.values())
+        details = ', '.join('{method}={count}'.format(method=k, count=v) for k, v in sorted(counts.items()))
+        sys.stderr.write('{name:<40} copies={total:<4} {details}\n'.format(name=name, total=total, details=details))
+
+        if total > MAX_COPIES[name]:
+            sys.stderr.write('REGRESSION: {name} makes {total} payload copies, the maximum is {maximum}.\n'.format(
+                name=name, total=total, maximum=MAX_COPIES[name]))
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# -*- encoding: utf8 -*-
+"""
+Benchmarks of the hot paths: signing, verification, rendering, parsing and full client calls.
+"""
+from decimal import Decimal
+from io import BytesIO
+
+from lxml import etree
+
+from ideal.client import DirectoryResponse, HttpResponse, IdealClient, StatusResponse, TransactionResponse
+from ideal.parsers import parse_xml
+from ideal.security import Security
+from ideal.testing import AcquirerSimulator
+from ideal.transports import WSGITransport
+from ideal.utils import render_to_string
+
+from .runner import benchmark
+from .stub import (CERT_FILE, PRIVATE_KEY_FILE, PRIVATE_KEY_PASSWORD, RESPONSE_FILES, StubAcquirer, configure_settings,
+                   sign_response)
+
+STATUS_REQUEST_CONTEXT = {
+    'timestamp': '2013-08-03T11:48:11.000Z',
+    'merchant_id': '001234567',
+    'sub_id': '0',
+    'transaction_id': '0123456789',
+}
+
+TRANSACTION_REQUEST_CONTEXT = dict(STATUS_REQUEST_CONTEXT, **{
+    'issuer_id': 'INGBNL2A',
+    'merchant_return_url': 'http://www.example.com/ideal/callback/',
+    'purchase_id': 'my-purchase-id',
+    'amount': '10.00',
+    'currency': 'EUR',
+    'expiration_period': 'PT15M',
+    'language': 'nl',
+    'description': 'test transaction',
+    'entrance_code': '65a69b128ab53f20f45038de22dc9d418362b01d',
+})
+
+
+def _client():
+    configure_settings()
+    return StubAcquirer().install(IdealClient(metrics=False))
+
+
+@benchmark('security.sign_message')
+def bench_sign_message():
+    security = Security()
+    message = render_to_string('templates/transaction_status_request.xml', STATUS_REQUEST_CONTEXT)
+
+    return lambda: security.sign_message(message, CERT_FILE, PRIVATE_KEY_FILE, PRIVATE_KEY_PASSWORD)
+
+
+@benchmark('security.verify')
+def bench_verify():
+    security = Security()
+    content = sign_response(RESPONSE_FILES['AcquirerStatusReq'])
+
+    return lambda: security.verify(content, [CERT_FILE])
+
+
+@benchmark('utils.render_to_string')
+def bench_render_to_string():
+    return lambda: render_to_string('templates/transaction_request.xml', TRANSACTION_REQUEST_CONTEXT)
+
+
+@benchmark('parsers.parse_xml')
+def bench_parse_xml():
+    content = sign_response(RESPONSE_FILES['AcquirerStatusReq'])
+
+    return lambda: parse_xml(content)
+
+
+def _bench_parse(response_class, message_type):
+    response = HttpResponse(None, {}, sign_response(RESPONSE_FILES[message_type]), 200, None)
+    response.xml = etree.parse(BytesIO(response.content))
+    ideal_response = response_class(response)
+
+    return lambda: ideal_response._parse(response.xml)
+
+
+@benchmark('DirectoryResponse._parse')
+def bench_parse_directory():
+    return _bench_parse(DirectoryResponse, 'DirectoryReq')
+
+
+@benchmark('TransactionResponse._parse')
+def bench_parse_transaction():
+    return _bench_parse(TransactionResponse, 'AcquirerTrxReq')
+
+
+@benchmark('StatusResponse._parse')
+def bench_parse_status():
+    return _bench_parse(StatusResponse, 'AcquirerStatusReq')
+
+
+@benchmark('IdealClient.get_issuers')
+def bench_get_issuers():
+    client = _client()
+    return client.get_issuers
+
+
+@benchmark('IdealClient.start_transaction')
+def bench_start_transaction():
+    client = _client()
+    return lambda: client.start_transaction(
+        issuer_id='INGBNL2A', purchase_id='my-purchase-id', amount=Decimal('10.00'), description='test transaction')
+
+
+@benchmark('IdealClient.get_transaction_status')
+def bench_get_transaction_status():
+    client = _client()
+    return lambda: client.get_transaction_status('0123456789')
+
+
+@benchmark('IdealClient.start_transaction[simulator]')
+def bench_start_transaction_simulator():
+    """
+    The full stack, including the simulated acquirer, through the in-process WSGI transport.
+    """
+    configure_settings()
+    simulator = AcquirerSimulator(PRIVATE_KEY_FILE, PRIVATE_KEY_PASSWORD, CERT_FILE, [CERT_FILE])
+    client = IdealClient(metrics=False, transport=WSGITransport(simulator))
+    return lambda: client.start_transaction(
+        issuer_id='INGBNL2A', purchase_id='my-purchase-id', amount=Decimal('10.00'), description='test transaction')
@@ -0,0 +1,183 @@
+# -*- encoding: utf8 -*-
+"""
+Allocation and memory regression suite for the client hot paths, based on ``tracemalloc``::
+
+    $ python -m tests.benchmarks.memory
+
+Each measurement has a threshold in bytes; the command exits with a non-zero status if any threshold is exceeded.
+
+NOTE: ``tracemalloc`` only sees memory allocated by Python. Memory allocated by libxml2 for the parsed XML trees is
+not included, but all copies of the content and the parsed values are.
+"""
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+from collections import OrderedDict
+from decimal import Decimal
+
+from ideal.client import DirectoryResponse
+
+from .hotpaths import _client
+from .stub import CERT_FILE, PRIVATE_KEY_FILE, PRIVATE_KEY_PASSWORD, StubAcquirer, StubResponse
+
+CALLS = 200
+# Internal caches, like those of the ``re`` module, take a while to fill up. This memory is not a leak.
+WARMUP_CALLS = 200
+
+# Thresholds in bytes. ``peak`` is the highest allocation during a single call, ``retained`` the memory that is still
+# allocated per call after the result is discarded (a leak), ``size`` the memory held by a live response object.
+THRESHOLDS = {
+    'IdealClient.get_issuers': {'peak': 32 * 1024, 'retained': 128},
+    'IdealClient.start_transaction': {'peak': 32 * 1024, 'retained': 128},
+    'IdealClient.get_transaction_status': {'peak': 32 * 1024, 'retained': 128},
+    'DirectoryResponse[500 issuers]': {'peak': 256 * 1024, 'size': 128 * 1024},
+}
+
+
+def generate_directory_response(issuer_count, country_count=5):
+    """
+    Return a signed directory response with ``issuer_count`` issuers, spread over ``country_count`` countries.
+    """
+    from ideal.security import Security
+
+    countries = []
+    for c in range(country_count):
+        issuers = ''.join(
+            '<Issuer><issuerID>BANK{i:04d}XX</issuerID><issuerName>Issuer Simulation {i} - Bank</issuerName></Issuer>'
+            .format(i=i)
+            for i in range(c, issuer_count, country_count)
+        )
+        countries.append('<Country><countryNames>Country {c}</countryNames>{issuers}</Country>'.format(
+            c=c, issuers=issuers))
+
+    unsigned = (
+        '<DirectoryRes xmlns="http://www.idealdesk.com/ideal/messages/mer-acq/3.3.1" version="3.3.1">'
+        '<createDateTimestamp>2013-08-12T16:02:50.301Z</createDateTimestamp>'
+        '<Acquirer><acquirerID>0050</acquirerID></Acquirer>'
+        '<Directory><directoryDateTimestamp>2013-08-12T16:02:50.300Z</directoryDateTimestamp>{countries}</Directory>'
+        '</DirectoryRes>'
+    ).format(countries=''.join(countries))
+
+    signed = Security().sign_message(unsigned, CERT_FILE, PRIVATE_KEY_FILE, PRIVATE_KEY_PASSWORD)
+    return ('<?xml version="1.0" encoding="UTF-8"?>' + signed).encode('utf-8')
+
+
+def measure_call(func, calls=CALLS):
+    """
+    Measure the peak allocation of a single call to ``func``, and the memory retained per call over ``calls`` calls.
+    """
+    # Warm up all caches, so they are not counted as retained memory.
+    for i in range(WARMUP_CALLS):
+        func()
+    gc.collect()
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        func()
+        after, peak = tracemalloc.get_traced_memory()
+        peak -= before
+
+        for i in range(calls):
+            func()
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'peak': peak,
+        'retained': max(current - before, 0) // (calls + 1),
+    }
+
+
+def measure_size(factory):
+    """
+    Measure the peak allocation while creating an object with ``factory``, and the memory held while it is alive.
+    """
+    factory()
+    gc.collect()
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        obj = factory()
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    del obj
+
+    return {
+        'peak': peak - before,
+        'size': current - before,
+    }
+
+
+def run():
+    client = _client()
+
+    results = OrderedDict()
+    results['IdealClient.get_issuers'] = measure_call(client.get_issuers)
+    results['IdealClient.start_transaction'] = measure_call(lambda: client.start_transaction(
+        issuer_id='INGBNL2A', purchase_id='my-purchase-id', amount=Decimal('10.00'), description='test transaction'))
+    results['IdealClient.get_transaction_status'] = measure_call(lambda: client.get_transaction_status('0123456789'))
+
+    content = generate_directory_response(500)
+    stub = StubAcquirer()
+    stub.responses['DirectoryReq'] = content
+    stub.install(client)
+    request = client.create_request('<DirectoryReq/>')
+
+    def directory_factory():
+        raw_response = StubResponse(content)
+        return DirectoryResponse(
+            client.create_response(raw_response.headers, raw_response.content, raw_response.status_code, request))
+
+    results['DirectoryResponse[500 issuers]'] = measure_size(directory_factory)
+
+    return results
+
+
+def check(results, thresholds=THRESHOLDS):
+    """
+    :return: List of ``(name, metric, value, threshold)`` tuples of all exceeded thresholds.
+    """
+    failures = []
+    for name, result in results.items():
+        for metric, threshold in sorted(thresholds.get(name, {}).items()):
+            if result[metric] > threshold:
+                failures.append((name, metric, result[metric], threshold))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmarks.memory',
+                                     description='Measure memory allocation of the iDEAL hot paths.')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    args = parser.parse_args(argv)
+
+    results = run()
+
+    for name, result in results.items():
+        sys.stderr.write('{name:<40} {metrics}\n'.format(
+            name=name, metrics=', '.join('{k}={v}'.format(k=k, v=v) for k, v in sorted(result.items()))))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+
+    failures = check(results)
+    for name, metric, value, threshold in failures:
+        sys.stderr.write('REGRESSION: {name} {metric} is {value} bytes, the threshold is {threshold} bytes.\n'.format(
+            name=name, metric=metric, value=value, threshold=threshold))
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+# -*- encoding: utf8 -*-
+"""
+Benchmarks of response handling on recorded, real-world messages. Record them with
+:class:`ideal.transports.RecordingTransport` and run::
+
+    $ python -m tests.benchmarks --recording ideal.rec --certificate ideal_v3.cer
+"""
+from ideal.client import HttpRequest, IdealClient
+from ideal.security import Security
+from ideal.transports import read_recordings
+from ideal.utils import get_message_type
+
+from .runner import benchmark
+from .stub import configure_settings
+
+
+def register(filepath, certificates):
+    """
+    Register a verification and a response handling benchmark for the first recorded exchange of each message type.
+
+    :param filepath: The recording file.
+    :param certificates: The acquirer certificates to verify the recorded responses with.
+    """
+    recordings = {}
+    for recording in read_recordings(filepath):
+        message_type = get_message_type(recording.request.decode('utf-8'))
+        if message_type is not None and recording.status_code == 200:
+            recordings.setdefault(message_type, recording)
+
+    for message_type, recording in sorted(recordings.items()):
+        _register(message_type, recording, certificates)
+
+
+def _register(message_type, recording, certificates):
+    @benchmark('replay.verify[{message_type}]'.format(message_type=message_type))
+    def bench_verify():
+        security = Security()
+        return lambda: security.verify(recording.content, certificates)
+
+    @benchmark('replay.create_response[{message_type}]'.format(message_type=message_type))
+    def bench_create_response():
+        settings = configure_settings()
+        settings.CERTIFICATES = certificates
+
+        client = IdealClient(metrics=False)
+        request = HttpRequest(settings.get_acquirer_url(), 'POST', recording.request)
+
+        return lambda: client.create_response(recording.headers, recording.content, recording.status_code, request)
@@ -0,0 +1,128 @@
+# -*- encoding: utf8 -*-
+import json
+import platform
+import sys
+import timeit
+from collections import OrderedDict
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    """
+    Register a benchmark. The decorated function is called once to set up, and returns the function to time.
+
+    :param name: Unique name of the benchmark.
+    """
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+def calibrate():
+    """
+    A fixed, pure Python workload to measure the speed of the machine with, in the same process as the benchmarks.
+    """
+    values = [str(i) for i in range(1000)]
+    return sorted(values, key=len), dict.fromkeys(values)
+
+
+def measure(func, rounds=5, min_time=0.2):
+    """
+    Time ``func`` in several rounds, each running long enough for a stable measurement.
+
+    :param func: The function to time, without arguments.
+    :param rounds: The number of rounds (optional). Default\: 5.
+    :param min_time: The minimum duration of a round in seconds (optional). Default\: 0.2.
+
+    :return: Dictionary with the ``min`` and ``median`` time per call in seconds, and the ``number`` of calls per
+             round.
+    """
+    timer = timeit.Timer(func)
+
+    # Determine the number of calls per round, which also warms up caches.
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 1000000:
+            break
+        number *= 2 if elapsed * 4 > min_time else 10
+
+    timings = sorted(t / number for t in timer.repeat(repeat=rounds, number=number))
+
+    return {
+        'min': timings[0],
+        'median': timings[len(timings) // 2],
+        'number': number,
+    }
+
+
+def run(names=None, rounds=5, min_time=0.2, stream=sys.stderr):
+    """
+    Run the registered benchmarks.
+
+    :param names: The names of the benchmarks to run (optional). Default\: all.
+    :param rounds: The number of rounds per benchmark (optional). Default\: 5.
+    :param min_time: The minimum duration of a round in seconds (optional). Default\: 0.2.
+    :param stream: Stream to report progress to (optional). Default\: ``sys.stderr``.
+
+    :return: Machine-readable results as dictionary.
+    """
+    results = OrderedDict()
+    calibration = measure(calibrate, rounds=rounds, min_time=min_time)
+
+    for name, setup in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+
+        results[name] = measure(setup(), rounds=rounds, min_time=min_time)
+
+        stream.write('{name:<40} {median:>12.1f} us\n'.format(name=name, median=results[name]['median'] * 1e6))
+
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'calibration': calibration,
+        'benchmarks': results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare ``results`` against a ``baseline``. The fastest round of each benchmark is compared, relative to the
+    calibration workload of the same run, so the comparison does not depend on the speed of the machine.
+
+    :param results: The results of :func:`run`.
+    :param baseline: Earlier results of :func:`run`.
+    :param tolerance: The maximum allowed ratio between the current and baseline time.
+
+    :return: List of ``(name, ratio)`` tuples of all benchmarks that regressed.
+    """
+    scale = 1.0
+    if results.get('calibration') and baseline.get('calibration'):
+        scale = baseline['calibration']['min'] / results['calibration']['min']
+
+    regressions = []
+
+    for name, result in results['benchmarks'].items():
+        base = baseline['benchmarks'].get(name)
+        if not base:
+            continue
+
+        ratio = result['min'] * scale / base['min']
+        if ratio > tolerance:
+            regressions.append((name, ratio))
+
+    return regressions
+
+
+def load(filepath):
+    with open(filepath) as f:
+        return json.load(f)
+
+
+def save(results, filepath):
+    with open(filepath, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
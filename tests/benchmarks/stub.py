@@ -0,0 +1,93 @@
+# -*- encoding: utf8 -*-
+import os
+import re
+from io import open
+
+from ideal.security import Security
+from ideal.transports import Transport, TransportResponse
+
+BASE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'unit'))
+CERTS_PATH = os.path.join(BASE_PATH, 'mock_certs')
+RESPONSES_PATH = os.path.join(BASE_PATH, 'mock_responses')
+
+CERT_FILE = os.path.join(CERTS_PATH, 'cert.cer')
+PRIVATE_KEY_FILE = os.path.join(CERTS_PATH, 'priv.pem')
+PRIVATE_KEY_PASSWORD = 'example'
+
+RESPONSE_FILES = {
+    'DirectoryReq': 'ideal_directory_response.xml',
+    'AcquirerTrxReq': 'ideal_transaction_response.xml',
+    'AcquirerStatusReq': 'ideal_transaction_status_response.xml',
+}
+
+
+def configure_settings():
+    """
+    Configure the global settings to use the mock certificates. Responses are signed with the same key, so the
+    client verifies them for real.
+    """
+    from ideal.conf import settings
+
+    settings.DEBUG = True
+    settings.MERCHANT_ID = '001234567'
+    settings.PRIVATE_KEY_PASSWORD = PRIVATE_KEY_PASSWORD
+    settings.ACQUIRER = 'ING'
+    settings.MERCHANT_RETURN_URL = 'http://www.example.com/ideal/callback/'
+    settings.PRIVATE_KEY_FILE = PRIVATE_KEY_FILE
+    settings.PRIVATE_CERTIFICATE = CERT_FILE
+    settings.CERTIFICATES = [CERT_FILE]
+
+    return settings
+
+
+def sign_response(filename):
+    """
+    Return the content of a mock response, signed with the mock private key.
+
+    :param filename: The file name in ``tests/unit/mock_responses``.
+
+    :return: The signed response as bytes.
+    """
+    with open(os.path.join(RESPONSES_PATH, filename), encoding='utf-8') as f:
+        content = f.read()
+
+    # Remove the existing (invalid) signature and XML declaration.
+    unsigned = re.sub(r'<\?.*?\?>|<Signature.*</Signature>', '', content, flags=re.DOTALL).rstrip('\n')
+
+    signed = Security().sign_message(unsigned, CERT_FILE, PRIVATE_KEY_FILE, PRIVATE_KEY_PASSWORD)
+
+    return ('<?xml version="1.0" encoding="UTF-8"?>' + signed).encode('utf-8')
+
+
+class StubResponse(TransportResponse):
+    def __init__(self, content, status_code=200):
+        super(StubResponse, self).__init__(
+            status_code, {'Content-Type': 'text/xml; charset=UTF-8', 'Server': 'Stub Acquirer'}, content)
+
+
+class StubAcquirer(Transport):
+    """
+    In-process stand-in for the acquirer's HTTP endpoint. It acts as the client's transport and answers each request
+    with a validly signed response, so rendering, signing, parsing and verification all run for real.
+    """
+    def __init__(self):
+        super(StubAcquirer, self).__init__()
+        self.responses = dict(
+            (message_type, sign_response(filename)) for message_type, filename in RESPONSE_FILES.items())
+
+    def send(self, request, priority, hedge=False):
+        for message_type, content in self.responses.items():
+            if message_type.encode('utf-8') in request.body:
+                return StubResponse(content)
+        return StubResponse(b'Unknown message', status_code=400)
+
+    def install(self, client):
+        """
+        Make ``client`` send all requests to this stub.
+
+        :param client: The :class:`ideal.client.IdealClient` object.
+
+        :return: The client.
+        """
+        client.transport = self
+        return client
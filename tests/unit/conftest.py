@@ -0,0 +1,4 @@
+import sys
+
+# The asyncio tests use syntax of Python 3.6.
+collect_ignore = ['test_aio.py'] if sys.version_info < (3, 7) else []
@@ -0,0 +1,178 @@
+# -*- encoding: utf8 -*-
+import asyncio
+import os
+from decimal import Decimal
+
+import mock
+from unittest2 import TestCase
+
+from ideal.aio import AsyncIdealClient, AsyncPriorityLimiter, ThreadedTransport, async_clients, get_async_client
+from ideal.concurrency import RequestPriority
+from ideal.hedging import HedgePolicy
+from ideal.tracing import SpanHook, Tracer
+
+from .helpers import MockTransport
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class AsyncClientTests(TestCase):
+
+    def setUp(self):
+        from ideal.conf import settings
+
+        base_filepath = os.path.abspath(os.path.join(os.path.dirname(__file__), 'mock_certs'))
+
+        settings.MERCHANT_ID = '001234567'
+        settings.PRIVATE_KEY_PASSWORD = 'example'
+        settings.ACQUIRER = 'ING'
+        settings.MERCHANT_RETURN_URL = 'http://www.example.com/ideal/callback/'
+        settings.PRIVATE_KEY_FILE = os.path.join(base_filepath, 'priv.pem')
+        settings.PRIVATE_CERTIFICATE = os.path.join(base_filepath, 'cert.cer')
+        settings.CERTIFICATES = [os.path.join(base_filepath, 'cert.cer')]
+
+        # The mock responses are incorrectly signed, verification is tested in the security test suite.
+        patcher = mock.patch('ideal.security.Security.verify', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client = AsyncIdealClient(transport=ThreadedTransport(MockTransport()), metrics=False)
+
+    def test_requests(self):
+        async def requests():
+            return await asyncio.gather(
+                self.client.get_issuers(),
+                self.client.start_transaction('INGBNL2A', 'test', Decimal('1.0'), 'test transaction'),
+                self.client.get_transaction_status('0123456789'),
+            )
+
+        issuers, transaction, status = run(requests())
+
+        self.assertDictEqual(issuers.get_issuer_list(), {
+            'INGBNL2A': 'Issuer Simulation V3 - ING',
+            'RABONL2U': 'Issuer Simulation V3 - RABO',
+        })
+        self.assertEqual(transaction.transaction_id, '0123456789')
+        self.assertEqual(len(transaction.entrance_code), 40)
+        self.assertEqual(status.amount, Decimal('100.00'))
+
+    def test_warmup(self):
+        response = run(self.client.warmup())
+
+        self.assertEqual(response.acquirer_id, '0050')
+
+    def test_tracing(self):
+        """
+        Test concurrent requests on one event loop each keep their own active span.
+        """
+        spans = []
+
+        class Hook(SpanHook):
+            def on_end(self, span):
+                spans.append(span)
+
+        client = AsyncIdealClient(
+            transport=ThreadedTransport(MockTransport()), metrics=False, tracer=Tracer(hooks=[Hook()]))
+
+        async def requests():
+            await asyncio.gather(client.get_issuers(), client.get_transaction_status('0123456789'))
+
+        run(requests())
+
+        http_spans = [span for span in spans if span.name == 'ideal.http']
+        self.assertEqual(len(http_spans), 2)
+        self.assertSetEqual(
+            set(span.attributes['message_type'] for span in http_spans), {'DirectoryReq', 'AcquirerStatusReq'})
+        for span in http_spans:
+            self.assertEqual(span.parent.name, 'ideal.request')
+
+    def test_hedging(self):
+        policy = HedgePolicy(min_samples=1, min_delay=0, max_hedge_ratio=0.5, burst=1)
+        policy.record('AcquirerStatusReq', 0.01)
+        policy.allow_hedge = mock.Mock(return_value=True)
+        client = AsyncIdealClient(transport=ThreadedTransport(MockTransport()), metrics=False, hedge_policy=policy)
+
+        cancelled = []
+
+        async def send(request, priority, hedge=False, log_payload=False):
+            if hedge:
+                return 'hedged'
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        with mock.patch.object(client, '_send', side_effect=send):
+            response = run(client._request('<AcquirerStatusReq></AcquirerStatusReq>', idempotent=True))
+
+        self.assertEqual(response, 'hedged')
+        self.assertListEqual(cancelled, [True])
+
+    def test_get_async_client(self):
+        async_clients.clear()
+        self.addCleanup(async_clients.clear)
+
+        transport = ThreadedTransport(MockTransport())
+        client = get_async_client(transport=transport, metrics=False)
+        self.assertIsInstance(client, AsyncIdealClient)
+        self.assertIs(get_async_client(transport=transport, metrics=False), client)
+        self.assertIsNot(get_async_client(transport=transport, metrics=False, max_concurrency=2), client)
+
+        response = run(client.get_issuers())
+        self.assertEqual(response.acquirer_id, '0050')
+
+
+class AsyncPriorityLimiterTests(TestCase):
+
+    def test_interactive_goes_first(self):
+        limiter = AsyncPriorityLimiter(2, interactive_reserve=1)
+        acquired = []
+
+        async def acquire(priority):
+            await limiter.acquire(priority)
+            acquired.append(priority)
+
+        async def scenario():
+            await limiter.acquire(RequestPriority.INTERACTIVE)
+            await limiter.acquire(RequestPriority.INTERACTIVE)
+
+            background = asyncio.ensure_future(acquire(RequestPriority.BACKGROUND))
+            interactive = asyncio.ensure_future(acquire(RequestPriority.INTERACTIVE))
+            await asyncio.sleep(0)
+            self.assertListEqual(acquired, [])
+
+            limiter.release()
+            await interactive
+            self.assertListEqual(acquired, [RequestPriority.INTERACTIVE])
+
+            # The background request only gets a slot below the interactive reserve.
+            limiter.release()
+            await asyncio.sleep(0)
+            self.assertListEqual(acquired, [RequestPriority.INTERACTIVE])
+
+            limiter.release()
+            await background
+            self.assertListEqual(acquired, [RequestPriority.INTERACTIVE, RequestPriority.BACKGROUND])
+
+        run(scenario())
+
+    def test_cancelled(self):
+        limiter = AsyncPriorityLimiter(1)
+
+        async def scenario():
+            async with limiter.slot(RequestPriority.INTERACTIVE):
+                waiter = asyncio.ensure_future(limiter.acquire(RequestPriority.INTERACTIVE))
+                await asyncio.sleep(0)
+                waiter.cancel()
+                await asyncio.sleep(0)
+
+            self.assertEqual(limiter.in_use, 0)
+
+        run(scenario())
@@ -105,6 +105,79 @@ class ClientTests(TestCase):
             response.status_date_timestamp, datetime.datetime(2013, 8, 7, 11, 50, 28, 348000, dateutil.tz.tzutc()))
         self.assertEqual(response.transaction_id, '0123456789')
 
+    def test_settings(self):
+        """
+        Test clients with their own settings, that serve different merchants.
+        """
+        from ideal.conf import settings
+
+        transport = mock.Mock(wraps=MockIdealClient().transport, limiter=None)
+        clients = [
+            MockIdealClient(settings=settings.snapshot(MERCHANT_ID=merchant_id), transport=transport)
+            for merchant_id in ['001234567', '007654321']
+        ]
+        settings.MERCHANT_ID = '000000000'
+
+        for client in clients:
+            client.get_issuers()
+
+        bodies = [call[0][0].body for call in transport.send.call_args_list]
+        self.assertIn(b'<merchantID>001234567</merchantID>', bodies[0])
+        self.assertIn(b'<merchantID>007654321</merchantID>', bodies[1])
+
+    def test_shared_transport(self):
+        """
+        Test clients without their own transport or limiter share the connections.
+        """
+        from ideal.client import IdealClient
+
+        self.assertIs(IdealClient().transport, IdealClient().transport)
+        self.assertIsNot(IdealClient(max_concurrency=2).transport, IdealClient().transport)
+
+    def test_get_client(self):
+        """
+        Test the shared clients, that are validated once per configuration.
+        """
+        from ideal.client import ClientRegistry
+        from ideal.conf import settings
+
+        registry = ClientRegistry(max_size=2)
+
+        with mock.patch('ideal.conf.Settings.validate') as mock_validate:
+            client = registry.get(transport=self.ideal_client.transport)
+            self.assertIs(registry.get(transport=self.ideal_client.transport), client)
+            self.assertEqual(mock_validate.call_count, 1)
+
+        self.assertEqual(client.settings.MERCHANT_ID, '001234567')
+        self.assertEqual(client.get_issuers().acquirer_id, '0050')
+
+        settings.MERCHANT_ID = '007654321'
+        other_client = registry.get(transport=self.ideal_client.transport)
+        self.assertIsNot(other_client, client)
+        self.assertEqual(other_client.settings.MERCHANT_ID, '007654321')
+
+        # Only the most recent clients are kept.
+        registry.get(settings.snapshot(SUB_ID='1'), transport=self.ideal_client.transport)
+        settings.MERCHANT_ID = '001234567'
+        self.assertIsNot(registry.get(transport=self.ideal_client.transport), client)
+
+    def test_warmup(self):
+        """
+        Test IdealClient.warmup() loads the key material and the issuers.
+        """
+        from ideal.security import KeyStore
+
+        self.ideal_client.security.key_store = KeyStore()
+        with mock.patch.object(self.ideal_client.transport, 'send', wraps=self.ideal_client.transport.send) as send:
+            response = self.ideal_client.warmup()
+
+        self.assertEqual(response.acquirer_id, '0050')
+        self.assertEqual(send.call_args[0][1], 'interactive')
+        # The key, and the certificate and fingerprint of the merchant certificate, which is also the acquirer's here.
+        self.assertEqual(len(self.ideal_client.security.key_store._entries), 3)
+
+        self.assertIsNone(self.ideal_client.warmup(issuers=False))
+
     def test_error(self):
         """
         Test errornous responses from acquirer.
@@ -0,0 +1,75 @@
+# -*- encoding: utf8 -*-
+import threading
+import time
+
+from unittest2 import TestCase
+
+from ideal.concurrency import PriorityLimiter, RequestPriority
+from ideal.exceptions import IdealConfigurationException
+
+
+class PriorityLimiterTests(TestCase):
+
+    def _acquire_in_thread(self, limiter, priority, acquired):
+        def target():
+            limiter.acquire(priority)
+            acquired.append(priority)
+
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def test_invalid_configuration(self):
+        self.assertRaises(IdealConfigurationException, PriorityLimiter, 0)
+        self.assertRaises(IdealConfigurationException, PriorityLimiter, 2, 2)
+        self.assertRaises(IdealConfigurationException, PriorityLimiter, 2, -1)
+
+    def test_capacity(self):
+        limiter = PriorityLimiter(4, interactive_reserve=1)
+
+        self.assertEqual(limiter.capacity(RequestPriority.INTERACTIVE), 4)
+        self.assertEqual(limiter.capacity(RequestPriority.BACKGROUND), 3)
+
+    def test_background_uses_spare_capacity_only(self):
+        """
+        Test background requests block on the reserved slot, while interactive requests can still use it.
+        """
+        limiter = PriorityLimiter(2, interactive_reserve=1)
+        limiter.acquire(RequestPriority.BACKGROUND)
+
+        acquired = []
+        background = self._acquire_in_thread(limiter, RequestPriority.BACKGROUND, acquired)
+        background.join(0.1)
+        self.assertListEqual(acquired, [])
+
+        interactive = self._acquire_in_thread(limiter, RequestPriority.INTERACTIVE, acquired)
+        interactive.join(1)
+        self.assertListEqual(acquired, [RequestPriority.INTERACTIVE])
+        self.assertEqual(limiter.in_use, 2)
+
+        limiter.release()
+        limiter.release()
+        background.join(1)
+        self.assertListEqual(acquired, [RequestPriority.INTERACTIVE, RequestPriority.BACKGROUND])
+
+    def test_interactive_goes_first(self):
+        """
+        Test waiting interactive requests are served before waiting background requests.
+        """
+        limiter = PriorityLimiter(1)
+        limiter.acquire(RequestPriority.INTERACTIVE)
+
+        acquired = []
+        background = self._acquire_in_thread(limiter, RequestPriority.BACKGROUND, acquired)
+        time.sleep(0.05)
+        interactive = self._acquire_in_thread(limiter, RequestPriority.INTERACTIVE, acquired)
+        time.sleep(0.05)
+
+        limiter.release()
+        interactive.join(1)
+        self.assertListEqual(acquired, [RequestPriority.INTERACTIVE])
+
+        limiter.release()
+        background.join(1)
+        self.assertListEqual(acquired, [RequestPriority.INTERACTIVE, RequestPriority.BACKGROUND])
@@ -219,3 +219,30 @@ class ConfTests(TestCase):
         settings.CERTIFICATES = [self.cert_filepath]
 
         settings.validate()
+
+    def test_snapshot(self):
+        """
+        Test a snapshot is an immutable copy of the settings.
+        """
+        settings = Settings()
+        settings.MERCHANT_ID = '001234567'
+        settings.CERTIFICATES = [self.cert_filepath]
+
+        snapshot = settings.snapshot(SUB_ID='1')
+
+        self.assertEqual(snapshot.options(), settings.options())
+        self.assertEqual(snapshot.MERCHANT_ID, '001234567')
+        self.assertEqual(snapshot.SUB_ID, '1')
+        self.assertEqual(snapshot.CERTIFICATES, (self.cert_filepath, ))
+
+        settings.MERCHANT_ID = '007654321'
+        self.assertEqual(snapshot.MERCHANT_ID, '001234567')
+
+        self.assertRaises(AttributeError, setattr, snapshot, 'MERCHANT_ID', '007654321')
+        self.assertRaises(AttributeError, snapshot.load, self._create_config_file(merchant_id='007654321'))
+
+        self.assertEqual(snapshot.snapshot(), snapshot)
+        self.assertNotEqual(snapshot.snapshot(SUB_ID='2'), snapshot)
+
+        self.assertRaisesRegexp(IdealConfigurationException, 'Unknown setting MERCHANTID\.', settings.snapshot,
+                                MERCHANTID='001234567')
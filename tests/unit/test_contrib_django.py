@@ -1,22 +1,47 @@
 # -*- encoding: utf8 -*-
 from __future__ import unicode_literals
 
+import datetime
+import json
 import os
+import shutil
+import sys
+import tempfile
+from decimal import Decimal
+from functools import partial
 
+import django
 import mock
+import requests
+from django import forms
 from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Template
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django_webtest import WebTest
+from six import StringIO
+from unittest2 import skipIf
 
-from ideal.contrib.django.ideal_compat.models import Issuer
+from ideal.client import TransactionStatus
+from ideal.contrib.django.ideal_compat.forms import IssuerChoiceField
+from ideal.contrib.django.ideal_compat.issuers import get_issuers, invalidate_issuers
+from ideal.contrib.django.ideal_compat.models import Issuer, Transaction
 from ideal.contrib.django.ideal_compat.utils import reverse
+from ideal.exceptions import IdealException
 
-from .helpers import MockIdealClient
+from .helpers import MockIdealClient, MockTransport
+
+if django.VERSION >= (3, 1) and sys.version_info >= (3, 7):
+    # Imported before the synchronous client is mocked, which the asynchronous client extends.
+    from ideal.aio import AsyncIdealClient, ThreadedTransport, async_clients
 
 
 @override_settings(DEBUG=True)
 class ContribDjangoTestCase(WebTest):
     def setUp(self):
+        from ideal.client import clients
         from ideal.conf import settings
 
         base_filepath = os.path.abspath(os.path.join(os.path.dirname(__file__), 'mock_certs'))
@@ -36,6 +61,11 @@ class ContribDjangoTestCase(WebTest):
         self.ideal_client_patcher = mock.patch('ideal.client.IdealClient')
         mock_ideal_client = self.ideal_client_patcher.start()
         mock_ideal_client.side_effect = MockIdealClient
+        clients.clear()
+        self.addCleanup(clients.clear)
+
+        # The cached issuers outlive the database of each test.
+        invalidate_issuers()
 
         # Mock out the verification of responses as they are incorrectly signed. This part is tested in the security
         # test suite.
@@ -93,6 +123,34 @@ class ContribDjangoTestCase(WebTest):
             # '65a69b128ab53f20f45038de22dc9d418362b01d'
         ])
 
+    @skipIf(django.VERSION < (3, 1) or sys.version_info < (3, 7),
+            'Asynchronous views require Django 3.1 and Python 3.7 or later.')
+    def test_async_views(self):
+        async_clients.clear()
+        self.addCleanup(async_clients.clear)
+        patcher = mock.patch.object(
+            async_clients, 'client_class', partial(AsyncIdealClient, transport=ThreadedTransport(MockTransport())))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        response = self.app.get(reverse('ideal_tests_async_get_issuers'))
+        response = response.form.submit()
+        issuers = [opt.attrib['value'] for opt in response.pyquery('#issuer-id-list option')]
+        self.assertSetEqual(set(issuers), {'INGBNL2A', 'RABONL2U'})
+
+        form = self.app.get(reverse('ideal_tests_async_start_transaction')).form
+        form['issuer_id'] = 'INGBNL2A'
+        form['purchase_id'] = 'my-purchase-id'
+        form['amount'] = '10.00'
+        form['description'] = 'test transaction'
+        response = form.submit()
+        self.assertEqual([el.text for el in response.pyquery('#response td')][1], '0123456789')
+
+        form = self.app.get(reverse('ideal_tests_async_get_transaction_status')).form
+        form['transaction_id'] = '0123456789'
+        response = form.submit()
+        self.assertEqual([el.text for el in response.pyquery('#response td')][2], 'Success')
+
     def test_get_transaction_status(self):
         response = self.app.get(reverse('ideal_tests_get_transaction_status'))
         self.assertEqual(response.status_code, 200)
@@ -136,9 +194,235 @@ class ContribDjangoTestCase(WebTest):
 
         self.assertListEqual(issuer_codes, ['INGBNL2A', 'RABONL2U'])
 
+    def test_sync_issuers_changes(self):
+        Issuer.objects.create(code='INGBNL2A', name='ING', country='Nederland', is_active=True)
+        Issuer.objects.create(code='RABONL2U', name='Issuer Simulation V3 - RABO', country='Nederland', is_active=True)
+        Issuer.objects.create(code='ABNANL2A', name='ABN AMRO', country='Nederland', is_active=True)
+        Issuer.objects.create(code='ASNBNL21', name='ASN', country='Nederland', is_active=False)
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('sync_issuers', stdout=StringIO())
+
+        # One query to load the issuers and one to update them, or one per changed issuer on Django < 2.2.
+        expected = 2 if hasattr(Issuer.objects, 'bulk_update') else 1 + 2
+        self.assertEqual(
+            len([query for query in queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]), expected)
+        self.assertEqual(
+            list(Issuer.objects.order_by('code').values_list('code', 'name', 'is_active')), [
+                ('ABNANL2A', 'ABN AMRO', False),
+                ('ASNBNL21', 'ASN', False),
+                ('INGBNL2A', 'Issuer Simulation V3 - ING', True),
+                ('RABONL2U', 'Issuer Simulation V3 - RABO', True),
+            ])
+
+    def test_sync_issuers_unchanged(self):
+        call_command('sync_issuers', stdout=StringIO())
+
+        stdout = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('sync_issuers', stdout=stdout)
+
+        self.assertEqual([query['sql'] for query in queries if query['sql'].startswith(('INSERT', 'UPDATE'))], [])
+        self.assertEqual(stdout.getvalue(), 'Issuers: 0 created, 0 updated, 2 unchanged, 0 deactivated\n')
+
     def test_sync_issuers_dry_run(self):
         self.assertEqual(Issuer.objects.count(), 0)
 
         call_command('sync_issuers', dry_run=True)
 
         self.assertEqual(Issuer.objects.count(), 0)
+
+    def test_issuer_cache(self):
+        call_command('sync_issuers', stdout=StringIO())
+        Issuer.objects.create(code='ABNANL2A', name='ABN AMRO', country='Nederland', is_active=False)
+
+        expected = [
+            ('Nederland', [('INGBNL2A', 'Issuer Simulation V3 - ING'), ('RABONL2U', 'Issuer Simulation V3 - RABO')]),
+        ]
+        self.assertEqual(get_issuers(), expected)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_issuers(), expected)
+
+        # A sync with changes shows them right away.
+        Issuer.objects.filter(code='INGBNL2A').update(name='ING')
+        self.assertEqual(get_issuers(), expected)
+        call_command('sync_issuers', stdout=StringIO())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_issuers(), expected)
+
+        Issuer.objects.filter(code='ABNANL2A').update(is_active=True)
+        self.assertEqual(get_issuers(), expected)
+        Issuer.objects.get(code='RABONL2U').delete()
+        self.assertEqual(get_issuers(), [
+            ('Nederland', [('ABNANL2A', 'ABN AMRO'), ('INGBNL2A', 'Issuer Simulation V3 - ING')]),
+        ])
+
+    def test_issuer_choice_field(self):
+        call_command('sync_issuers', stdout=StringIO())
+
+        class CheckoutForm(forms.Form):
+            issuer_id = IssuerChoiceField()
+
+        form = CheckoutForm({'issuer_id': 'RABONL2U'})
+        self.assertTrue(form.is_valid())
+        self.assertFalse(CheckoutForm({'issuer_id': 'ABNANL2A'}).is_valid())
+
+        with self.assertNumQueries(0):
+            html = str(CheckoutForm()['issuer_id'])
+        self.assertIn('<optgroup label="Nederland">', html)
+        self.assertInHTML('<option value="" selected>Choose your bank</option>', html)
+
+    def test_issuer_template_tags(self):
+        call_command('sync_issuers', stdout=StringIO())
+
+        html = Template(
+            '{% load ideal_tags %}'
+            '{% ideal_issuer_select "issuer" "INGBNL2A" id="bank" %}'
+            '{% ideal_issuers as issuers %}{% for country, country_issuers in issuers %}{{ country }}{% endfor %}'
+        ).render(Context())
+
+        # The order of the attributes, and how ``selected`` is rendered, depends on the Django version.
+        start_tag = html[:html.index('>') + 1]
+        self.assertTrue(start_tag.startswith('<select '))
+        for attribute in ('name="issuer"', 'class="ideal-issuer-select"', 'id="bank"'):
+            self.assertIn(attribute, start_tag)
+        self.assertInHTML('<option value="INGBNL2A" selected>Issuer Simulation V3 - ING</option>', html)
+        self.assertTrue(html.endswith('</select>Nederland'))
+
+    def test_issuers_json(self):
+        call_command('sync_issuers', stdout=StringIO())
+        url = reverse('ideal_issuers')
+
+        response = self.app.get(url)
+
+        self.assertEqual(response.content_type, 'application/json')
+        self.assertEqual(response.json, {'countries': [{'name': 'Nederland', 'issuers': [
+            {'code': 'INGBNL2A', 'name': 'Issuer Simulation V3 - ING'},
+            {'code': 'RABONL2U', 'name': 'Issuer Simulation V3 - RABO'},
+        ]}]})
+        self.assertEqual(response.headers['Cache-Control'], 'public, max-age=300')
+        etag = response.headers['ETag']
+        last_modified = response.headers['Last-Modified']
+
+        with self.assertNumQueries(0):
+            response = self.app.get(url, headers={'If-None-Match': etag}, status=304)
+        self.assertEqual(response.body, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+
+        self.app.get(url, headers={'If-None-Match': '"other", W/{etag}'.format(etag=etag)}, status=304)
+        self.app.get(url, headers={'If-Modified-Since': last_modified}, status=304)
+        self.app.get(url, headers={'If-Modified-Since': 'Mon, 01 Jan 2018 00:00:00 GMT'}, status=200)
+
+        # A sync that restores the same issuers keeps the ETag, other changes give a new one.
+        Issuer.objects.filter(code='INGBNL2A').update(name='ING')
+        call_command('sync_issuers', stdout=StringIO())
+        self.app.get(url, headers={'If-None-Match': etag}, status=304)
+
+        Issuer.objects.create(code='ABNANL2A', name='ABN AMRO', country='Nederland', is_active=True)
+        response = self.app.get(url, headers={'If-None-Match': etag}, status=200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_export_issuers(self):
+        call_command('sync_issuers', stdout=StringIO())
+
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        output_dir = os.path.join(static_root, 'ideal')
+
+        with override_settings(STATIC_ROOT=static_root):
+            call_command('export_issuers', js=True, stdout=StringIO())
+
+            with open(os.path.join(output_dir, 'issuers.manifest.json')) as f:
+                manifest = json.load(f)
+            self.assertEqual(sorted(manifest['files']), ['js', 'json'])
+            with open(os.path.join(output_dir, manifest['files']['json'])) as f:
+                self.assertEqual(json.load(f)['countries'][0]['name'], 'Nederland')
+            with open(os.path.join(output_dir, manifest['files']['js'])) as f:
+                self.assertTrue(f.read().startswith('export default {"countries":'))
+
+            # Nothing is written if the issuers did not change.
+            stdout = StringIO()
+            call_command('export_issuers', js=True, stdout=stdout)
+            self.assertEqual(stdout.getvalue(), 'Issuers unchanged ({hash}).\n'.format(hash=manifest['hash']))
+
+            Issuer.objects.create(code='ABNANL2A', name='ABN AMRO', country='Nederland', is_active=True)
+            call_command('export_issuers', stdout=StringIO())
+
+            with open(os.path.join(output_dir, 'issuers.manifest.json')) as f:
+                new_manifest = json.load(f)
+            self.assertNotEqual(new_manifest['hash'], manifest['hash'])
+            self.assertEqual(len(os.listdir(output_dir)), 4)
+
+    def test_poll_transactions(self):
+        now = timezone.now()
+        due = Transaction.objects.create(
+            transaction_id='0123456789', entrance_code='ec', purchase_id='order-1', amount=Decimal('100.00'))
+        later = Transaction.objects.create(
+            transaction_id='0123456790', entrance_code='ec', purchase_id='order-2', amount=Decimal('10.00'),
+            next_poll_at=now + datetime.timedelta(hours=1))
+
+        stdout = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('poll_transactions', stdout=stdout)
+
+        self.assertEqual(stdout.getvalue(), 'Transactions: 1 polled, 1 final, 0 open, 0 failed\n')
+        # Claiming, marking the claim and writing the results back.
+        self.assertEqual(len([q for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']]), 3)
+
+        due.refresh_from_db()
+        self.assertEqual(due.status, TransactionStatus.SUCCESS)
+        self.assertEqual(due.poll_count, 1)
+        self.assertIsNone(due.next_poll_at)
+        self.assertEqual(due.status_date.year, 2013)
+
+        later.refresh_from_db()
+        self.assertEqual(later.status, TransactionStatus.OPEN)
+        self.assertEqual(later.poll_count, 0)
+
+    def test_poll_transactions_failed(self):
+        ideal_transaction = Transaction.objects.create(
+            transaction_id='0123456789', entrance_code='ec', purchase_id='order-1', amount=Decimal('100.00'))
+
+        with mock.patch.object(MockIdealClient, 'get_transaction_status', side_effect=IdealException('boom')):
+            stdout = StringIO()
+            call_command('poll_transactions', interval=60, stdout=stdout)
+
+        self.assertEqual(stdout.getvalue(), 'Transactions: 1 polled, 0 final, 0 open, 1 failed\n')
+
+        ideal_transaction.refresh_from_db()
+        self.assertEqual(ideal_transaction.status, TransactionStatus.OPEN)
+        self.assertEqual(ideal_transaction.poll_count, 1)
+        self.assertGreater(ideal_transaction.next_poll_at, timezone.now() + datetime.timedelta(seconds=50))
+
+        # The transaction is not due yet.
+        stdout = StringIO()
+        call_command('poll_transactions', stdout=stdout)
+        self.assertEqual(stdout.getvalue(), 'Transactions: 0 polled, 0 final, 0 open, 0 failed\n')
+
+    def test_poll_transactions_transport_error(self):
+        for i in range(3):
+            Transaction.objects.create(
+                transaction_id='012345679{0}'.format(i), entrance_code='ec', purchase_id='order-{0}'.format(i),
+                amount=Decimal('10.00'))
+
+        send = MockTransport.send
+
+        def flaky_send(transport, request, *args, **kwargs):
+            if b'0123456791' in request.body:
+                raise requests.ConnectionError('Connection reset by peer')
+            return send(transport, request, *args, **kwargs)
+
+        with mock.patch.object(MockTransport, 'send', flaky_send):
+            stdout = StringIO()
+            call_command('poll_transactions', concurrency=1, stdout=stdout)
+
+        self.assertEqual(stdout.getvalue(), 'Transactions: 3 polled, 2 final, 0 open, 1 failed\n')
+
+        failed = Transaction.objects.get(transaction_id='0123456791')
+        self.assertEqual(failed.status, TransactionStatus.OPEN)
+        self.assertEqual(failed.poll_count, 1)
+        self.assertGreater(failed.next_poll_at, timezone.now() + datetime.timedelta(seconds=50))
+
+        self.assertEqual(Transaction.objects.filter(status=TransactionStatus.SUCCESS, poll_count=1).count(), 2)
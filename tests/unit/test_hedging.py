@@ -0,0 +1,174 @@
+# -*- encoding: utf8 -*-
+import os
+import threading
+import time
+
+import mock
+from unittest2 import TestCase
+
+from ideal.client import IdealClient
+from ideal.exceptions import IdealConfigurationException, IdealServerException
+from ideal.hedging import HedgePolicy, LatencyWindow
+
+
+class LatencyWindowTests(TestCase):
+
+    def test_percentile(self):
+        window = LatencyWindow(size=100)
+        self.assertIsNone(window.percentile(50))
+
+        for i in range(1, 101):
+            window.add(i / 100.0)
+
+        self.assertEqual(window.percentile(50), 0.5)
+        self.assertEqual(window.percentile(99), 0.99)
+        self.assertEqual(window.percentile(100), 1.0)
+
+    def test_size(self):
+        window = LatencyWindow(size=10)
+        for i in range(20):
+            window.add(i)
+
+        self.assertEqual(len(window), 10)
+        self.assertEqual(window.percentile(1), 10)
+        self.assertEqual(window.percentile(100), 19)
+
+        for i in range(5):
+            window.add(0)
+
+        self.assertEqual(window.percentile(50), 0)
+        self.assertEqual(window.percentile(60), 15)
+
+
+class HedgePolicyTests(TestCase):
+
+    def test_invalid_configuration(self):
+        self.assertRaises(IdealConfigurationException, HedgePolicy, percentile=100)
+        self.assertRaises(IdealConfigurationException, HedgePolicy, max_hedge_ratio=1)
+
+    def test_min_samples(self):
+        policy = HedgePolicy(min_samples=2, min_delay=0)
+
+        policy.record('DirectoryReq', 0.1)
+        self.assertIsNone(policy.get_delay('DirectoryReq'))
+
+        policy.record('DirectoryReq', 0.2)
+        self.assertEqual(policy.get_delay('DirectoryReq'), 0.2)
+        self.assertIsNone(policy.get_delay('AcquirerStatusReq'))
+
+    def test_hedge_budget(self):
+        """
+        Test the number of hedges never exceeds the maximum hedge ratio.
+        """
+        policy = HedgePolicy(max_hedge_ratio=0.1)
+
+        hedges = 0
+        for i in range(100):
+            policy.get_delay('AcquirerStatusReq')
+            if policy.allow_hedge():
+                hedges += 1
+
+        self.assertLessEqual(hedges, 10)
+        self.assertGreaterEqual(hedges, 9)
+
+
+class HedgedClientTests(TestCase):
+
+    def setUp(self):
+        from ideal.conf import settings
+
+        base_filepath = os.path.abspath(os.path.join(os.path.dirname(__file__), 'mock_certs'))
+
+        settings.MERCHANT_ID = '001234567'
+        settings.PRIVATE_KEY_PASSWORD = 'example'
+        settings.ACQUIRER = 'ING'
+        settings.MERCHANT_RETURN_URL = 'http://www.example.com/ideal/callback/'
+        settings.PRIVATE_KEY_FILE = os.path.join(base_filepath, 'priv.pem')
+        settings.PRIVATE_CERTIFICATE = os.path.join(base_filepath, 'cert.cer')
+        settings.CERTIFICATES = [os.path.join(base_filepath, 'cert.cer')]
+
+        self.policy = HedgePolicy(min_samples=1, min_delay=0, max_hedge_ratio=0.5, burst=1)
+        self.policy.record('AcquirerStatusReq', 0.01)
+        self.client = IdealClient(hedge_policy=self.policy)
+
+        self.attempts = []
+        self.lock = threading.Lock()
+
+    def _patch_send(self, *outcomes):
+        """
+        Replace the HTTP exchange with attempts that take the given ``(delay, result)`` outcomes, in order.
+        """
+        def send(request, priority, hedge=False, log_payload=False):
+            with self.lock:
+                delay, result = outcomes[len(self.attempts)]
+                self.attempts.append(hedge)
+            time.sleep(delay)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        return mock.patch.object(self.client, '_send', side_effect=send)
+
+    def test_fast_response_is_not_hedged(self):
+        self.policy.record('AcquirerStatusReq', 1)
+        with self._patch_send((0, 'first')):
+            response = self.client._request('<AcquirerStatusReq></AcquirerStatusReq>', idempotent=True)
+
+        self.assertEqual(response, 'first')
+        self.assertEqual(len(self.attempts), 1)
+
+    def test_sent_inline_without_hedge(self):
+        """
+        Test no thread is started if no hedge can be sent: without enough observations or hedge credits.
+        """
+        policy = HedgePolicy()
+        policy.record('AcquirerStatusReq', 0.01)
+        self.client.hedge_policy = policy
+
+        with self._patch_send((0, 'first'), (0, 'second')):
+            with mock.patch('ideal.client.threading.Thread') as thread:
+                self.assertEqual(self.client._request('<AcquirerStatusReq></AcquirerStatusReq>', idempotent=True),
+                                 'first')
+
+                self.policy.allow_hedge = mock.Mock(return_value=False)
+                self.client.hedge_policy = self.policy
+                self.assertEqual(self.client._request('<AcquirerStatusReq></AcquirerStatusReq>', idempotent=True),
+                                 'second')
+
+        self.assertFalse(thread.called)
+        self.assertListEqual(self.attempts, [False, False])
+
+    def test_slow_response_is_hedged(self):
+        self.policy.allow_hedge = mock.Mock(return_value=True)
+        with self._patch_send((0.5, 'slow'), (0, 'hedged')):
+            response = self.client._request('<AcquirerStatusReq></AcquirerStatusReq>', idempotent=True)
+
+        self.assertEqual(response, 'hedged')
+        self.assertListEqual(self.attempts, [False, True])
+
+        # The hedge is timed from the start of the request, which includes the hedge delay of 0.01s.
+        window = self.policy._get_window('AcquirerStatusReq')
+        self.assertEqual(len(window), 2)
+        self.assertGreaterEqual(window.percentile(1), 0.01)
+
+    def test_failed_hedge_waits_for_first_attempt(self):
+        self.policy.allow_hedge = mock.Mock(return_value=True)
+        with self._patch_send((0.2, 'slow'), (0, IdealServerException('boom'))):
+            response = self.client._request('<AcquirerStatusReq></AcquirerStatusReq>', idempotent=True)
+
+        self.assertEqual(response, 'slow')
+
+    def test_hedge_budget_exhausted(self):
+        self.policy.allow_hedge = mock.Mock(return_value=False)
+        with self._patch_send((0.1, 'slow'), (0, 'hedged')):
+            response = self.client._request('<AcquirerStatusReq></AcquirerStatusReq>', idempotent=True)
+
+        self.assertEqual(response, 'slow')
+        self.assertEqual(len(self.attempts), 1)
+
+    def test_not_idempotent(self):
+        with self._patch_send((0.1, 'slow'), (0, 'hedged')):
+            response = self.client._request('<AcquirerTrxReq></AcquirerTrxReq>')
+
+        self.assertEqual(response, 'slow')
+        self.assertEqual(len(self.attempts), 1)
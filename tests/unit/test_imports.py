@@ -0,0 +1,64 @@
+import subprocess
+import sys
+
+from unittest2 import TestCase, skipIf
+
+# Dependencies that should only be imported when they are used.
+HEAVY_MODULES = ('requests', 'urllib3', 'OpenSSL', 'cryptography', 'dateutil', 'lxml', 'django')
+
+
+def get_imports(statement):
+    """
+    Return the modules imported by ``statement`` in a fresh interpreter, with the cumulative import time in
+    microseconds, as reported by ``python -X importtime``.
+    """
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', statement], stderr=subprocess.STDOUT, universal_newlines=True)
+
+    imports = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        imports[name.strip()] = int(cumulative)
+    return imports
+
+
+@skipIf(sys.version_info < (3, 7), 'Requires python -X importtime.')
+class ImportTests(TestCase):
+
+    def assertLight(self, statement):
+        imports = get_imports(statement)
+        heavy = sorted(name for name in imports if name.split('.')[0] in HEAVY_MODULES)
+
+        self.assertEqual(heavy, [], '"{statement}" imports {modules}.'.format(
+            statement=statement, modules=', '.join(heavy)))
+
+    def test_import_ideal(self):
+        self.assertLight('import ideal')
+
+    def test_import_conf(self):
+        self.assertLight('import ideal.conf')
+
+    def test_import_client(self):
+        self.assertLight('import ideal.client')
+
+    def test_lazy_names(self):
+        self.assertLight('import ideal; ideal.settings; ideal.TransactionStatus.SUCCESS')
+
+        imports = get_imports('import ideal; ideal.IdealClient')
+        self.assertIn('ideal.client', imports)
+
+
+class LazyNamesTests(TestCase):
+
+    def test_python_36(self):
+        """
+        Test the public names are imported right away on Python versions without module ``__getattr__``.
+        """
+        output = subprocess.check_output([sys.executable, '-c', (
+            'import sys; sys.version_info = (3, 6, 0); import ideal; '
+            'print(",".join(sorted(name for name in ideal._LAZY_NAMES if name in vars(ideal))))')],
+            universal_newlines=True)
+
+        self.assertEqual(output.strip(), 'IdealClient,RequestPriority,Settings,TransactionStatus,get_client,settings')
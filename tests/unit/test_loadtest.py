@@ -0,0 +1,90 @@
+import os
+
+from unittest2 import TestCase
+
+from ideal.client import IdealClient
+from ideal.exceptions import IdealConfigurationException
+from ideal.loadtest import QUANTILES, LoadTest, format_report, parse_mix
+from ideal.metrics import MetricsRegistry
+from ideal.testing import AcquirerServer, AcquirerSimulator
+
+
+class ParseMixTests(TestCase):
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('issuers=1,status=2.5'), [('issuers', 1.0), ('status', 2.5)])
+        self.assertEqual(parse_mix('transaction'), [('transaction', 1.0)])
+
+    def test_invalid_mix(self):
+        self.assertRaises(IdealConfigurationException, parse_mix, 'refund=1')
+        self.assertRaises(IdealConfigurationException, parse_mix, 'issuers=many')
+        self.assertRaises(IdealConfigurationException, parse_mix, 'issuers=0')
+
+
+class LoadTestTests(TestCase):
+
+    def setUp(self):
+        from ideal.conf import settings
+
+        base_filepath = os.path.abspath(os.path.join(os.path.dirname(__file__), 'mock_certs'))
+
+        settings.MERCHANT_ID = '001234567'
+        settings.PRIVATE_KEY_PASSWORD = 'example'
+        settings.ACQUIRER = 'ING'
+        settings.MERCHANT_RETURN_URL = 'http://www.example.com/ideal/callback/'
+        settings.PRIVATE_KEY_FILE = os.path.join(base_filepath, 'priv.pem')
+        settings.PRIVATE_CERTIFICATE = os.path.join(base_filepath, 'cert.cer')
+        settings.CERTIFICATES = [os.path.join(base_filepath, 'cert.cer')]
+
+        self.simulator = AcquirerSimulator(
+            settings.PRIVATE_KEY_FILE, settings.PRIVATE_KEY_PASSWORD, settings.PRIVATE_CERTIFICATE,
+            settings.CERTIFICATES, seed=0)
+        self.server = AcquirerServer(self.simulator).start()
+        self.addCleanup(self.server.stop)
+
+        settings.ACQUIRER_URL = self.server.url
+        self.addCleanup(setattr, settings, 'ACQUIRER_URL', None)
+
+        self.client = IdealClient(metrics=MetricsRegistry(quantiles=QUANTILES))
+
+    def test_run(self):
+        report = LoadTest(self.client, concurrency=2, duration=0.5, seed=0).run()
+
+        self.assertGreater(report['requests'], 0)
+        self.assertGreater(report['throughput'], 0)
+
+        message_types = dict((result['message_type'], result) for result in report['message_types'])
+        self.assertEqual(set(message_types), {'DirectoryReq', 'AcquirerTrxReq', 'AcquirerStatusReq'})
+        for result in message_types.values():
+            self.assertEqual(result['errors'], {})
+            self.assertLessEqual(result['latency'][0.5], result['latency'][0.99])
+
+        self.assertIn('AcquirerStatusReq', format_report(report))
+
+    def test_rate(self):
+        report = LoadTest(self.client, [('issuers', 1)], concurrency=2, rate=20, duration=0.5).run()
+
+        # Requests are started every 50 milliseconds.
+        self.assertLessEqual(report['requests'], 10)
+
+    def test_rate_behind_schedule(self):
+        """
+        Test the latency includes the time requests waited for a worker, once the workers fall behind the schedule.
+        """
+        self.simulator.latency = 0.1
+        report = LoadTest(self.client, [('issuers', 1)], concurrency=1, rate=20, duration=0.5).run()
+
+        # The 10th request is scheduled at 0.45s, but is only sent after 0.9s.
+        self.assertEqual(report['requests'], 10)
+        self.assertGreater(report['message_types'][0]['latency'][0.99], 0.4)
+
+    def test_errors(self):
+        self.simulator.error_rate = 1
+
+        report = LoadTest(self.client, [('issuers', 1)], concurrency=1, duration=0.2).run()
+
+        self.assertEqual(report['message_types'][0]['errors'], {'SO1000': report['requests']})
+        self.assertIn('SO1000', format_report(report))
+
+    def test_requires_metrics(self):
+        self.assertRaises(IdealConfigurationException, LoadTest, IdealClient(metrics=False))
@@ -0,0 +1,103 @@
+# -*- encoding: utf8 -*-
+import logging
+import os
+
+import mock
+from unittest2 import TestCase
+
+from ideal.client import IdealClient
+from ideal.log import LazyBody, LazyHeaders, LogSampler
+from ideal.transports import TransportResponse
+
+
+class LazyFormattingTests(TestCase):
+
+    def test_headers(self):
+        self.assertEqual(str(LazyHeaders({'Server': 'Mock'})), 'Server: Mock')
+
+    def test_body_redacted(self):
+        body = (b'<Transaction><consumerName>Hr E G H K\xc3\xbcppers</consumerName>'
+                b'<consumerIBAN>NL53INGB0654422370</consumerIBAN><amount>100.00</amount></Transaction>')
+
+        self.assertEqual(
+            str(LazyBody(body)),
+            '<Transaction><consumerName>***</consumerName><consumerIBAN>***</consumerIBAN>'
+            '<amount>100.00</amount></Transaction>')
+
+        self.assertIn('NL53INGB0654422370', str(LazyBody(body, redact=False)))
+
+    def test_body_truncated(self):
+        self.assertEqual(str(LazyBody('<DirectoryReq/>', max_size=5)), '<Dire... (10 characters truncated)')
+        self.assertEqual(str(LazyBody(None)), '')
+
+    def test_sampler(self):
+        self.assertTrue(LogSampler(1).sample())
+        self.assertFalse(LogSampler(0).sample())
+
+
+class ClientLoggingTests(TestCase):
+
+    def setUp(self):
+        from ideal.conf import settings
+
+        base_filepath = os.path.abspath(os.path.join(os.path.dirname(__file__), 'mock_certs'))
+
+        settings.MERCHANT_ID = '001234567'
+        settings.PRIVATE_KEY_PASSWORD = 'example'
+        settings.ACQUIRER = 'ING'
+        settings.MERCHANT_RETURN_URL = 'http://www.example.com/ideal/callback/'
+        settings.PRIVATE_KEY_FILE = os.path.join(base_filepath, 'priv.pem')
+        settings.PRIVATE_CERTIFICATE = os.path.join(base_filepath, 'cert.cer')
+        settings.CERTIFICATES = [os.path.join(base_filepath, 'cert.cer')]
+
+        self.patcher = mock.patch('ideal.security.Security.verify')
+        self.patcher.start().return_value = True
+
+        self.logger = logging.getLogger('ideal.client')
+        self.level = self.logger.level
+
+        filepath = os.path.join(os.path.dirname(__file__), 'mock_responses', 'ideal_directory_response.xml')
+        with open(filepath, 'rb') as f:
+            raw_response = TransportResponse(200, {'Server': 'Mock'}, f.read())
+
+        self.transport = mock.Mock(limiter=None)
+        self.transport.send.return_value = raw_response
+
+    def _request(self, **kwargs):
+        client = IdealClient(transport=self.transport, **kwargs)
+        return client._request('<DirectoryReq></DirectoryReq>')
+
+    def tearDown(self):
+        self.logger.setLevel(self.level)
+        self.patcher.stop()
+
+    def test_no_formatting_without_debug(self):
+        """
+        Test no payload is formatted when DEBUG logging is disabled.
+        """
+        self.logger.setLevel(logging.INFO)
+
+        with mock.patch('ideal.log.LazyBody.__str__') as body_str, \
+                mock.patch('ideal.log.LazyHeaders.__str__') as headers_str:
+            self._request()
+
+        self.assertFalse(body_str.called)
+        self.assertFalse(headers_str.called)
+
+    def test_debug(self):
+        self.logger.setLevel(logging.DEBUG)
+
+        with self.assertLogs('ideal.client', logging.DEBUG) as logs:
+            self._request(log_body_max_size=20)
+
+        self.assertListEqual([record.levelname for record in logs.records], ['DEBUG', 'DEBUG', 'DEBUG'])
+        self.assertIn('characters truncated', logs.output[1])
+        self.assertIn('Server: Mock', logs.output[2])
+
+    def test_debug_not_sampled(self):
+        self.logger.setLevel(logging.DEBUG)
+
+        with self.assertLogs('ideal.client', logging.DEBUG) as logs:
+            self._request(log_sample_rate=0)
+
+        self.assertListEqual([record.levelname for record in logs.records], ['INFO'])
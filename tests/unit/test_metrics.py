@@ -0,0 +1,116 @@
+# -*- encoding: utf8 -*-
+import os
+
+import mock
+from unittest2 import TestCase
+
+from ideal.exceptions import IdealResponseException
+from ideal.metrics import Histogram, MetricsRegistry
+
+from .helpers import MockIdealClient
+
+
+class HistogramTests(TestCase):
+
+    def test_empty(self):
+        self.assertIsNone(Histogram().quantile(0.5))
+
+    def test_quantiles(self):
+        histogram = Histogram()
+        for i in range(1, 1001):
+            histogram.record(i / 1000.0)
+
+        self.assertEqual(histogram.count, 1000)
+        self.assertEqual(histogram.min, 0.001)
+        self.assertEqual(histogram.max, 1.0)
+        self.assertAlmostEqual(histogram.sum, 500.5)
+
+        # Buckets have a relative precision of about 6%.
+        for quantile in (0.5, 0.9, 0.99):
+            self.assertAlmostEqual(histogram.quantile(quantile), quantile, delta=quantile * 0.07)
+
+        self.assertEqual(histogram.quantile(1), 1.0)
+
+    def test_bounded_memory(self):
+        histogram = Histogram()
+        for i in range(100000):
+            histogram.record(0.1 + i / 1000000.0)
+
+        # All values are within one power of two.
+        self.assertLessEqual(len(histogram.buckets), 17)
+
+
+class MetricsRegistryTests(TestCase):
+
+    def setUp(self):
+        from ideal.conf import settings
+
+        base_filepath = os.path.abspath(os.path.join(os.path.dirname(__file__), 'mock_certs'))
+
+        settings.MERCHANT_ID = '001234567'
+        settings.PRIVATE_KEY_PASSWORD = 'example'
+        settings.ACQUIRER = 'ING'
+        settings.MERCHANT_RETURN_URL = 'http://www.example.com/ideal/callback/'
+        settings.PRIVATE_KEY_FILE = os.path.join(base_filepath, 'priv.pem')
+        settings.PRIVATE_CERTIFICATE = os.path.join(base_filepath, 'cert.cer')
+        settings.CERTIFICATES = [os.path.join(base_filepath, 'cert.cer')]
+
+        self.patcher = mock.patch('ideal.security.Security.verify')
+        self.patcher.start().return_value = True
+
+        self.registry = MetricsRegistry()
+        self.ideal_client = MockIdealClient(metrics=self.registry)
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_requests(self):
+        self.ideal_client.get_issuers()
+        self.ideal_client.get_issuers()
+        self.ideal_client.get_transaction_status('0123456789')
+
+        snapshot = self.registry.snapshot()
+
+        self.assertListEqual(snapshot['requests'], [
+            {'acquirer': 'ING', 'message_type': 'AcquirerStatusReq', 'count': 1},
+            {'acquirer': 'ING', 'message_type': 'DirectoryReq', 'count': 2},
+        ])
+        self.assertListEqual(snapshot['errors'], [])
+
+        phases = [(item['message_type'], item['phase'], item['count']) for item in snapshot['latency']]
+        self.assertIn(('DirectoryReq', 'request', 2), phases)
+        self.assertIn(('DirectoryReq', 'sign', 2), phases)
+        self.assertIn(('AcquirerStatusReq', 'verify', 1), phases)
+
+    def test_errors(self):
+        with self.ideal_client.tracer.span('ideal.request', message_type='AcquirerStatusReq', acquirer='ING'):
+            self.assertRaises(IdealResponseException, self.ideal_client._request, '<oops></oops>')
+
+        with self.assertRaises(IdealResponseException):
+            with self.ideal_client.tracer.span('ideal.request', message_type='AcquirerStatusReq', acquirer='ING'):
+                self.ideal_client._request('<oops></oops>')
+
+        snapshot = self.registry.snapshot()
+
+        self.assertListEqual(snapshot['requests'], [
+            {'acquirer': 'ING', 'message_type': 'AcquirerStatusReq', 'count': 2},
+        ])
+        self.assertListEqual(snapshot['errors'], [
+            {'acquirer': 'ING', 'message_type': 'AcquirerStatusReq', 'error_code': 'IX1100', 'count': 1},
+        ])
+
+    def test_exposition(self):
+        self.ideal_client.get_issuers()
+
+        exposition = self.registry.exposition()
+
+        self.assertIn('ideal_requests_total{acquirer="ING",message_type="DirectoryReq"} 1\n', exposition)
+        self.assertIn('ideal_duration_seconds_count{acquirer="ING",message_type="DirectoryReq",phase="request"} 1\n',
+                      exposition)
+        self.assertIn(
+            'ideal_duration_seconds{acquirer="ING",message_type="DirectoryReq",phase="sign",quantile="0.99"}',
+            exposition)
+
+    def test_disabled(self):
+        ideal_client = MockIdealClient(metrics=False)
+        self.assertIsNone(ideal_client.metrics)
@@ -0,0 +1,51 @@
+import threading
+
+from lxml import etree
+from unittest2 import TestCase
+
+from ideal.exceptions import IdealServerException
+from ideal.parsers import get_parser, parse_xml
+
+
+class ParserTests(TestCase):
+
+    def test_parse(self):
+        tree = parse_xml(b'<?xml version="1.0" encoding="UTF-8"?><DirectoryRes><a>1</a></DirectoryRes>')
+
+        self.assertIsInstance(tree, etree._ElementTree)
+        self.assertEqual(tree.xpath('a')[0].text, '1')
+
+    def test_parser_per_thread(self):
+        parsers = []
+        thread = threading.Thread(target=lambda: parsers.append(get_parser()))
+        thread.start()
+        thread.join()
+
+        self.assertIs(get_parser(), get_parser())
+        self.assertIsNot(parsers[0], get_parser())
+
+    def test_entities_not_resolved(self):
+        tree = parse_xml(
+            b'<?xml version="1.0"?><!DOCTYPE a [<!ENTITY e SYSTEM "file:///etc/passwd">]><a>&e;</a>')
+
+        self.assertFalse(tree.getroot().text)
+
+    def test_entity_expansion(self):
+        # A "billion laughs" document.
+        entities = ''.join(
+            '<!ENTITY e{i} "{value}">'.format(i=i, value='&e{0};'.format(i - 1) * 10 if i else 'lol')
+            for i in range(10))
+        data = '<?xml version="1.0"?><!DOCTYPE a [{entities}]><a>&e9;</a>'.format(entities=entities).encode('utf-8')
+
+        try:
+            tree = parse_xml(data)
+        except etree.XMLSyntaxError:
+            pass
+        else:
+            self.assertLess(len(etree.tostring(tree)), 10000)
+
+    def test_max_size(self):
+        data = b'<a>' + b'x' * 100 + b'</a>'
+
+        self.assertRaises(IdealServerException, parse_xml, data, max_size=50)
+        self.assertEqual(parse_xml(data, max_size=None).getroot().text, 'x' * 100)
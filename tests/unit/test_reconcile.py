@@ -0,0 +1,223 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import mock
+import requests
+from unittest2 import TestCase
+
+from ideal.exceptions import IdealConfigurationException, IdealServerException
+from ideal.reconcile import Checkpoint, Reconciler, ResultWriter, main, read_transaction_ids, reconcile
+
+from .helpers import MockIdealClient
+
+
+class CheckpointTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_low_water_mark(self):
+        checkpoint = Checkpoint(os.path.join(self.directory, 'checkpoint'))
+
+        for index in (1, 3, 0, 4):
+            checkpoint.add(index)
+
+        self.assertEqual(checkpoint.low_water_mark, 2)
+        self.assertSetEqual(checkpoint.completed, {3, 4})
+        self.assertTrue(checkpoint.is_done(1))
+        self.assertFalse(checkpoint.is_done(2))
+        self.assertTrue(checkpoint.is_done(3))
+
+    def test_save_and_load(self):
+        path = os.path.join(self.directory, 'checkpoint')
+        self.assertEqual(Checkpoint.load(path).low_water_mark, 0)
+
+        Checkpoint(path, 10, [12, 15]).save(1024)
+
+        checkpoint = Checkpoint.load(path)
+        self.assertEqual(checkpoint.low_water_mark, 10)
+        self.assertSetEqual(checkpoint.completed, {12, 15})
+        self.assertEqual(checkpoint.output_size, 1024)
+
+
+class ReconcileTests(TestCase):
+
+    def setUp(self):
+        from ideal.conf import settings
+
+        base_filepath = os.path.abspath(os.path.join(os.path.dirname(__file__), 'mock_certs'))
+
+        settings.MERCHANT_ID = '001234567'
+        settings.PRIVATE_KEY_PASSWORD = 'example'
+        settings.ACQUIRER = 'ING'
+        settings.MERCHANT_RETURN_URL = 'http://www.example.com/ideal/callback/'
+        settings.PRIVATE_KEY_FILE = os.path.join(base_filepath, 'priv.pem')
+        settings.PRIVATE_CERTIFICATE = os.path.join(base_filepath, 'cert.cer')
+        settings.CERTIFICATES = [os.path.join(base_filepath, 'cert.cer')]
+
+        # The mock responses are incorrectly signed, verification is tested in the security test suite.
+        patcher = mock.patch('ideal.security.Security.verify', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client = MockIdealClient(metrics=False)
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.input_path = os.path.join(self.directory, 'transactions.csv')
+        with io.open(self.input_path, 'w') as f:
+            f.write(u'transaction_id,purchase_id\n')
+            for i in range(50):
+                f.write(u'{id:016d},order-{i}\n'.format(id=i, i=i))
+
+        self.output_path = os.path.join(self.directory, 'statuses.jsonl')
+
+    def read_output(self):
+        with io.open(self.output_path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_read_transaction_ids(self):
+        f = io.StringIO(u'{"transaction_id": "0050000000000001"}\n\n{"transaction_id": 50000000000002}\n')
+        self.assertListEqual(list(read_transaction_ids(f, 'jsonl')), ['0050000000000001', '50000000000002'])
+
+        f = io.StringIO(u'id\n0050000000000001\n')
+        self.assertRaises(IdealConfigurationException, list, read_transaction_ids(f, 'csv', 'transaction_id'))
+
+    def test_reconcile(self):
+        counts = reconcile(self.input_path, self.output_path, client=self.client, concurrency=4)
+
+        self.assertDictEqual(counts, {'requested': 50, 'failed': 0, 'skipped': 0})
+
+        results = self.read_output()
+        self.assertSetEqual(set(result['transaction_id'] for result in results),
+                            set('{id:016d}'.format(id=i) for i in range(50)))
+        self.assertDictEqual(results[0], {
+            'transaction_id': results[0]['transaction_id'],
+            'status': 'Success',
+            'amount': '100.00',
+            'currency': 'EUR',
+            'consumer_iban': 'NL53INGB0654422370',
+            'consumer_bic': 'INGBNL2A',
+            'status_date': '2013-08-07T11:50:28.348000+00:00',
+            'error': None,
+        })
+
+        # Everything is done, so a second run requests nothing.
+        counts = reconcile(self.input_path, self.output_path, client=self.client, concurrency=4)
+        self.assertDictEqual(counts, {'requested': 0, 'failed': 0, 'skipped': 50})
+        self.assertEqual(len(self.read_output()), 50)
+
+    def test_resume(self):
+        """
+        Test an interrupted run, with results that were written after the last checkpoint.
+        """
+        with io.open(self.output_path, 'wb') as f:
+            f.write(b'{"transaction_id": "0000000000000000"}\n{"transaction_id": "0000000000000002"}\n')
+            size = f.tell()
+            f.write(b'{"transaction_id": "0000000000000001"}\n{"transaction_id": "00000')
+        Checkpoint(self.output_path + '.checkpoint', 1, [2]).save(size)
+
+        counts = reconcile(self.input_path, self.output_path, client=self.client, concurrency=4)
+
+        self.assertDictEqual(counts, {'requested': 48, 'failed': 0, 'skipped': 2})
+        transaction_ids = [result['transaction_id'] for result in self.read_output()]
+        self.assertEqual(len(transaction_ids), 50)
+        self.assertSetEqual(set(transaction_ids), set('{id:016d}'.format(id=i) for i in range(50)))
+
+    def test_errors(self):
+        get_transaction_status = self.client.get_transaction_status
+
+        def fail_some(transaction_id):
+            if transaction_id.endswith('7'):
+                raise IdealServerException('iDEAL server returned HTTP 503')
+            if transaction_id.endswith('3'):
+                raise requests.ConnectionError('Connection reset by peer')
+            return get_transaction_status(transaction_id)
+
+        self.client.get_transaction_status = fail_some
+
+        counts = reconcile(self.input_path, self.output_path, client=self.client, concurrency=4)
+
+        self.assertDictEqual(counts, {'requested': 50, 'failed': 10, 'skipped': 0})
+        errors = dict((result['transaction_id'], result) for result in self.read_output() if result['error'])
+        self.assertEqual(errors['0000000000000007']['error'], 'iDEAL server returned HTTP 503')
+        self.assertIsNone(errors['0000000000000007']['status'])
+        self.assertEqual(errors['0000000000000003']['error'], 'Connection reset by peer')
+
+    def test_stop_threads(self):
+        """
+        Test the threads stop when the run fails, while they wait for the full queues.
+        """
+        threads = set(threading.enumerate())
+
+        with io.open(self.output_path, 'wb') as output:
+            writer = ResultWriter(output)
+            writer.write = mock.Mock(side_effect=IOError('No space left on device'))
+            transaction_ids = ('{id:016d}'.format(id=i) for i in range(50))
+            self.assertRaises(IOError, Reconciler(self.client, concurrency=2).run, transaction_ids, writer, output,
+                              Checkpoint(self.output_path + '.checkpoint'))
+
+        for i in range(50):
+            if set(threading.enumerate()) <= threads:
+                break
+            time.sleep(0.1)
+        self.assertSetEqual(set(threading.enumerate()) - threads, set())
+
+    def test_window(self):
+        """
+        Test the completed records beyond the low-water mark stay within the window, while the oldest is slow.
+        """
+        get_transaction_status = self.client.get_transaction_status
+
+        def slow_first(transaction_id):
+            if transaction_id == '0000000000000000':
+                time.sleep(0.2)
+            return get_transaction_status(transaction_id)
+
+        self.client.get_transaction_status = slow_first
+
+        checkpoint = Checkpoint(self.output_path + '.checkpoint')
+        sizes = []
+        add = checkpoint.add
+
+        def add_and_measure(index):
+            add(index)
+            sizes.append(len(checkpoint.completed))
+
+        checkpoint.add = add_and_measure
+
+        with io.open(self.output_path, 'wb') as output:
+            transaction_ids = ('{id:016d}'.format(id=i) for i in range(50))
+            counts = Reconciler(self.client, concurrency=2, window=5).run(
+                transaction_ids, ResultWriter(output), output, checkpoint)
+
+        self.assertEqual(counts['requested'], 50)
+        self.assertLessEqual(max(sizes), 4)
+        self.assertEqual(checkpoint.low_water_mark, 50)
+
+    def test_mismatched_checkpoint(self):
+        Checkpoint(self.output_path + '.checkpoint', 10).save(1024)
+
+        self.assertRaises(IdealConfigurationException, reconcile, self.input_path, self.output_path,
+                          client=self.client)
+
+    def test_main(self):
+        output_path = os.path.join(self.directory, 'statuses.csv')
+
+        with mock.patch('ideal.reconcile.get_client', return_value=self.client):
+            with mock.patch('sys.stderr') as stderr:
+                main([self.input_path, output_path, '--concurrency', '2'])
+
+        stderr.write.assert_called_once_with('50 requested, 0 failed, 0 skipped (already done).\n')
+        with io.open(output_path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(
+            lines[0], 'transaction_id,status,amount,currency,consumer_iban,consumer_bic,status_date,error')
+        self.assertEqual(len(lines), 51)
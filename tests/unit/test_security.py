@@ -1,9 +1,14 @@
 # -*- encoding: utf8 -*-
 import os
+import random
+import shutil
+import tempfile
+from io import BytesIO
 
+from lxml import etree
 from unittest2 import TestCase
 
-from ideal.security import Security
+from ideal.security import KeyStore, MessageDigest, Security
 from ideal.utils import render_to_string
 
 
@@ -111,3 +116,82 @@ class SecurityTests(TestCase):
         signed_message = signed_message.encode('utf-8')
         result = self.security.verify(signed_message, [self.cert_filepath])
         self.assertTrue(result)
+
+    def test_sign_message_bytes(self):
+        """
+        Test signing a message as bytes gives the same result, without converting it to string.
+        """
+        signed_message = self.security.sign_message(
+            self.unsigned_message.encode('utf-8'), self.cert_filepath, self.priv_filepath, 'example',
+            b'<?xml version="1.0" encoding="utf-8"?>')
+
+        self.assertIsInstance(signed_message, bytes)
+        self.assertEqual(
+            signed_message,
+            b'<?xml version="1.0" encoding="utf-8"?>' + self.security.sign_message(
+                self.unsigned_message, self.cert_filepath, self.priv_filepath, 'example').encode('utf-8'))
+
+        self.assertTrue(self.security.verify(signed_message, [self.cert_filepath]))
+
+    def test_verify_parsed(self):
+        """
+        Test verify a signed message that was already parsed.
+        """
+        signed_message = self.security.sign_message(
+            self.unsigned_message.encode('utf-8'), self.cert_filepath, self.priv_filepath, 'example')
+        xml_tree = etree.parse(BytesIO(signed_message))
+
+        self.assertTrue(self.security.verify(signed_message, [self.cert_filepath], xml_tree))
+
+        tampered_message = signed_message.replace(b'001234567', b'001234568')
+        self.assertFalse(self.security.verify(tampered_message, [self.cert_filepath], xml_tree))
+
+    def test_message_digest(self):
+        """
+        Test the digest of a message that arrives in chunks equals the digest of the unsigned message.
+        """
+        signed_message = self.security.sign_message(
+            self.unsigned_message.encode('utf-8') + b'\n\n', self.cert_filepath, self.priv_filepath, 'example',
+            b'<?xml version="1.0" encoding="utf-8"?>\n')
+        expected_digest = self.security.get_message_digest(self.unsigned_message)
+
+        rnd = random.Random(0)
+        for i in range(50):
+            message_digest = MessageDigest()
+            position = 0
+            while position < len(signed_message):
+                size = rnd.randint(1, 20)
+                message_digest.update(signed_message[position:position + size])
+                position += size
+
+            self.assertEqual(message_digest.digest(), expected_digest)
+
+        tampered_message = signed_message.replace(b'001234567', b'001234568')
+        message_digest = MessageDigest()
+        message_digest.update(tampered_message)
+        self.assertNotEqual(message_digest.digest(), expected_digest)
+
+        message_digest = MessageDigest()
+        message_digest.update(signed_message[:signed_message.index(b'</Signature>')])
+        self.assertIsNone(message_digest.digest())
+
+    def test_key_store(self):
+        """
+        Test keys and certificates are loaded once, until the file changes.
+        """
+        key_store = KeyStore()
+
+        self.assertIs(key_store.get_private_key(self.priv_filepath, b'example'),
+                      key_store.get_private_key(self.priv_filepath, b'example'))
+        self.assertIs(key_store.get_certificate(self.cert_filepath), key_store.get_certificate(self.cert_filepath))
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cert_filepath = os.path.join(directory, 'cert.cer')
+        shutil.copy(self.cert_filepath, cert_filepath)
+
+        certificate = key_store.get_certificate(cert_filepath)
+        os.utime(cert_filepath, (0, 0))
+        self.assertIsNot(key_store.get_certificate(cert_filepath), certificate)
+
+        self.assertEqual(key_store.get_fingerprint(cert_filepath), '132df198e31e4443e228da75c9299dded61aef10')
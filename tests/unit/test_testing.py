@@ -0,0 +1,126 @@
+import os
+from decimal import Decimal
+
+import requests
+from unittest2 import TestCase
+
+from ideal.client import HttpRequest, IdealClient, TransactionStatus
+from ideal.exceptions import IdealResponseException, IdealServerException
+from ideal.testing import AcquirerServer, AcquirerSimulator
+
+
+class AcquirerSimulatorTests(TestCase):
+    """
+    Runs the real client, including signature verification, against the simulator over HTTP.
+    """
+    def setUp(self):
+        from ideal.conf import settings
+
+        base_filepath = os.path.abspath(os.path.join(os.path.dirname(__file__), 'mock_certs'))
+
+        settings.MERCHANT_ID = '001234567'
+        settings.PRIVATE_KEY_PASSWORD = 'example'
+        settings.ACQUIRER = 'ING'
+        settings.MERCHANT_RETURN_URL = 'http://www.example.com/ideal/callback/'
+        settings.PRIVATE_KEY_FILE = os.path.join(base_filepath, 'priv.pem')
+        settings.PRIVATE_CERTIFICATE = os.path.join(base_filepath, 'cert.cer')
+        settings.CERTIFICATES = [os.path.join(base_filepath, 'cert.cer')]
+
+        # The mock certificate is used by both the merchant and the acquirer.
+        self.simulator = AcquirerSimulator(
+            settings.PRIVATE_KEY_FILE, settings.PRIVATE_KEY_PASSWORD, settings.PRIVATE_CERTIFICATE,
+            settings.CERTIFICATES, seed=0)
+        self.server = AcquirerServer(self.simulator).start()
+        self.addCleanup(self.server.stop)
+
+        settings.ACQUIRER_URL = self.server.url
+        self.addCleanup(setattr, settings, 'ACQUIRER_URL', None)
+
+        self.client = IdealClient(metrics=False)
+
+    def test_get_issuers(self):
+        response = self.client.get_issuers()
+
+        self.assertEqual(response.acquirer_id, '0050')
+        self.assertEqual(response.issuers['Nederland'], {
+            'INGBNL2A': 'Issuer Simulation V3 - ING',
+            'RABONL2U': 'Issuer Simulation V3 - RABO',
+        })
+
+    def test_transaction_flow(self):
+        response = self.client.start_transaction('INGBNL2A', '1234567890', Decimal('12.50'), 'Test', 'ec1234567890')
+
+        self.assertEqual(len(response.transaction_id), 16)
+        self.assertEqual(self.simulator.transactions[response.transaction_id]['amount'], '12.50')
+
+        # The consumer completes the payment and returns to the merchant.
+        redirect = requests.get(response.issuer_authentication_url, allow_redirects=False)
+        self.assertEqual(redirect.status_code, 302)
+        self.assertEqual(
+            redirect.headers['Location'],
+            'http://www.example.com/ideal/callback/?trxid={trxid}&ec=ec1234567890'.format(
+                trxid=response.transaction_id))
+
+        status = self.client.get_transaction_status(response.transaction_id)
+
+        self.assertEqual(status.status, TransactionStatus.SUCCESS)
+        self.assertEqual(status.consumer_iban, 'NL53INGB0654422370')
+        self.assertEqual(status.amount, Decimal('12.50'))
+
+    def test_set_status(self):
+        response = self.client.start_transaction('INGBNL2A', '1234567890', Decimal('1.00'), 'Test')
+        self.simulator.set_status(response.transaction_id, TransactionStatus.CANCELLED)
+
+        status = self.client.get_transaction_status(response.transaction_id)
+
+        self.assertEqual(status.status, TransactionStatus.CANCELLED)
+        self.assertIsNone(status.consumer_iban)
+
+    def test_unknown_transaction(self):
+        with self.assertRaises(IdealResponseException) as cm:
+            self.client.get_transaction_status('0050999999999999')
+
+        self.assertEqual(cm.exception.error_code, 'AP2700')
+
+    def test_max_transactions(self):
+        self.simulator.max_transactions = 2
+
+        first, second = [
+            self.client.start_transaction('INGBNL2A', '1234567890', Decimal('1.00'), 'Test').transaction_id
+            for i in range(2)]
+        # The first transaction is used, so the second is forgotten first.
+        self.client.get_transaction_status(first)
+        self.client.start_transaction('INGBNL2A', '1234567890', Decimal('1.00'), 'Test')
+
+        self.assertEqual(len(self.simulator.transactions), 2)
+        self.assertIn(first, self.simulator.transactions)
+        self.assertNotIn(second, self.simulator.transactions)
+
+    def test_invalid_signature(self):
+        create_request = self.client.create_request
+
+        def tampered_request(body=None):
+            request = create_request(body)
+            return HttpRequest(request.uri, request.method, request.body.replace(b'001234567', b'001234568'),
+                               request.headers)
+
+        self.client.create_request = tampered_request
+
+        with self.assertRaises(IdealResponseException) as cm:
+            self.client.get_issuers()
+
+        self.assertEqual(cm.exception.error_code, 'SE2700')
+
+    def test_error_rate(self):
+        self.simulator.error_rate = 1
+
+        with self.assertRaises(IdealResponseException) as cm:
+            self.client.get_issuers()
+
+        self.assertEqual(cm.exception.error_code, 'SO1000')
+
+    def test_http_error_rate(self):
+        self.simulator.http_error_rate = 1
+
+        with self.assertRaises(IdealServerException):
+            self.client.get_issuers()
@@ -0,0 +1,143 @@
+# -*- encoding: utf8 -*-
+import os
+
+import mock
+from unittest2 import TestCase, skipIf
+
+from ideal.exceptions import IdealResponseException
+from ideal.tracing import NULL_SPAN, SpanHook, Tracer
+
+from .helpers import MockIdealClient
+
+try:
+    import contextvars
+except ImportError:  # Python < 3.7
+    contextvars = None
+
+
+class RecordingHook(SpanHook):
+    def __init__(self):
+        self.started = []
+        self.ended = []
+
+    def on_start(self, span):
+        self.started.append(span)
+
+    def on_end(self, span):
+        self.ended.append(span)
+
+
+class TracerTests(TestCase):
+
+    def test_no_hooks(self):
+        tracer = Tracer()
+
+        self.assertFalse(tracer)
+        self.assertIs(tracer.span('ideal.sign'), NULL_SPAN)
+
+        with tracer.span('ideal.request'):
+            self.assertIsNone(tracer.current_span())
+
+    def test_nested_spans(self):
+        tracer = Tracer()
+        hook = RecordingHook()
+        tracer.add_hook(hook)
+
+        with tracer.span('ideal.request', message_type='DirectoryReq') as root:
+            with tracer.span('ideal.sign') as child:
+                self.assertIs(tracer.current_span(), child)
+
+        self.assertIsNone(tracer.current_span())
+        self.assertListEqual([span.name for span in hook.started], ['ideal.request', 'ideal.sign'])
+        self.assertListEqual([span.name for span in hook.ended], ['ideal.sign', 'ideal.request'])
+        self.assertIs(child.parent, root)
+        self.assertEqual(child.attributes['message_type'], 'DirectoryReq')
+        self.assertGreaterEqual(root.duration, child.duration)
+
+        tracer.remove_hook(hook)
+        self.assertFalse(tracer)
+
+    def test_error(self):
+        tracer = Tracer()
+        hook = RecordingHook()
+        tracer.add_hook(hook)
+
+        error = ValueError('boom')
+        with self.assertRaises(ValueError):
+            with tracer.span('ideal.http'):
+                raise error
+
+        self.assertIs(hook.ended[0].error, error)
+
+    def test_parent_hooks(self):
+        parent = Tracer()
+        hook = RecordingHook()
+        tracer = Tracer(hooks=[hook], parent=parent)
+
+        # The combined hooks are only rebuilt when hooks are added or removed.
+        self.assertIs(tracer.hooks, tracer.hooks)
+
+        parent_hook = RecordingHook()
+        parent.add_hook(parent_hook)
+        self.assertEqual(tracer.hooks, (hook, parent_hook))
+
+        tracer.remove_hook(hook)
+        self.assertEqual(tracer.hooks, (parent_hook, ))
+
+        with tracer.span('ideal.request'):
+            pass
+        self.assertEqual(len(parent_hook.ended), 1)
+
+
+class ClientTracingTests(TestCase):
+
+    def setUp(self):
+        from ideal.conf import settings
+
+        base_filepath = os.path.abspath(os.path.join(os.path.dirname(__file__), 'mock_certs'))
+
+        settings.MERCHANT_ID = '001234567'
+        settings.PRIVATE_KEY_PASSWORD = 'example'
+        settings.ACQUIRER = 'ING'
+        settings.MERCHANT_RETURN_URL = 'http://www.example.com/ideal/callback/'
+        settings.PRIVATE_KEY_FILE = os.path.join(base_filepath, 'priv.pem')
+        settings.PRIVATE_CERTIFICATE = os.path.join(base_filepath, 'cert.cer')
+        settings.CERTIFICATES = [os.path.join(base_filepath, 'cert.cer')]
+
+        self.patcher = mock.patch('ideal.security.Security.verify')
+        self.patcher.start().return_value = True
+
+        self.hook = RecordingHook()
+        self.tracer = Tracer()
+        self.tracer.add_hook(self.hook)
+        self.ideal_client = MockIdealClient(tracer=self.tracer)
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_get_issuers(self):
+        self.ideal_client.get_issuers()
+
+        self.assertListEqual([span.name for span in self.hook.ended], [
+            'ideal.render', 'ideal.sign', 'ideal.http', 'ideal.parse', 'ideal.verify', 'ideal.request'])
+
+        for span in self.hook.ended:
+            self.assertEqual(span.attributes, {'message_type': 'DirectoryReq', 'acquirer': 'ING'})
+
+    def test_error(self):
+        with self.tracer.span('ideal.request'):
+            self.assertRaises(IdealResponseException, self.ideal_client._request, '<oops></oops>')
+
+        # The error response is parsed and verified before it's raised.
+        self.assertListEqual([span.name for span in self.hook.ended], [
+            'ideal.sign', 'ideal.http', 'ideal.parse', 'ideal.verify', 'ideal.request'])
+
+    @skipIf(contextvars is None, 'Requires contextvars.')
+    def test_clients_share_context(self):
+        self.ideal_client.get_issuers()
+        size = len(contextvars.copy_context())
+
+        for i in range(100):
+            MockIdealClient(tracer=self.tracer).get_issuers()
+
+        self.assertEqual(len(contextvars.copy_context()), size)
@@ -0,0 +1,262 @@
+import os
+import tempfile
+from io import open
+
+import mock
+from unittest2 import TestCase, skipUnless
+
+from ideal.client import HttpRequest, IdealClient
+from ideal.concurrency import PriorityLimiter, RequestPriority
+from ideal.exceptions import IdealConfigurationException, IdealServerException
+from ideal.testing import AcquirerServer, AcquirerSimulator
+from ideal.transports import (Http2Transport, RecordingTransport, ReplayTransport, RequestsTransport, Transport,
+                              TransportResponse, Urllib3Transport, WSGITransport, read_recordings)
+
+
+class TransportTests(TestCase):
+
+    def setUp(self):
+        from ideal.conf import settings
+
+        base_filepath = os.path.abspath(os.path.join(os.path.dirname(__file__), 'mock_certs'))
+
+        settings.MERCHANT_ID = '001234567'
+        settings.PRIVATE_KEY_PASSWORD = 'example'
+        settings.ACQUIRER = 'ING'
+        settings.MERCHANT_RETURN_URL = 'http://www.example.com/ideal/callback/'
+        settings.PRIVATE_KEY_FILE = os.path.join(base_filepath, 'priv.pem')
+        settings.PRIVATE_CERTIFICATE = os.path.join(base_filepath, 'cert.cer')
+        settings.CERTIFICATES = [os.path.join(base_filepath, 'cert.cer')]
+
+        self.simulator = AcquirerSimulator(
+            settings.PRIVATE_KEY_FILE, settings.PRIVATE_KEY_PASSWORD, settings.PRIVATE_CERTIFICATE,
+            settings.CERTIFICATES)
+
+    def _serve(self):
+        from ideal.conf import settings
+
+        server = AcquirerServer(self.simulator).start()
+        self.addCleanup(server.stop)
+
+        settings.ACQUIRER_URL = server.url
+        self.addCleanup(setattr, settings, 'ACQUIRER_URL', None)
+
+    def test_default_transport(self):
+        client = IdealClient(max_concurrency=4, interactive_reserve=1)
+
+        self.assertIsInstance(client.transport, RequestsTransport)
+        self.assertIs(client.transport.limiter, client.limiter)
+        self.assertEqual(client.transport.get_pool_size(RequestPriority.BACKGROUND), 3)
+
+    def test_separate_pools(self):
+        transport = RequestsTransport(limiter=PriorityLimiter(4, interactive_reserve=1))
+
+        interactive = transport.get_pool(RequestPriority.INTERACTIVE)
+        background = transport.get_pool(RequestPriority.BACKGROUND)
+        hedge = transport.get_pool(RequestPriority.BACKGROUND, hedge=True)
+
+        self.assertIs(transport.get_pool(RequestPriority.INTERACTIVE), interactive)
+        self.assertEqual(len(set(map(id, [interactive, background, hedge]))), 3)
+
+        transport.close()
+        self.assertIsNot(transport.get_pool(RequestPriority.INTERACTIVE), interactive)
+
+    def test_requests_transport(self):
+        self._serve()
+        client = IdealClient(metrics=False, transport=RequestsTransport(timeout=10))
+
+        self.assertEqual(client.get_issuers().acquirer_id, '0050')
+
+    def test_urllib3_transport(self):
+        self._serve()
+        client = IdealClient(metrics=False, transport=Urllib3Transport(timeout=10))
+
+        response = client.start_transaction('INGBNL2A', '1234567890', 1, 'Test')
+
+        self.assertEqual(client.get_transaction_status(response.transaction_id).status, 'Success')
+
+    def test_wsgi_transport(self):
+        from ideal.conf import settings
+
+        client = IdealClient(metrics=False, transport=WSGITransport(self.simulator))
+
+        response = client.start_transaction('INGBNL2A', '1234567890', 1, 'Test')
+
+        self.assertTrue(response.issuer_authentication_url.startswith(settings.get_acquirer_url() + '?trxid='))
+        self.assertEqual(client.get_transaction_status(response.transaction_id).status, 'Success')
+
+    def test_wsgi_transport_status(self):
+        self.simulator.http_error_rate = 1
+        transport = WSGITransport(self.simulator)
+
+        response = transport.send(HttpRequest('http://localhost/', 'POST', '<DirectoryReq/>'), 'interactive')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Content-Type'], 'text/plain')
+
+    def test_http2_transport_requires_httpx(self):
+        with mock.patch.dict('sys.modules', {'httpx': None}):
+            self.assertRaises(IdealConfigurationException, Http2Transport)
+
+    @skipUnless(hasattr(os, 'register_at_fork'), 'Requires os.register_at_fork.')
+    def test_fork(self):
+        transport = RequestsTransport()
+        pool = transport.get_pool(RequestPriority.INTERACTIVE)
+
+        pid = os.fork()
+        if pid == 0:
+            # The child gets its own connections.
+            os._exit(0 if transport.get_pool(RequestPriority.INTERACTIVE) is not pool else 1)
+
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+        self.assertIs(transport.get_pool(RequestPriority.INTERACTIVE), pool)
+
+    def test_streamed_response(self):
+        transport = ChunkedTransport(WSGITransport(self.simulator), chunk_size=7)
+        client = IdealClient(metrics=False, transport=transport)
+
+        response = client.start_transaction('INGBNL2A', '1234567890', 1, 'Test')
+
+        self.assertEqual(client.get_transaction_status(response.transaction_id).status, 'Success')
+        self.assertEqual(transport.closed, 2)
+
+    def test_max_response_size(self):
+        transport = ChunkedTransport(WSGITransport(self.simulator), chunk_size=100)
+        client = IdealClient(metrics=False, transport=transport, max_response_size=500)
+
+        with self.assertRaisesRegexp(IdealServerException, 'exceeds the maximum size of 500 bytes'):
+            client.get_issuers()
+
+        self.assertEqual(transport.closed, 1)
+        # The parser of this thread is still usable.
+        self.assertEqual(IdealClient(metrics=False, transport=transport).get_issuers().acquirer_id, '0050')
+
+    def test_error_response_truncated(self):
+        transport = mock.Mock(limiter=None)
+        transport.send.return_value = TransportResponse(500, {}, b'x' * 10000)
+        client = IdealClient(metrics=False, transport=transport)
+
+        with self.assertRaises(IdealServerException) as cm:
+            client.get_issuers()
+
+        self.assertLess(len(str(cm.exception)), 600)
+
+
+class ChunkedTransport(Transport):
+    """
+    Streams the responses of another transport in small chunks.
+    """
+    def __init__(self, transport, chunk_size):
+        super(ChunkedTransport, self).__init__()
+        self.transport = transport
+        self.chunk_size = chunk_size
+        self.closed = 0
+
+    def send(self, request, priority, hedge=False):
+        response = self.transport.send(request, priority, hedge)
+        content = response.content
+        chunks = [content[i:i + self.chunk_size] for i in range(0, len(content), self.chunk_size)]
+
+        return TransportResponse(response.status_code, response.headers, chunks=chunks, close=self._close)
+
+    def _close(self):
+        self.closed += 1
+
+
+class RecordingTransportTests(TestCase):
+
+    def setUp(self):
+        from ideal.conf import settings
+
+        base_filepath = os.path.abspath(os.path.join(os.path.dirname(__file__), 'mock_certs'))
+
+        settings.MERCHANT_ID = '001234567'
+        settings.PRIVATE_KEY_PASSWORD = 'example'
+        settings.ACQUIRER = 'ING'
+        settings.MERCHANT_RETURN_URL = 'http://www.example.com/ideal/callback/'
+        settings.PRIVATE_KEY_FILE = os.path.join(base_filepath, 'priv.pem')
+        settings.PRIVATE_CERTIFICATE = os.path.join(base_filepath, 'cert.cer')
+        settings.CERTIFICATES = [os.path.join(base_filepath, 'cert.cer')]
+
+        self.simulator = AcquirerSimulator(
+            settings.PRIVATE_KEY_FILE, settings.PRIVATE_KEY_PASSWORD, settings.PRIVATE_CERTIFICATE,
+            settings.CERTIFICATES)
+
+        fd, self.filepath = tempfile.mkstemp(suffix='.rec')
+        os.close(fd)
+        os.remove(self.filepath)
+        self.addCleanup(lambda: os.path.exists(self.filepath) and os.remove(self.filepath))
+
+    def _record(self):
+        transport = RecordingTransport(WSGITransport(self.simulator), self.filepath)
+        client = IdealClient(metrics=False, transport=transport)
+
+        client.get_issuers()
+        transaction_id = client.start_transaction('INGBNL2A', '1234567890', 1, 'Test').transaction_id
+        client.get_transaction_status(transaction_id)
+        transport.close()
+
+        return transaction_id
+
+    def test_record(self):
+        self._record()
+
+        recordings = list(read_recordings(self.filepath))
+
+        self.assertEqual(len(recordings), 3)
+        self.assertIn(b'<DirectoryReq', recordings[0].request)
+        self.assertIn(b'<SignatureValue>', recordings[0].request)
+        self.assertIn(b'<DirectoryRes', recordings[0].content)
+        self.assertEqual(recordings[0].status_code, 200)
+        self.assertEqual(recordings[0].headers['Content-Type'], 'text/xml; charset="utf-8"')
+        self.assertGreater(recordings[0].duration, 0)
+
+    def test_max_size(self):
+        transport = RecordingTransport(WSGITransport(self.simulator), self.filepath, max_size=100)
+        client = IdealClient(metrics=False, transport=transport)
+
+        self.assertRaises(IdealServerException, client.get_issuers)
+        transport.close()
+
+        self.assertEqual(len(list(read_recordings(self.filepath))), 0)
+
+    def test_append(self):
+        self._record()
+        self._record()
+
+        self.assertEqual(len(list(read_recordings(self.filepath))), 6)
+
+    def test_incomplete_record(self):
+        self._record()
+
+        with open(self.filepath, 'rb+') as f:
+            f.truncate(os.path.getsize(self.filepath) - 10)
+
+        self.assertEqual(len(list(read_recordings(self.filepath))), 2)
+
+    def test_not_a_recording(self):
+        with open(self.filepath, 'wb') as f:
+            f.write(b'<DirectoryRes/>')
+
+        self.assertRaises(IdealConfigurationException, list, read_recordings(self.filepath))
+
+    def test_replay(self):
+        transaction_id = self._record()
+
+        # Responses are verified for real, but no acquirer is involved.
+        client = IdealClient(metrics=False, transport=ReplayTransport(self.filepath))
+
+        self.assertEqual(client.get_issuers().acquirer_id, '0050')
+        self.assertEqual(client.start_transaction('INGBNL2A', '1', 1, 'Test').transaction_id, transaction_id)
+        self.assertEqual(client.get_transaction_status(transaction_id).status, 'Success')
+        self.assertRaises(IdealServerException, client.get_issuers)
+
+    def test_replay_loop_and_timing(self):
+        self._record()
+        transport = ReplayTransport(self.filepath, timing=True, loop=True)
+
+        with mock.patch('ideal.transports.time.sleep') as sleep:
+            responses = [transport.send(None, 'interactive') for i in range(4)]
+
+        self.assertEqual(responses[0].content, responses[3].content)
+        self.assertEqual(sleep.call_args_list[0], mock.call(transport.recordings[0].duration))
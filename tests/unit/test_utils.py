@@ -0,0 +1,39 @@
+# -*- encoding: utf8 -*-
+from unittest2 import TestCase
+
+from ideal.utils import Template, get_message_type, get_template, render_to_bytes, render_to_string
+
+
+class TemplateTests(TestCase):
+
+    def test_render_to_bytes(self):
+        ctx = {
+            'timestamp': '2013-08-03T11:48:11.000Z',
+            'merchant_id': u'001234567',
+            'sub_id': 0,
+        }
+
+        rendered = render_to_bytes('templates/directory_request.xml', ctx)
+
+        self.assertIsInstance(rendered, bytes)
+        self.assertEqual(rendered, render_to_string('templates/directory_request.xml', ctx).encode('utf-8'))
+
+    def test_bytes_values(self):
+        template = Template(u'<a>{value}</a><b>{other}</b>')
+
+        self.assertEqual(template.render_to_bytes({'value': b'\xc3\xbc', 'other': u'\xfc'}),
+                         b'<a>\xc3\xbc</a><b>\xc3\xbc</b>')
+
+    def test_format_spec_and_escapes(self):
+        template = Template(u'{{literal}} {amount:.2f} {name!r}')
+
+        self.assertEqual(template.render_to_bytes({'amount': 1.5, 'name': 'x'}), b"{literal} 1.50 'x'")
+        self.assertEqual(template.render({'amount': 1.5, 'name': 'x'}), "{literal} 1.50 'x'")
+
+    def test_template_cache(self):
+        self.assertIs(get_template('templates/signed_info.xml'), get_template('templates/signed_info.xml'))
+
+    def test_get_message_type(self):
+        self.assertEqual(get_message_type('<DirectoryReq xmlns="x"/>'), 'DirectoryReq')
+        self.assertEqual(get_message_type(b'<?xml version="1.0"?>\n<AcquirerTrxReq/>'), 'AcquirerTrxReq')
+        self.assertIsNone(get_message_type(b'no xml'))